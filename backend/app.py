@@ -1,19 +1,40 @@
-from flask import Flask, request, jsonify
+import time
+_import_started = time.perf_counter()
+
+from flask import Flask, request, jsonify, Response, stream_with_context, g, send_file
 from flask_cors import CORS
 import numpy as np
 import pandas as pd
 import pickle
 import os
+import shutil
+import tempfile
+import threading
 from models.cox_model import CoxModel
 from models.rsf_model import RandomSurvivalForestModel
 from models.deepsurv_model import DeepSurvModel
 from utils.data_preprocessing import preprocess_input
-from utils.shap_explainer import generate_shap_values
-from models.kaplan_meier import KaplanMeierModel
+from utils.preprocessing_plan import PreprocessingPlan
+from utils.shap_explainer import generate_shap_values, ExplainerCache
+from models.km_reference import KaplanMeierReference
 # --- MODIFICATION START ---
 # 1. Import the robust file processor we developed earlier.
-from utils.file_processor import process_uploaded_file
+from utils.file_processor import process_uploaded_file, iter_uploaded_file_chunks, detect_id_column
 # --- MODIFICATION END ---
+from utils.batch_inference import predict_dataframe, score_batch, score_columns, RiskSummary, DEFAULT_BATCH_SIZE
+from models.registry import ModelRegistry
+from models.artifacts import resolve_model_path
+from utils.model_fanout import create_executor, run_model_tasks
+from utils.prediction_cache import PredictionCache, ArtifactFingerprint
+from utils.explanation_jobs import ExplanationJobManager
+from utils.bootstrap import load_validation_report, VALIDATION_REPORT_FILE
+from utils.hot_reload import ModelReloader
+from utils.synthetic_cohort import generate_cohort, input_fields
+from utils.instrumentation import (timed, set_endpoint, current_endpoint, METRICS, REQUEST_SECONDS,
+                                   ROWS_PROCESSED, MODEL_GENERATION, CONTENT_TYPE)
+from utils.profiling import ProfilingMiddleware, ProfileStore, profiling_active
+from utils.json_encoding import dumps, json_response, stream_response
+from utils.admin import admin_required, is_admin
 
 
 app = Flask(__name__)
@@ -21,108 +42,347 @@ CORS(app)  # Enable CORS for all routes
 
 # Load trained models
 # NEW and correct line
-MODEL_DIR = os.path.join(os.path.dirname(__file__), 'data', 'trained_models')
+MODEL_DIR = os.environ.get('MODEL_DIR', os.path.join(os.path.dirname(__file__), 'data', 'trained_models'))
+
+def load_preprocessor():
+    """Load the fitted preprocessor"""
+    with open(os.path.join(MODEL_DIR, 'preprocessor.pkl'), 'rb') as f:
+        return pickle.load(f)
+
+def preprocess(data, models=None):
+    """
+    Preprocess request data with the compiled preprocessing plan, falling back
+    to preprocess_input when the preprocessor could not be compiled.
+    models is the registry snapshot to take the preprocessor from.
+    """
+    models = models or registry
+    plan = models.get('preprocessing_plan')
+    if plan is not None:
+        return plan.transform(data)
+    return preprocess_input(data, models.get('preprocessor'))
+
+def load_shap_background():
+    """Load the preprocessed training rows used as the SHAP background, if saved"""
+    path = os.path.join(MODEL_DIR, 'shap_background.npy')
+    if os.path.exists(path):
+        return np.load(path)
+    print("No shap_background.npy found, SHAP explanations are unavailable.")
+    return None
+
+def load_km_reference():
+    """
+    Load the Kaplan-Meier reference curves saved at training time, or build
+    them from synthetic data when no training cohort is available
+    """
+    path = os.path.join(MODEL_DIR, 'km_reference.pkl')
+    if os.path.exists(path):
+        return KaplanMeierReference.load(path)
+    print("No km_reference.pkl found, using synthetic Kaplan-Meier reference curves.")
+    return KaplanMeierReference.from_synthetic()
+
+# Models and their heavy dependencies are loaded on first use
+registry = ModelRegistry()
+# Memory-mapped artifacts are preferred over the pickled models when present
+registry.register('cox', lambda: CoxModel(model_path=resolve_model_path(os.path.join(MODEL_DIR, 'cox_model.pkl'))))
+registry.register('rsf', lambda: RandomSurvivalForestModel(model_path=resolve_model_path(os.path.join(MODEL_DIR, 'rsf_model.pkl'))))
+registry.register('deepsurv', lambda: DeepSurvModel(model_path=resolve_model_path(os.path.join(MODEL_DIR, 'deepsurv_model.h5'))))
+registry.register('preprocessor', load_preprocessor)
+# Compiled from the fitted preprocessor; None when it cannot be compiled
+registry.register('preprocessing_plan', lambda: PreprocessingPlan.compile(registry.get('preprocessor')))
+registry.register('km_reference', load_km_reference)
+registry.register('shap_background', load_shap_background)
+# Bootstrap validation metrics written at training time; None when absent
+registry.register('validation_report', lambda: load_validation_report(os.path.join(MODEL_DIR, VALIDATION_REPORT_FILE)))
+
+# One SHAP explainer per model, built on first use over the summarized background
+explainer_cache = ExplainerCache(background_loader=lambda: registry.get('shap_background'))
+
+MODEL_CLASSES = {
+    'cox': CoxModel,
+    'rsf': RandomSurvivalForestModel,
+    'deepsurv': DeepSurvModel
+}
+
+def validation_metrics(name):
+    """Bootstrap validation metrics of a model, or None without a validation report"""
+    report = registry.get('validation_report')
+    if report is None:
+        return None
+    return report.get('models', {}).get(name)
+
+def get_c_index(name):
+    """Validation C-index of a model, without forcing the model to load"""
+    metrics = validation_metrics(name)
+    if metrics is not None:
+        return metrics['cIndex']['estimate']
+    if registry.is_loaded(name):
+        return registry.get(name).get_c_index()
+    return MODEL_CLASSES[name].DEFAULT_C_INDEX
+
+def model_metrics(name):
+    """
+    C-index of a model and, when a validation report is available, its
+    bootstrap confidence interval and integrated Brier score
+    """
+    result = {'cIndex': get_c_index(name)}
+    metrics = validation_metrics(name)
+    if metrics is not None:
+        result['cIndexCI'] = [metrics['cIndex']['lower'], metrics['cIndex']['upper']]
+        result['integratedBrierScore'] = metrics['integratedBrierScore']['estimate']
+        result['integratedBrierScoreCI'] = [metrics['integratedBrierScore']['lower'], metrics['integratedBrierScore']['upper']]
+    return result
+
+def model_performance():
+    """Validation metrics of every model, as reported in batch responses"""
+    return {name: model_metrics(name) for name in MODEL_CLASSES}
+
+def validate_models(models):
+    """
+    Check a newly loaded generation of models before it is served: each
+    model scores a synthetic patient (which also warms it up) and must
+    return finite results. A model that fails to load is only an error if
+    the current generation serves it.
+    """
+    patient = input_fields(generate_cohort(1)).iloc[0].to_dict()
+    processed = preprocess(patient, models)
+    for name in MODEL_CLASSES:
+        try:
+            model = models.get(name)
+        except Exception:
+            if registry.is_loaded(name):
+                raise
+            continue
+        result = model.predict_batch(processed)
+        probability = np.asarray(result['survival_probability_24m'], dtype=float)
+        if not np.all(np.isfinite(probability)) or np.any((probability < 0) | (probability > 100)):
+            raise ValueError(f"Model '{name}' returned an invalid 24-month survival probability: {probability}")
+    models.get('km_reference').lookup(0.5)
+
+# New model artifacts in MODEL_DIR are loaded, validated and swapped in while
+# the current models keep serving (MODEL_RELOAD_INTERVAL=0 disables polling)
+model_reloader = ModelReloader(
+    registry,
+    ArtifactFingerprint(MODEL_DIR, check_interval=0),
+    validate=validate_models,
+    poll_interval=float(os.environ.get('MODEL_RELOAD_INTERVAL', 10))
+)
+
+@app.before_request
+def start_model_reloader():
+    """Start polling for new models in the process serving requests (also after a fork)"""
+    model_reloader.ensure_running()
+
+# Optional eager loading at startup, e.g. MODEL_WARMUP=all or MODEL_WARMUP=rsf,preprocessor
+MODEL_WARMUP = os.environ.get('MODEL_WARMUP', '').strip()
+if MODEL_WARMUP:
+    registry.warm_up(None if MODEL_WARMUP == 'all' else [name.strip() for name in MODEL_WARMUP.split(',')])
+
+# Bounded pool for the per-model fan-out in /api/predict (0 runs the models sequentially)
+PREDICT_MAX_WORKERS = int(os.environ.get('PREDICT_MAX_WORKERS', 4))
+MODEL_TIMEOUT_SECONDS = float(os.environ.get('MODEL_TIMEOUT_SECONDS', 10))
+predict_executor = create_executor(PREDICT_MAX_WORKERS)
 
-# Initialize models
-cox_model = CoxModel(model_path=os.path.join(MODEL_DIR, 'cox_model.pkl'))
-rsf_model = RandomSurvivalForestModel(model_path=os.path.join(MODEL_DIR, 'rsf_model.pkl'))
-deepsurv_model = DeepSurvModel(model_path=os.path.join(MODEL_DIR, 'deepsurv_model.h5'))
+# Model-layer results keyed on the preprocessed feature vector; the cache is
+# cleared automatically when new models are swapped in (0 entries disables it)
+prediction_cache = PredictionCache(
+    max_entries=int(os.environ.get('PREDICTION_CACHE_SIZE', 1024)),
+    ttl_seconds=float(os.environ.get('PREDICTION_CACHE_TTL', 3600)),
+    fingerprint=model_reloader
+)
 
-# Load preprocessor
-with open(os.path.join(MODEL_DIR, 'preprocessor.pkl'), 'rb') as f:
-    preprocessor = pickle.load(f)
+# Background SHAP explanations for /api/predict, on their own pool so they never
+# hold up predictions
+def explain_patient(processed_data, models=None):
+    """
+    Top SHAP attributions of the Random Survival Forest's 24-month risk for one patient.
+    models is the registry snapshot that scored the request, so the job explains
+    the same forest even if a reload lands before it runs.
+    """
+    models = models or registry
+    with timed('explanation', endpoint='explanation_jobs'):
+        return explainer_cache.explain(models.get('rsf'), processed_data, top_n=5)[0]
+
+explanation_jobs = ExplanationJobManager(
+    explain_patient,
+    max_workers=int(os.environ.get('EXPLANATION_WORKERS', 2)),
+    max_jobs=int(os.environ.get('EXPLANATION_MAX_JOBS', 4096)),
+    ttl_seconds=float(os.environ.get('EXPLANATION_TTL', 3600)),
+    max_pending=int(os.environ.get('EXPLANATION_MAX_PENDING', 64))
+)
+
+# On-demand profiling, off unless PROFILING_ENABLED is set: requests to these
+# endpoints with an X-Profile header or a profile query parameter and the admin
+# token are run under cProfile and tracemalloc, and the reports are stored in PROFILE_DIR
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'survival-profiles'))
+profile_store = ProfileStore(PROFILE_DIR, keep=int(os.environ.get('PROFILE_KEEP', 50)))
+app.wsgi_app = ProfilingMiddleware(
+    app.wsgi_app, profile_store, paths=('/api/predict', '/api/upload'),
+    enabled=os.environ.get('PROFILING_ENABLED', '0').lower() in ('1', 'true', 'yes'),
+    authorize=is_admin
+)
+
+# Streamed uploads larger than this are spooled to disk instead of memory
+UPLOAD_SPOOL_BYTES = 8 * 1024 * 1024
+
+# Payload layouts selected with the format parameter of /api/predict and
+# /api/upload: 'records' has one object per point or patient, 'columnar' has
+# parallel arrays, which are much cheaper to build, encode and parse
+RESPONSE_FORMATS = ('records', 'columnar')
+
+def response_format():
+    """Payload layout requested by the current request, None if it is not supported"""
+    value = request.values.get('format', 'records').lower()
+    return value if value in RESPONSE_FORMATS else None
+
+# Patients scored by this process, for throughput reporting (see serve.py)
+patients_scored = 0
+_patients_lock = threading.Lock()
+
+def count_patients(n):
+    """Add n scored patients to the process-wide counter and the rows metric"""
+    global patients_scored
+    with _patients_lock:
+        patients_scored += n
+    ROWS_PROCESSED.inc(n, endpoint=current_endpoint())
+
+@app.before_request
+def start_request_timer():
+    """Label the stages timed during this request with its endpoint"""
+    g.request_started = time.perf_counter()
+    set_endpoint(request.endpoint)
+
+@app.after_request
+def record_request_latency(response):
+    """Record the request latency once the response, streamed or not, has been sent"""
+    started = g.get('request_started')
+    if started is not None:
+        labels = {'endpoint': request.endpoint or 'none', 'method': request.method, 'status': response.status_code}
+        response.call_on_close(lambda: REQUEST_SECONDS.observe(time.perf_counter() - started, **labels))
+    return response
+
+APP_IMPORT_SECONDS = time.perf_counter() - _import_started
 
 @app.route('/api/predict', methods=['POST'])
 def predict():
     try:
+        fmt = response_format()
+        if fmt is None:
+            return jsonify({'error': f"format must be one of {', '.join(RESPONSE_FORMATS)}"}), 400
+        columnar = fmt == 'columnar'
+        
         # Get data from request
         data = request.json
         
+        # The whole request uses one generation of models, even if a reload
+        # swaps in new ones meanwhile
+        models = registry.snapshot()
+        
         # Preprocess input data
-        processed_data = preprocess_input(data, preprocessor)
+        with timed('preprocess'):
+            processed_data = preprocess(data, models)
+        
+        # Identical feature vectors against unchanged artifacts reuse the cached model outputs
+        input_key = prediction_cache.make_key(processed_data)
+        # The model outputs hold the survival curves in the requested layout
+        cache_key = f"{input_key}:columnar" if columnar else input_key
+        cached_outcomes = prediction_cache.get(cache_key)
+        cache_status = 'hit' if cached_outcomes is not None else 'miss'
         
-        # Make predictions with each model
-        cox_prediction = cox_model.predict(processed_data)
-        rsf_prediction = rsf_model.predict(processed_data)
-        deepsurv_prediction = deepsurv_model.predict(processed_data)
+        # Per-patient SHAP attributions are computed in the background and polled
+        # from /api/explanations/<id>; identical inputs share one job, and none is
+        # created while the queue is full
+        explanation_job_id = explanation_jobs.submit(input_key, processed_data, models)
+        explanation_job = explanation_jobs.get(explanation_job_id) if explanation_job_id else None
         
-        # Calculate feature importance using SHAP
-        feature_importance = generate_shap_values(processed_data, rsf_model)
+        if cached_outcomes is not None:
+            outcomes = cached_outcomes
+        else:
+            # Make predictions with each model concurrently; a failing or slow
+            # model is reported as degraded
+            # Model tasks run on pool threads, which do not see the request's endpoint label
+            endpoint = current_endpoint()
+            def model_task(name):
+                def task():
+                    with timed(f'model.{name}', endpoint):
+                        return models.get(name).predict(processed_data, columnar=columnar)
+                return task
+            
+            # The profiler only sees the request thread, so profiled requests run the models there
+            outcomes = run_model_tasks(
+                {name: model_task(name) for name in MODEL_CLASSES}, None if profiling_active() else predict_executor,
+                timeout=MODEL_TIMEOUT_SECONDS
+            )
+            # Degraded outcomes are transient and are not cached, nor are
+            # results of models replaced while they were computed
+            if all(outcome['status'] == 'ok' for outcome in outcomes.values()) and models.generation == registry.generation:
+                prediction_cache.put(cache_key, outcomes)
         
         # Determine best model based on validation C-index
-        model_comparison = {
-            'cox': {
-                'cIndex': cox_model.get_c_index(),
-                'prediction': cox_prediction['median_survival']
-            },
-            'rsf': {
-                'cIndex': rsf_model.get_c_index(),
-                'prediction': rsf_prediction['median_survival']
-            },
-            'deepsurv': {
-                'cIndex': deepsurv_model.get_c_index(),
-                'prediction': deepsurv_prediction['median_survival']
+        model_comparison = {}
+        for name in MODEL_CLASSES:
+            outcome = outcomes[name]
+            model_comparison[name] = {
+                **model_metrics(name),
+                'prediction': outcome['result']['median_survival'] if outcome['status'] == 'ok' else None,
+                'status': outcome['status']
             }
-        }
+            if outcome['status'] != 'ok':
+                model_comparison[name]['error'] = outcome['error']
+        
+        healthy_models = [name for name in MODEL_CLASSES if outcomes[name]['status'] == 'ok']
+        if not healthy_models:
+            return jsonify({'error': 'All models failed', 'modelComparison': model_comparison}), 503
         
         # Use the best model's prediction
-        best_model = max(model_comparison, key=lambda k: model_comparison[k]['cIndex'])
+        best_model = max(healthy_models, key=lambda k: model_comparison[k]['cIndex'])
         best_prediction = model_comparison[best_model]['prediction']
         
-        # Calculate risk score (normalized between 0-1)
-        risk_score = 1 - (rsf_prediction['survival_probability_24m'] / 100)
+        # Calculate risk score (normalized between 0-1) from the RSF,
+        # or from the best available model if the RSF is degraded
+        risk_source = 'rsf' if 'rsf' in healthy_models else best_model
+        survival_probability = outcomes[risk_source]['result']['survival_probability_24m'] / 100
+        risk_score = 1 - survival_probability
+        
+        # Until the explanation job has finished, report global feature importance
+        with timed('feature_importance'):
+            if explanation_job is not None and explanation_job['status'] == 'done':
+                feature_importance = explanation_job['result']
+            else:
+                feature_importance = generate_shap_values(None, models.get('rsf') if 'rsf' in healthy_models else None)
         
         # Prepare response
         response = {
             'patientId': f"PATIENT-{pd.Timestamp.now().strftime('%Y%m%d%H%M%S')}",
-            'survivalProbability': rsf_prediction['survival_probability_24m'] / 100,
+            'survivalProbability': survival_probability,
             'riskScore': risk_score,
             'predictedSurvivalMonths': best_prediction,
             'modelComparison': model_comparison,
             'featureImportance': feature_importance,
+            'explanationJob': {
+                'id': explanation_job['id'],
+                'status': explanation_job['status'],
+                'url': f"/api/explanations/{explanation_job['id']}"
+            } if explanation_job is not None else None,
             'inputData': data
         }
 
-        # Generate Kaplan-Meier estimation for risk stratification
-        km_model = KaplanMeierModel()
-
-        # Create synthetic survival data for the patient's risk group
-        # This would normally come from your training data
-        np.random.seed(42)  # For reproducible results
-        n_patients = 100
-
-        # Generate survival times based on risk score
-        base_survival = 36  # Base survival time
-        risk_factor = 1 - risk_score
-        survival_times = np.random.exponential(base_survival * risk_factor, n_patients)
-        event_indicators = np.random.binomial(1, 0.7, n_patients)  # 70% event rate
-
-        # Fit Kaplan-Meier model
-        km_model.fit(survival_times, event_indicators, label=f"Risk Group")
-
-        # Get Kaplan-Meier predictions
-        km_predictions = km_model.predict_survival_function()
-
-        # Add Kaplan-Meier data to response
-        response['kaplanMeier'] = {
-            'medianSurvival': km_model.get_median_survival(),
-            'survivalCurve': [
-                {
-                    'month': int(t),
-                    'survival': float(s),
-                    'upper_ci': float(u),
-                    'lower_ci': float(l)
-                }
-                for t, s, u, l in zip(
-                    km_predictions['times'],
-                    km_predictions['survival_probabilities'],
-                    km_predictions['upper_confidence'],
-                    km_predictions['lower_confidence']
-                )
-            ]
-        }
+        # Kaplan-Meier reference curve for the patient's risk stratum
+        with timed('kaplan_meier'):
+            response['kaplanMeier'] = models.get('km_reference').lookup(risk_score, columnar=columnar)
+        
+        if columnar:
+            # The models share one time grid, so it is sent once
+            response['format'] = 'columnar'
+            response['survivalCurves'] = {
+                'months': outcomes[best_model]['result']['curve']['months'],
+                'models': {name: outcomes[name]['result']['curve']['survival'] for name in healthy_models}
+            }
+        count_patients(1)
         
-        return jsonify(response)
+        with timed('serialize'):
+            http_response = json_response(response)
+        http_response.headers['X-Prediction-Cache'] = cache_status
+        return http_response
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -136,76 +396,210 @@ def process_file():
         
         file = request.files['file']
         
+        batch_size = request.values.get('batch_size', DEFAULT_BATCH_SIZE, type=int)
+        if batch_size <= 0:
+            return jsonify({'error': 'batch_size must be a positive integer'}), 400
+        
+        fmt = response_format()
+        if fmt is None:
+            return jsonify({'error': f"format must be one of {', '.join(RESPONSE_FORMATS)}"}), 400
+        columnar = fmt == 'columnar'
+        
+        # Per-patient SHAP attributions are opt-in: they cost far more than scoring
+        explainers = explainer_cache if request.values.get('explain', '').lower() in ('1', 'true', 'yes') else None
+        
+        # In-flight uploads finish on the models they started with
+        models = registry.snapshot()
+        
+        if request.values.get('stream', '').lower() in ('1', 'true', 'yes'):
+            return stream_file_predictions(file, batch_size, explainers, models, columnar)
+        
+        preprocessor = models.get('preprocessor')
+        rsf_model = models.get('rsf')
+        
         # --- MODIFICATION START ---
         # 2. Use the robust file processing logic instead of the simple pd.read_csv
         filename = file.filename
         # Read file content into memory to inspect it
         file_content = file.read().decode('utf-8')
 
-        # Dynamically determine the ID column for flexibility (e.g., for TCGA data)
-        id_column = 'bcr_patient_barcode' if 'bcr_patient_barcode' in file_content else 'patient_id'
-
-        # Use the robust processor to handle CSV, TSV, or TXT files
-        df = process_uploaded_file(file_content, filename, id_column=id_column)
+        # Use the robust processor to handle CSV, TSV, or TXT files; the ID column
+        # is detected from the header (e.g., for TCGA data), as when streaming
+        with timed('parse'):
+            df = process_uploaded_file(file_content, filename, id_column=None)
+        id_column = detect_id_column(df.columns)
         # --- MODIFICATION END ---
         
-        # Process each patient in the file
-        results = []
-        for _, row in df.iterrows():
-            # Convert row to dictionary
-            patient_data = row.to_dict()
-            
-            # Preprocess data
-            processed_data = preprocess_input(patient_data, preprocessor)
-            
-            # Make predictions
-            rsf_prediction = rsf_model.predict(processed_data)
-            
-            # Calculate risk score
-            risk_score = 1 - (rsf_prediction['survival_probability_24m'] / 100)
-            
-            # Add to results
-            # --- MODIFICATION START ---
-            # 3. Use the dynamically identified id_column
-            results.append({
-                'patientId': patient_data.get(id_column, f"PATIENT-{len(results)+1}"),
-                'survivalProbability': rsf_prediction['survival_probability_24m'] / 100,
-                'riskScore': risk_score,
-                'predictedSurvivalMonths': rsf_prediction['median_survival']
-            })
-            # --- MODIFICATION END ---
+        # Score the patients in batches: one preprocessing pass and one model
+        # call per batch instead of one per row
+        results = predict_dataframe(df, preprocessor, rsf_model, id_column=id_column, batch_size=batch_size,
+                                    plan=models.get('preprocessing_plan'), explainers=explainers, columnar=columnar)
+        total_patients = len(results['patientId']) if columnar else len(results)
         
         # Calculate summary statistics
-        high_risk = sum(1 for r in results if r['riskScore'] > 0.6)
-        medium_risk = sum(1 for r in results if 0.3 <= r['riskScore'] <= 0.6)
-        low_risk = sum(1 for r in results if r['riskScore'] < 0.3)
+        summary = RiskSummary().update(results)
+        count_patients(total_patients)
+        
+        with timed('feature_importance'):
+            top_features = generate_shap_values(None, rsf_model, top_n=5)
         
         # Prepare batch response
         response = {
             'fileName': file.filename,
-            'totalPatients': len(results),
+            'totalPatients': total_patients,
             'processedAt': pd.Timestamp.now().isoformat(),
-            'summary': {
-                'averageSurvivalMonths': np.mean([r['predictedSurvivalMonths'] for r in results]) if results else 0,
-                'highRiskPatients': high_risk,
-                'mediumRiskPatients': medium_risk,
-                'lowRiskPatients': low_risk
-            },
-            'modelPerformance': {
-                'cox': {'cIndex': cox_model.get_c_index()},
-                'rsf': {'cIndex': rsf_model.get_c_index()},
-                'deepsurv': {'cIndex': deepsurv_model.get_c_index()}
-            },
-            'topFeatures': generate_shap_values(None, rsf_model, top_n=5),
+            'summary': summary.to_dict(),
+            'modelPerformance': model_performance(),
+            'topFeatures': top_features,
+            'format': fmt,
             'patients': results
         }
         
-        return jsonify(response)
+        with timed('serialize'):
+            return json_response(response)
     
     except Exception as e:
         # Log the error for better debugging on the server side
         print(f"Error during file processing: {e}")
         return jsonify({'error': str(e)}), 500
 
+def stream_file_predictions(file, chunk_size, explainers=None, models=None, columnar=False):
+    """
+    Score an uploaded file chunk by chunk and stream the results back as
+    newline-delimited JSON: one record per patient (or, when columnar, one
+    record of parallel arrays per chunk) followed by a summary record.
+    
+    Args:
+        file: Uploaded werkzeug FileStorage
+        chunk_size: Number of rows parsed and scored per chunk
+        explainers: Optional ExplainerCache for per-patient SHAP attributions
+        models: Registry snapshot to score with, the current models by default
+        columnar: Stream one 'patients' record of columns per chunk
+        
+    Returns:
+        Streaming Flask response
+    """
+    # Flask closes the request's uploaded files as soon as the view returns, before
+    # the response is streamed, so the upload is moved to a spooled file we own
+    upload = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES)
+    shutil.copyfileobj(file.stream, upload)
+    upload.seek(0)
+    
+    # Parse the header up front so a malformed file is still reported with an error status
+    with timed('parse'):
+        id_column, chunks = iter_uploaded_file_chunks(upload, file.filename, chunksize=chunk_size)
+    models = models or registry.snapshot()
+    preprocessor = models.get('preprocessor')
+    plan = models.get('preprocessing_plan')
+    rsf_model = models.get('rsf')
+    
+    def generate():
+        summary = RiskSummary()
+        try:
+            while True:
+                # Chunks are parsed lazily, as the loop pulls them
+                with timed('parse'):
+                    item = next(chunks, None)
+                if item is None:
+                    break
+                start, chunk = item
+                if columnar:
+                    columns = score_columns(chunk, preprocessor, rsf_model, id_column=id_column, start_index=start,
+                                            plan=plan, explainers=explainers)
+                    summary.update(columns)
+                    count_patients(len(columns['patientId']))
+                    with timed('serialize'):
+                        lines = dumps({'type': 'patients', 'start': start, **columns}) + b'\n'
+                else:
+                    results = score_batch(chunk, preprocessor, rsf_model, id_column=id_column, start_index=start,
+                                          plan=plan, explainers=explainers)
+                    summary.update(results)
+                    count_patients(len(results))
+                    with timed('serialize'):
+                        lines = b''.join(dumps({'type': 'patient', **r}) + b'\n' for r in results)
+                yield lines
+        except Exception as e:
+            print(f"Error during streamed file processing: {e}")
+            yield dumps({'type': 'error', 'error': str(e)}) + b'\n'
+            return
+        finally:
+            upload.close()
+        
+        yield dumps({
+            'type': 'summary',
+            'fileName': file.filename,
+            'totalPatients': summary.total_patients,
+            'processedAt': pd.Timestamp.now().isoformat(),
+            'summary': summary.to_dict(),
+            'modelPerformance': model_performance(),
+            'topFeatures': generate_shap_values(None, rsf_model, top_n=5)
+        }) + b'\n'
+    
+    return stream_response(stream_with_context(generate()))
+
+@app.route('/api/status', methods=['GET'])
+def status():
+    """Report startup time and which models have been loaded so far"""
+    return jsonify({'appImportSeconds': APP_IMPORT_SECONDS, **registry.startup_report(),
+                    'hotReload': model_reloader.status()})
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Request and stage latency histograms, scored rows and errors in the Prometheus text format"""
+    MODEL_GENERATION.set(registry.generation)
+    return Response(METRICS.render(), content_type=CONTENT_TYPE)
+
+@app.route('/api/profiles/<profile_id>', methods=['GET'])
+@admin_required
+def get_profile(profile_id):
+    """Report of a profiled request; raw=1 downloads the pstats file instead"""
+    if request.args.get('raw', '').lower() in ('1', 'true', 'yes'):
+        path = profile_store.raw_path(profile_id)
+        if path is None:
+            return jsonify({'error': f"No CPU profile for '{profile_id}'"}), 404
+        return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                         download_name=f"{profile_id}.prof")
+    
+    report = profile_store.load(profile_id)
+    if report is None:
+        return jsonify({'error': f"Unknown or expired profile: '{profile_id}'"}), 404
+    return jsonify(report)
+
+@app.route('/api/reload', methods=['POST'])
+@admin_required
+def reload_models():
+    """Load, validate and swap in the models from MODEL_DIR now, without waiting for the poll"""
+    if model_reloader.request_reload is not None:
+        # Under serve.py the master reloads every worker, so they switch together
+        model_reloader.request_reload()
+        return jsonify({'requested': True, **model_reloader.status()}), 202
+    reloaded = model_reloader.check(force=True)
+    return jsonify({'reloaded': reloaded, **model_reloader.status()}), 200 if reloaded else 500
+
+@app.route('/api/explanations/<job_id>', methods=['GET'])
+def get_explanation(job_id):
+    """Poll an explanation job started by /api/predict"""
+    job = explanation_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f"Unknown or expired explanation job: '{job_id}'"}), 404
+    
+    response = {'id': job['id'], 'status': job['status']}
+    if job['status'] == 'done':
+        response['featureImportance'] = job['result']
+        response['seconds'] = job['finishedAt'] - job['startedAt']
+    elif job['status'] == 'failed':
+        response['error'] = job['error']
+    
+    # 202 while the job is still queued or running
+    return jsonify(response), 200 if job['finishedAt'] is not None else 202
+
+@app.route('/api/cache', methods=['GET', 'DELETE'])
+def cache_stats():
+    """Report prediction cache statistics; DELETE clears the cache"""
+    if request.method == 'DELETE':
+        prediction_cache.clear()
+    return jsonify(prediction_cache.stats())
+
 if __name__ == '__main__':
+    print(f"Backend imported in {APP_IMPORT_SECONDS:.2f}s")
     app.run(debug=True, port=5000)
\ No newline at end of file
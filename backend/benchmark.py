@@ -0,0 +1,309 @@
+"""
+Performance benchmark of the prediction pipeline on synthetic cohorts.
+
+Times preprocessing, every model's batch prediction, SHAP explanations, the
+Kaplan-Meier stage and the /api/predict and /api/upload endpoints (through
+the Flask test client), and writes the results as JSON.
+
+Usage:
+    python benchmark.py --sizes 1000 10000 100000 --output benchmark_results.json
+    python benchmark.py --compare benchmark_results.json --output new_results.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+import pandas as pd
+from utils.synthetic_cohort import generate_cohort, input_fields
+
+def timed(fn, repeat, n_items=1):
+    """
+    Run fn repeatedly and summarize the wall times.
+
+    Args:
+        fn: Callable to time
+        repeat: Number of runs
+        n_items: Number of items (patients, requests) processed per run
+
+    Returns:
+        Dictionary with the run times and their summary statistics
+    """
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+    median = float(np.median(seconds))
+    return {
+        'seconds': seconds,
+        'min': min(seconds),
+        'median': median,
+        'mean': float(np.mean(seconds)),
+        'items': n_items,
+        'itemsPerSecond': n_items / median if median > 0 else None
+    }
+
+def latencies(fn, inputs):
+    """
+    Time fn once per input and summarize the latency distribution.
+
+    Args:
+        fn: Callable taking one input
+        inputs: Inputs to time
+
+    Returns:
+        Dictionary with latency percentiles in seconds
+    """
+    seconds = []
+    for value in inputs:
+        start = time.perf_counter()
+        fn(value)
+        seconds.append(time.perf_counter() - start)
+    seconds = np.array(seconds)
+    return {
+        'requests': len(seconds),
+        'mean': float(seconds.mean()),
+        'p50': float(np.percentile(seconds, 50)),
+        'p95': float(np.percentile(seconds, 95)),
+        'p99': float(np.percentile(seconds, 99)),
+        'max': float(seconds.max())
+    }
+
+def run_stage(results, name, fn):
+    """Run one benchmark stage, recording an error instead of aborting the run"""
+    print(f"  {name}...", end=' ', flush=True)
+    try:
+        results[name] = fn()
+        summary = results[name].get('median', results[name].get('p50'))
+        print(f"{summary:.4f}s" if summary is not None else "done")
+    except Exception as e:
+        results[name] = {'error': f"{type(e).__name__}: {e}"}
+        print(f"failed ({e})")
+
+def check_status(response):
+    """Raise when a test client response is not successful"""
+    if response.status_code >= 400:
+        raise RuntimeError(f"HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return response
+
+def benchmark_size(app_module, cohort, args):
+    """
+    Benchmark the batch stages on one cohort.
+
+    Args:
+        app_module: Imported app module
+        cohort: Synthetic cohort from generate_cohort
+        args: Parsed command line arguments
+
+    Returns:
+        Dictionary of stage name -> timing results
+    """
+    from utils.data_preprocessing import preprocess_input
+    from utils.shap_explainer import ExplainerCache, generate_shap_values
+    from models.km_reference import KaplanMeierReference
+
+    registry = app_module.registry
+    fields = input_fields(cohort)
+    n = len(cohort)
+    results = {}
+
+    preprocessor = registry.get('preprocessor')
+    run_stage(results, 'preprocess_input', lambda: timed(
+        lambda: preprocess_input(fields, preprocessor, row_wise=True), args.repeat, n))
+    plan = registry.get('preprocessing_plan')
+    if plan is not None:
+        run_stage(results, 'preprocessing_plan', lambda: timed(lambda: plan.transform(fields), args.repeat, n))
+
+    processed = app_module.preprocess(fields) if plan is not None else preprocess_input(fields, preprocessor, row_wise=True)
+
+    risk_scores = None
+    for name in app_module.MODEL_CLASSES:
+        def predict_stage(name=name):
+            model = registry.get(name)
+            return timed(lambda: model.predict_batch(processed), args.repeat, n)
+        run_stage(results, f'predict.{name}', predict_stage)
+        if risk_scores is None and 'error' not in results[f'predict.{name}']:
+            risk_scores = 1 - np.asarray(registry.get(name).predict_batch(processed)['survival_probability_24m']) / 100
+
+    # Explanations are far more expensive than scoring, so only a sample is explained
+    n_explained = min(n, args.shap_patients)
+    def shap_stage():
+        background = registry.get('shap_background')
+        if background is None:
+            background = np.asarray(processed, dtype=float)[:1000]
+        explainers = ExplainerCache(background_loader=lambda: background)
+        rsf = registry.get('rsf')
+        sample = processed.iloc[:n_explained]
+        # Build the explainer outside the timed runs, as the server does once
+        explainers.explainer(rsf, list(sample.columns))
+        return timed(lambda: generate_shap_values(sample, rsf, explainers=explainers), args.repeat, n_explained)
+    run_stage(results, 'generate_shap_values', shap_stage)
+
+    def km_fit_stage():
+        if risk_scores is None:
+            raise RuntimeError("no model produced risk scores")
+        return timed(lambda: KaplanMeierReference.from_cohort(cohort['survivalMonths'], cohort['event'], risk_scores),
+                     args.repeat, n)
+    run_stage(results, 'kaplan_meier.fit', km_fit_stage)
+
+    def km_lookup_stage():
+        if risk_scores is None:
+            raise RuntimeError("no model produced risk scores")
+        reference = registry.get('km_reference')
+        sample = risk_scores[:1000]
+        return timed(lambda: [reference.lookup(float(r)) for r in sample], args.repeat, len(sample))
+    run_stage(results, 'kaplan_meier.lookup', km_lookup_stage)
+
+    n_upload = min(n, args.upload_max)
+    csv_bytes = cohort.iloc[:n_upload].drop(columns=['survivalMonths', 'event']).to_csv(index=False).encode('utf-8')
+    client = app_module.app.test_client()
+
+    def upload(stream):
+        data = {'file': (io.BytesIO(csv_bytes), 'cohort.csv')}
+        if stream:
+            data['stream'] = 'true'
+        response = check_status(client.post('/api/upload', data=data, content_type='multipart/form-data'))
+        # Consume the body, so a streamed response is timed to its end
+        response.get_data()
+
+    run_stage(results, 'api.upload', lambda: timed(lambda: upload(False), args.repeat, n_upload))
+    run_stage(results, 'api.upload_stream', lambda: timed(lambda: upload(True), args.repeat, n_upload))
+
+    return results
+
+def benchmark_latency(app_module, cohort, args):
+    """
+    Benchmark single-patient latency: each model's predict and /api/predict.
+
+    Args:
+        app_module: Imported app module
+        cohort: Synthetic cohort to draw patients from
+        args: Parsed command line arguments
+
+    Returns:
+        Dictionary of stage name -> latency results
+    """
+    registry = app_module.registry
+    fields = input_fields(cohort)
+    records = fields.iloc[:args.requests].to_dict(orient='records')
+    results = {}
+
+    processed = [app_module.preprocess(record) for record in records]
+    for name in app_module.MODEL_CLASSES:
+        def predict_stage(name=name):
+            model = registry.get(name)
+            return latencies(model.predict, processed)
+        run_stage(results, f'predict_single.{name}', predict_stage)
+
+    client = app_module.app.test_client()
+    predict_request = lambda record: check_status(client.post('/api/predict', json=record))
+    # Distinct patients miss the prediction cache; repeating the first one hits it
+    run_stage(results, 'api.predict', lambda: latencies(predict_request, records))
+    run_stage(results, 'api.predict_cached', lambda: latencies(predict_request, records[:1] * len(records)))
+
+    return results
+
+def environment(args):
+    """Versions and machine details recorded with the results"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': pd.Timestamp.now().isoformat(),
+        'gitCommit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpuCount': os.cpu_count(),
+        'modelDir': args.model_dir,
+        'sizes': args.sizes,
+        'repeat': args.repeat,
+        'seed': args.seed
+    }
+
+def compare(baseline, current, tolerance):
+    """
+    Compare the median times of two benchmark results.
+
+    Args:
+        baseline: Earlier results loaded from JSON
+        current: New results
+        tolerance: Allowed relative slowdown before a stage counts as a regression
+
+    Returns:
+        List of (section, stage, baseline seconds, current seconds) regressions
+    """
+    regressions = []
+    print(f"\n{'section':<12} {'stage':<28} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for section, stages in current['results'].items():
+        for stage, result in stages.items():
+            old = baseline.get('results', {}).get(section, {}).get(stage, {})
+            old_time = old.get('median', old.get('p50'))
+            new_time = result.get('median', result.get('p50'))
+            if old_time is None or new_time is None or old_time <= 0:
+                continue
+            ratio = new_time / old_time
+            flag = ' !' if ratio > 1 + tolerance else ''
+            print(f"{section:<12} {stage:<28} {old_time:>10.4f} {new_time:>10.4f} {ratio:>7.2f}{flag}")
+            if flag:
+                regressions.append((section, stage, old_time, new_time))
+    return regressions
+
+def parse_args(argv=None):
+    """Parse the command line arguments"""
+    parser = argparse.ArgumentParser(description="Benchmark the survival prediction pipeline on synthetic cohorts")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="Cohort sizes to benchmark (up to 1,000,000)")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per batch stage")
+    parser.add_argument('--requests', type=int, default=50, help="Requests per latency stage")
+    parser.add_argument('--shap-patients', type=int, default=20, help="Patients explained by the SHAP stage")
+    parser.add_argument('--upload-max', type=int, default=100000, help="Maximum rows per uploaded file")
+    parser.add_argument('--seed', type=int, default=42, help="Seed of the synthetic cohorts")
+    parser.add_argument('--model-dir', default=None, help="Model artifact directory (default: the app's MODEL_DIR)")
+    parser.add_argument('--output', default='benchmark_results.json', help="Path of the JSON results")
+    parser.add_argument('--compare', default=None, help="Earlier results to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Relative slowdown reported as a regression by --compare")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Run the benchmark and write the results; returns the exit status"""
+    args = parse_args(argv)
+    if args.model_dir:
+        os.environ['MODEL_DIR'] = os.path.abspath(args.model_dir)
+
+    import app as app_module
+    args.model_dir = app_module.MODEL_DIR
+
+    results = {'latency': {}}
+    print(f"Single-patient latency ({args.requests} requests)")
+    results['latency'] = benchmark_latency(app_module, generate_cohort(args.requests, random_state=args.seed), args)
+
+    for n in args.sizes:
+        print(f"Cohort of {n} patients")
+        cohort = generate_cohort(n, random_state=args.seed)
+        results[str(n)] = benchmark_size(app_module, cohort, args)
+
+    output = {'environment': environment(args), 'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), output, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} stage(s) slower than the baseline by more than {args.tolerance:.0%}")
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
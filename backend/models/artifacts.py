@@ -0,0 +1,243 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import numpy as np
+
+# Model artifact layout: <name>.artifact is a symlink to a versioned directory
+# <name>.artifact.<content hash> holding manifest.json and one .npy file per
+# array. Arrays are memory-mapped read-only on load, so every process serving
+# the same version shares its pages through the OS page cache.
+ARTIFACT_FORMAT = 'survival-model-artifact'
+ARTIFACT_FORMAT_VERSION = 1
+ARTIFACT_SUFFIX = '.artifact'
+MANIFEST_FILE = 'manifest.json'
+# Versions kept next to the current one, for processes still mapping them
+KEEP_PREVIOUS_VERSIONS = 1
+# Names in a model directory that are not published artifacts: version
+# directories (reached through their links), staging paths and temporary links
+UNPUBLISHED_NAME = re.compile(r'^\.|\.artifact\.[0-9a-f]{16}$|\.(tmp|link)-\d+$')
+
+class ModelArtifact:
+    """
+    A loaded model artifact: its arrays, metadata and content hash.
+    """
+
+    def __init__(self, path, kind, arrays, metadata, sha256):
+        """
+        Initialize the artifact.
+
+        Args:
+            path: Artifact path
+            kind: Model kind stored in the artifact (e.g. 'compiled_forest')
+            arrays: Dictionary of name -> array (read-only memory maps when
+                    loaded with mmap=True)
+            metadata: JSON metadata dictionary
+            sha256: Content hash over the kind, the metadata and all arrays
+        """
+        self.path = path
+        self.kind = kind
+        self.arrays = arrays
+        self.metadata = metadata
+        self.sha256 = sha256
+
+def artifact_path(model_path):
+    """Artifact path corresponding to a model file, e.g. rsf_model.pkl -> rsf_model.artifact"""
+    return os.path.splitext(model_path)[0] + ARTIFACT_SUFFIX
+
+def is_artifact(path):
+    """Whether path is a model artifact"""
+    return os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+def resolve_model_path(model_path):
+    """
+    Prefer the memory-mappable artifact of a model over its original file.
+
+    Args:
+        model_path: Path of the pickled or .h5 model file
+
+    Returns:
+        The artifact path if an artifact exists, else model_path
+    """
+    path = artifact_path(model_path)
+    return path if is_artifact(path) else model_path
+
+def _file_sha256(path):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _content_hash(kind, metadata, array_entries):
+    """Hash identifying an artifact version"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps({'kind': kind, 'metadata': metadata}, sort_keys=True).encode('utf-8'))
+    for name in sorted(array_entries):
+        digest.update(name.encode('utf-8'))
+        digest.update(array_entries[name]['sha256'].encode('utf-8'))
+    return digest.hexdigest()
+
+def save_artifact(path, kind, arrays, metadata=None, publish=True):
+    """
+    Write a model artifact and make it the current version.
+    The version directory is written completely before the symlink is
+    switched to it with an atomic rename, so readers never see a partial
+    artifact; processes that mapped the previous version keep working.
+
+    Args:
+        path: Artifact path (e.g. data/trained_models/rsf_model.artifact)
+        kind: Model kind, checked by the loader
+        arrays: Dictionary of name -> numeric NumPy array
+        metadata: JSON-serializable dictionary (feature names, settings)
+        publish: Switch the link to the new version; when False only the
+                 version directory (see version_path) is written, to be
+                 published later with link_artifact
+
+    Returns:
+        Content hash of the written version
+    """
+    metadata = metadata or {}
+    path = os.path.abspath(path)
+    staging = f"{path}.tmp-{os.getpid()}"
+    if os.path.exists(staging):
+        shutil.rmtree(staging)
+    os.makedirs(staging)
+
+    try:
+        entries = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            if array.dtype.hasobject:
+                raise ValueError(f"Array '{name}' has dtype object and cannot be memory-mapped")
+            filename = f"{name}.npy"
+            np.save(os.path.join(staging, filename), array, allow_pickle=False)
+            entries[name] = {
+                'file': filename,
+                'dtype': array.dtype.str,
+                'shape': list(array.shape),
+                'sha256': _file_sha256(os.path.join(staging, filename))
+            }
+
+        sha256 = _content_hash(kind, metadata, entries)
+        manifest = {
+            'format': ARTIFACT_FORMAT,
+            'formatVersion': ARTIFACT_FORMAT_VERSION,
+            'kind': kind,
+            'sha256': sha256,
+            'metadata': metadata,
+            'arrays': entries
+        }
+        with open(os.path.join(staging, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        for filename in os.listdir(staging):
+            with open(os.path.join(staging, filename), 'rb') as f:
+                os.fsync(f.fileno())
+
+        version_dir = version_path(path, sha256)
+        if os.path.isdir(version_dir):
+            # Identical content is already on disk
+            shutil.rmtree(staging)
+        else:
+            os.rename(staging, version_dir)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    if publish:
+        if os.path.isdir(path) and not os.path.islink(path):
+            raise ValueError(f"{path} is a directory, not an artifact link")
+        link_artifact(version_dir, path)
+        remove_old_versions(path)
+    return sha256
+
+def version_path(path, sha256):
+    """Directory holding the version of an artifact with the given content hash"""
+    return f"{path}.{sha256[:16]}"
+
+def link_artifact(version_dir, link_path):
+    """
+    Point a link at an artifact version, replacing an existing link atomically.
+
+    Args:
+        version_dir: Version directory, in the same directory as the link
+        link_path: Link to create or replace; the artifact path itself, or a
+                   staging path that is renamed over it later
+    """
+    link = f"{link_path}.link-{os.getpid()}"
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.basename(version_dir), link)
+    os.replace(link, link_path)
+
+def is_published_name(name):
+    """Whether a name in a model directory is a published artifact or file"""
+    return UNPUBLISHED_NAME.search(name) is None
+
+def remove_old_versions(path):
+    """Delete all but the newest previous versions of an artifact, keeping the current one"""
+    parent, base = os.path.split(os.path.abspath(path))
+    current_dir = os.path.join(parent, os.path.basename(os.path.realpath(path)))
+    versions = [
+        os.path.join(parent, name) for name in os.listdir(parent)
+        if name.startswith(base + '.') and len(name) == len(base) + 17
+        and os.path.join(parent, name) != current_dir and os.path.isfile(os.path.join(parent, name, MANIFEST_FILE))
+    ]
+    versions.sort(key=os.path.getmtime, reverse=True)
+    for old in versions[KEEP_PREVIOUS_VERSIONS:]:
+        shutil.rmtree(old, ignore_errors=True)
+
+def read_manifest(path):
+    """
+    Read and check the manifest of an artifact.
+
+    Args:
+        path: Artifact path
+
+    Returns:
+        Manifest dictionary
+    """
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != ARTIFACT_FORMAT:
+        raise ValueError(f"{path} is not a model artifact")
+    if manifest.get('formatVersion', 0) > ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"{path} uses artifact format version {manifest['formatVersion']}, "
+                         f"this version reads up to {ARTIFACT_FORMAT_VERSION}")
+    return manifest
+
+def load_artifact(path, kind=None, mmap=True, verify=False):
+    """
+    Load a model artifact.
+
+    Args:
+        path: Artifact path
+        kind: Expected model kind; a different kind raises ValueError
+        mmap: Memory-map the arrays read-only instead of reading them into
+              private memory
+        verify: Check every array file against its hash in the manifest
+                (reads all data, so loading is no longer instant)
+
+    Returns:
+        ModelArtifact
+    """
+    # Resolve the link once, so all files come from the same version even if
+    # a new one is published while loading
+    path = os.path.realpath(path)
+    manifest = read_manifest(path)
+    if kind is not None and manifest['kind'] != kind:
+        raise ValueError(f"{path} holds a '{manifest['kind']}' artifact, expected '{kind}'")
+
+    arrays = {}
+    for name, entry in manifest['arrays'].items():
+        file_path = os.path.join(path, entry['file'])
+        if verify and _file_sha256(file_path) != entry['sha256']:
+            raise ValueError(f"Array '{name}' of {path} does not match its hash")
+        array = np.load(file_path, mmap_mode='r' if mmap else None, allow_pickle=False)
+        # Plain ndarray views over the mapping avoid np.memmap overhead on every operation
+        arrays[name] = np.asarray(array)
+
+    return ModelArtifact(path, manifest['kind'], arrays, manifest['metadata'], manifest['sha256'])
@@ -1,6 +1,7 @@
 import pickle
 import numpy as np
-from lifelines import CoxPHFitter
+from models.artifacts import is_artifact, save_artifact, load_artifact
+from models.survival_grid import SERVING_GRID_MONTHS, step_function_at
 
 class CoxModel:
     """
@@ -8,64 +9,158 @@ class CoxModel:
     Time Complexity: O(n²) for partial likelihood estimation
     """
     
+    # Validation C-index (would be calculated during training)
+    DEFAULT_C_INDEX = 0.68
+    
+    ARTIFACT_KIND = 'cox_baseline'
+    BASELINE_ARRAYS = ('coefficients', 'norm_mean', 'times', 'cumulative_hazard', 'grid_cumulative_hazard')
+    
     def __init__(self, model_path=None):
         """
         Initialize the Cox model.
         
         Args:
-            model_path: Path to the saved model file
+            model_path: Path to the saved model file, or to a memory-mappable
+                        artifact of the closed-form predictor
         """
+        self._c_index = self.DEFAULT_C_INDEX
+        
+        if model_path and is_artifact(model_path):
+            # Only the closed-form predictor is stored; no lifelines import needed
+            artifact = load_artifact(model_path, kind=self.ARTIFACT_KIND)
+            self.model = None
+            self.baseline = {'covariates': artifact.metadata['covariates']}
+            self.baseline.update({name: artifact.arrays[name] for name in self.BASELINE_ARRAYS})
+            return
+        
         if model_path:
             with open(model_path, 'rb') as f:
                 self.model = pickle.load(f)
         else:
+            from lifelines import CoxPHFitter
             self.model = CoxPHFitter()
         
-        # Validation C-index (would be calculated during training)
-        self._c_index = 0.68
+        # Closed-form predictor, built once the model is fitted
+        self.baseline = self._compile() if model_path else None
+    
+    def _compile(self):
+        """
+        Extract the coefficients and the baseline cumulative hazard from the
+        fitted lifelines model so predictions become plain array operations.
+        
+        Returns:
+            Dictionary with the predictor arrays, or None if the fitted model
+            does not support the closed form (e.g. stratified models)
+        """
+        try:
+            if getattr(self.model, 'strata', None):
+                return None
+            baseline_hazard = self.model.baseline_cumulative_hazard_
+            if baseline_hazard.shape[1] != 1:
+                return None
+            
+            times = baseline_hazard.index.to_numpy(dtype=float)
+            cumulative_hazard = np.maximum.accumulate(baseline_hazard.iloc[:, 0].to_numpy(dtype=float))
+            
+            return {
+                'covariates': list(self.model.params_.index),
+                'coefficients': self.model.params_.to_numpy(dtype=float),
+                'norm_mean': self.model._norm_mean.to_numpy(dtype=float),
+                'times': times,
+                'cumulative_hazard': cumulative_hazard,
+                'grid_cumulative_hazard': step_function_at(times, cumulative_hazard, SERVING_GRID_MONTHS, initial=0.0)
+            }
+        except Exception as e:
+            print(f"Falling back to lifelines inference, could not compile Cox model: {e}")
+            return None
     
-    def predict(self, data):
+    def predict(self, data, columnar=False):
         """
         Make survival predictions for the input data.
         
         Args:
             data: Preprocessed patient data
+            columnar: Return the survival curve as parallel 'months' and
+                      'survival' arrays under 'curve' instead of 'curve_data'
             
         Returns:
             Dictionary with survival predictions
         """
-        # Calculate survival function
-        survival_func = self.model.predict_survival_function(data)
+        predictions = self.predict_batch(data)
         
-        # Calculate median survival time (in months)
-        median_survival = self.model.predict_median(data)[0]
+        result = {
+            'median_survival': float(predictions['median_survival'][0]),
+            'survival_probability_24m': float(predictions['survival_probability_24m'][0])
+        }
         
-        # Calculate 24-month survival probability
-        survival_prob_24m = 100 * float(survival_func.loc[24].iloc[0]) if 24 in survival_func.index else 70.0
+        if columnar:
+            result['curve'] = {
+                'months': np.asarray(predictions['months']).astype(int).tolist(),
+                'survival': np.asarray(predictions['survival_curves'][0], dtype=float).tolist()
+            }
+            return result
         
         # Generate survival curve data points
-        curve_data = []
-        for t in range(0, 61, 3):  # 0 to 60 months in 3-month intervals
-            if t in survival_func.index:
-                prob = float(survival_func.loc[t].iloc[0])
-            else:
-                # Interpolate if time point not in index
-                t_before = max([i for i in survival_func.index if i < t], default=0)
-                t_after = min([i for i in survival_func.index if i > t], default=60)
-                
-                if t_before == 0 and t_after == 60:
-                    prob = 1.0  # Default for edge case
-                else:
-                    prob_before = float(survival_func.loc[t_before].iloc[0]) if t_before > 0 else 1.0
-                    prob_after = float(survival_func.loc[t_after].iloc[0])
-                    prob = prob_before - ((prob_before - prob_after) * (t - t_before) / (t_after - t_before))
+        result['curve_data'] = [
+            {'month': int(t), 'survival': float(prob)}
+            for t, prob in zip(predictions['months'], predictions['survival_curves'][0])
+        ]
+        
+        return result
+    
+    def predict_batch(self, data):
+        """
+        Make survival predictions for every row of the input data in one pass.
+        With the closed-form predictor, S(t|x) = exp(-H0(t)·exp((x - mean)·beta))
+        is computed for the whole batch as a single outer product.
+        
+        Args:
+            data: Preprocessed data for one or more patients
             
-            curve_data.append({'month': t, 'survival': prob})
+        Returns:
+            Dictionary of arrays with one entry per patient: median survival
+            (capped at the last grid month, 60, like the other models, also when
+            the curve never drops to 0.5), 24-month survival probability (in
+            percent) and the survival curve on the 0-60 month grid
+        """
+        grid_end = float(SERVING_GRID_MONTHS[-1])
+        idx_24m = int(np.abs(SERVING_GRID_MONTHS - 24).argmin())
+        
+        if self.baseline is None:
+            # Generic lifelines path: one call for the whole batch
+            survival_func = self.model.predict_survival_function(data)
+            curves = step_function_at(
+                survival_func.index.to_numpy(dtype=float), survival_func.to_numpy().T, SERVING_GRID_MONTHS
+            )
+            return {
+                'median_survival': np.minimum(np.asarray(self.model.predict_median(data), dtype=float).reshape(-1), grid_end),
+                'survival_probability_24m': 100 * curves[:, idx_24m],
+                'months': SERVING_GRID_MONTHS,
+                'survival_curves': curves
+            }
+        
+        baseline = self.baseline
+        if hasattr(data, 'columns'):
+            X = data[baseline['covariates']].to_numpy(dtype=float)
+        else:
+            X = np.asarray(data, dtype=float)
+        
+        partial_hazard = np.exp((X - baseline['norm_mean']) @ baseline['coefficients'])
+        curves = np.exp(-np.outer(partial_hazard, baseline['grid_cumulative_hazard']))
+        
+        # S(t|x) <= 0.5 exactly when H0(t) >= ln(2) / partial hazard, and H0 is
+        # non-decreasing, so the median is a binary search on the full baseline
+        idx = np.searchsorted(baseline['cumulative_hazard'], np.log(2) / partial_hazard, side='left')
+        times = baseline['times']
+        # Curves that never drop to 0.5, or only after the grid, get its last month
+        median_survival = np.where(idx < len(times), times[np.minimum(idx, len(times) - 1)], grid_end)
+        median_survival = np.minimum(median_survival, grid_end)
         
         return {
             'median_survival': median_survival,
-            'survival_probability_24m': survival_prob_24m,
-            'curve_data': curve_data
+            'survival_probability_24m': 100 * curves[:, idx_24m],
+            'months': SERVING_GRID_MONTHS,
+            'survival_curves': curves
         }
     
     def get_c_index(self):
@@ -82,8 +177,26 @@ class CoxModel:
             event_col: Name of the column with event indicators (1=event, 0=censored)
         """
         self.model.fit(data, duration_col=duration_col, event_col=event_col)
+        self.baseline = self._compile()
         
         # Calculate C-index on validation data (simplified)
         self._c_index = 0.68  # This would be calculated from validation data
         
         return self
+    
+    def save_artifact(self, path, publish=True):
+        """
+        Save the closed-form predictor as a memory-mappable artifact.
+        
+        Args:
+            path: Artifact path (e.g. cox_model.artifact)
+            publish: Make the new version current (see models.artifacts.save_artifact)
+            
+        Returns:
+            Content hash of the artifact
+        """
+        if self.baseline is None:
+            raise ValueError("The model has not been fitted or has no closed-form predictor")
+        arrays = {name: self.baseline[name] for name in self.BASELINE_ARRAYS}
+        return save_artifact(path, self.ARTIFACT_KIND, arrays, {'covariates': [str(c) for c in self.baseline['covariates']]},
+                             publish=publish)
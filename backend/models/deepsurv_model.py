@@ -1,6 +1,15 @@
 import numpy as np
-import tensorflow as tf
-from tensorflow import keras
+from models.artifacts import is_artifact
+from models.numpy_network import NumpyNetwork
+from models.survival_grid import SERVING_GRID_MONTHS
+
+# Baseline survival at different time points (0, 3, 6, ..., 60 months)
+# This is a simplified approach - in practice, you'd use a baseline hazard function
+BASELINE_SURVIVAL = np.array([
+    1.0, 0.98, 0.96, 0.94, 0.92, 0.90, 0.88, 0.86, 0.84, 0.82,
+    0.80, 0.78, 0.76, 0.74, 0.72, 0.70, 0.68, 0.66, 0.64, 0.62,
+    0.60
+])
 
 class DeepSurvModel:
     """
@@ -8,20 +17,51 @@ class DeepSurvModel:
     Time Complexity: O(ep·d·n), where ep = epochs, d = features, n = samples
     """
     
-    def __init__(self, model_path=None):
+    # Validation C-index (would be calculated during training)
+    DEFAULT_C_INDEX = 0.75
+    
+    def __init__(self, model_path=None, input_dim=20):
         """
         Initialize the DeepSurv model.
         
         Args:
-            model_path: Path to the saved model file
+            model_path: Path to the saved model file, or to a memory-mappable
+                        artifact of the network weights
+            input_dim: Number of input features of a new (untrained) network
         """
-        if model_path:
-            self.model = keras.models.load_model(model_path)
+        self.model_path = model_path
+        self._model = None
+        
+        # Inference runs on NumPy copies of the weights; the Keras model is
+        # only loaded when it is needed (training, SHAP)
+        self.network = None
+        if model_path and is_artifact(model_path):
+            # Weights only: there is no Keras model to fall back to
+            self.model_path = None
+            self.network = NumpyNetwork.load(model_path)
+        elif model_path:
+            try:
+                self.network = NumpyNetwork.from_h5(model_path)
+            except Exception as e:
+                print(f"Falling back to Keras inference, could not export network weights: {e}")
+                self._model = self._load_keras_model(model_path)
         else:
-            self.model = self._build_model()
+            self._model = self._build_model(input_dim)
         
-        # Validation C-index (would be calculated during training)
-        self._c_index = 0.75
+        self._c_index = self.DEFAULT_C_INDEX
+    
+    @property
+    def model(self):
+        """Keras model, loaded from model_path on first access"""
+        if self._model is None and self.model_path:
+            self._model = self._load_keras_model(self.model_path)
+        return self._model
+    
+    @staticmethod
+    def _load_keras_model(model_path):
+        """Load a saved Keras model (imports TensorFlow)"""
+        from tensorflow import keras
+        return keras.models.load_model(model_path)
     
     def _build_model(self, input_dim=20):
         """
@@ -33,6 +73,9 @@ class DeepSurvModel:
         Returns:
             Compiled Keras model
         """
+        import tensorflow as tf
+        from tensorflow import keras
+        
         model = keras.Sequential([
             keras.layers.Dense(64, activation='relu', input_shape=(input_dim,)),
             keras.layers.BatchNormalization(),
@@ -46,84 +89,113 @@ class DeepSurvModel:
         
         # Custom loss function for Cox partial likelihood
         def negative_log_likelihood(y_true, y_pred):
-            # y_true contains [event, time]
-            event = y_true[:, 0]
-            risk_scores = y_pred
+            # y_true contains [event, time]. Sorted by descending time, the
+            # risk set of a patient is every patient up to and including it,
+            # so its log-sum-exp is a cumulative sum over the batch.
+            order = tf.argsort(y_true[:, 1], direction='DESCENDING')
+            event = tf.gather(y_true[:, 0], order)
+            risk_scores = tf.gather(y_pred[:, 0], order)
+            log_risk_set = tf.math.cumulative_logsumexp(risk_scores)
             
-            # Calculate negative log partial likelihood
-            # This is a simplified version
-            return -tf.reduce_mean(
-                event * (risk_scores - tf.math.log(
-                    tf.reduce_sum(tf.exp(risk_scores) * tf.cast(y_true[:, 1:2] >= y_true[:, 1:2], tf.float32), axis=0)
-                ))
-            )
+            # Negative log partial likelihood per observed event
+            return -tf.reduce_sum(event * (risk_scores - log_risk_set)) / tf.maximum(tf.reduce_sum(event), 1.0)
         
         model.compile(optimizer=keras.optimizers.Adam(learning_rate=0.001), 
                      loss=negative_log_likelihood)
         
         return model
     
-    def predict(self, data):
+    def predict(self, data, columnar=False):
         """
         Make survival predictions for the input data.
         
         Args:
             data: Preprocessed patient data
+            columnar: Return the survival curve as parallel 'months' and
+                      'survival' arrays under 'curve' instead of 'curve_data'
             
         Returns:
             Dictionary with survival predictions
         """
-        # Get risk scores from the model
-        risk_scores = self.model.predict(data)
+        predictions = self.predict_batch(data)
+        
+        result = {
+            'median_survival': int(predictions['median_survival'][0]),
+            'survival_probability_24m': float(predictions['survival_probability_24m'][0])
+        }
+        
+        if columnar:
+            result['curve'] = {
+                'months': np.asarray(predictions['months']).astype(int).tolist(),
+                'survival': np.asarray(predictions['survival_curves'][0], dtype=float).tolist()
+            }
+            return result
+        
+        # Generate survival curve data points
+        result['curve_data'] = [
+            {'month': int(t), 'survival': float(prob)}
+            for t, prob in zip(predictions['months'], predictions['survival_curves'][0])
+        ]
+        
+        return result
+    
+    def predict_risk(self, data):
+        """
+        Compute the network risk scores.
+        
+        Args:
+            data: Preprocessed data for one or more patients
+            
+        Returns:
+            Array of risk scores, shape (n_patients,)
+        """
+        if self.network is not None:
+            return self.network.predict(data)[:, 0]
+        return np.asarray(self.model.predict(data, verbose=0))[:, 0]
+    
+    def predict_batch(self, data):
+        """
+        Make survival predictions for every row of the input data in one pass.
         
-        # Convert risk scores to survival probabilities
-        # This is a simplified approach - in practice, you'd use a baseline hazard function
-        baseline_survival = np.array([
-            1.0, 0.98, 0.96, 0.94, 0.92, 0.90, 0.88, 0.86, 0.84, 0.82,
-            0.80, 0.78, 0.76, 0.74, 0.72, 0.70, 0.68, 0.66, 0.64, 0.62,
-            0.60
-        ])  # Baseline survival at different time points (0, 3, 6, ..., 60 months)
+        Args:
+            data: Preprocessed data for one or more patients
+            
+        Returns:
+            Dictionary of arrays with one entry per patient: median survival,
+            24-month survival probability (in percent) and the survival curve
+            on the 0-60 month grid
+        """
+        risk_scores = self.predict_risk(data)
         
         # Normalize risk score to be between 0 and 5
-        normalized_risk = (risk_scores[0][0] + 3) / 2  # Assuming risk_scores are centered around 0
-        normalized_risk = max(0, min(5, normalized_risk))  # Clip between 0 and 5
+        # Assuming risk_scores are centered around 0
+        normalized_risk = np.clip((risk_scores + 3) / 2, 0, 5)
         
         # Calculate survival function
-        survival_probs = baseline_survival ** normalized_risk
+        survival_curves = BASELINE_SURVIVAL[np.newaxis, :] ** normalized_risk[:, np.newaxis]
         
         # Calculate median survival time (in months)
-        # Find the first time point where survival probability is <= 0.5
-        median_idx = np.where(survival_probs <= 0.5)[0]
-        if len(median_idx) > 0:
-            median_survival = median_idx[0] * 3  # Convert index to months
-        else:
-            median_survival = 60  # Max follow-up time
+        # Find the first time point where survival probability is <= 0.5,
+        # defaulting to the max follow-up time
+        below_half = survival_curves <= 0.5
+        median_survival = np.where(below_half.any(axis=1), SERVING_GRID_MONTHS[below_half.argmax(axis=1)], 60)
         
         # Calculate 24-month survival probability
         idx_24m = 24 // 3  # Index for 24 months
-        survival_prob_24m = 100 * survival_probs[idx_24m]
-        
-        # Generate survival curve data points
-        curve_data = []
-        for i, t in enumerate(range(0, 61, 3)):  # 0 to 60 months in 3-month intervals
-            if i < len(survival_probs):
-                prob = float(survival_probs[i])
-            else:
-                prob = float(survival_probs[-1])  # Use last available probability
-            
-            curve_data.append({'month': t, 'survival': prob})
+        survival_prob_24m = 100 * survival_curves[:, idx_24m]
         
         return {
             'median_survival': median_survival,
             'survival_probability_24m': survival_prob_24m,
-            'curve_data': curve_data
+            'months': SERVING_GRID_MONTHS,
+            'survival_curves': survival_curves
         }
     
     def get_c_index(self):
         """Return the validation C-index of the model"""
         return self._c_index
     
-    def train(self, X, y, epochs=100, batch_size=32, validation_split=0.2):
+    def train(self, X, y, epochs=100, batch_size=32, validation_split=0.2, verbose=1):
         """
         Train the DeepSurv model.
         
@@ -133,6 +205,7 @@ class DeepSurvModel:
             epochs: Number of training epochs
             batch_size: Batch size for training
             validation_split: Fraction of data to use for validation
+            verbose: Keras progress output (0 = silent)
         """
         # Convert structured array to format expected by the model
         y_train = np.column_stack([
@@ -146,10 +219,28 @@ class DeepSurvModel:
             epochs=epochs,
             batch_size=batch_size,
             validation_split=validation_split,
-            verbose=1
+            verbose=verbose
         )
         
+        # Refresh the NumPy copy of the weights used for inference
+        self.network = NumpyNetwork.from_keras(self.model)
+        
         # Calculate C-index on validation data (simplified)
         self._c_index = 0.75  # This would be calculated from validation data
         
         return self
+    
+    def save_artifact(self, path, publish=True):
+        """
+        Save the network weights as a memory-mappable artifact.
+        
+        Args:
+            path: Artifact path (e.g. deepsurv_model.artifact)
+            publish: Make the new version current (see models.artifacts.save_artifact)
+            
+        Returns:
+            Content hash of the artifact
+        """
+        if self.network is None:
+            self.network = NumpyNetwork.from_keras(self.model)
+        return self.network.save(path, publish=publish)
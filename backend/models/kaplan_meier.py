@@ -1,6 +1,197 @@
 import numpy as np
 import pandas as pd
-from lifelines import KaplanMeierFitter
+
+# Two-sided standard normal quantiles for the supported confidence levels
+NORMAL_QUANTILES = {0.10: 1.6448536269514722, 0.05: 1.959963984540054, 0.01: 2.5758293035489004}
+
+def _segmented_cumsum(values, row_starts):
+    """
+    Cumulative sum that restarts at the beginning of every segment.
+    
+    Args:
+        values: Values to accumulate
+        row_starts: First row of the segment each row belongs to
+    
+    Returns:
+        Array of per-segment running sums
+    """
+    total = np.cumsum(values)
+    return total - total[row_starts] + values[row_starts]
+
+class GroupedKaplanMeier:
+    """
+    NumPy-native Kaplan-Meier estimator for one or many groups at once.
+    All groups are fitted from a single sort over (group, time); survival,
+    exponential Greenwood (log-log) confidence intervals and medians are
+    computed with vectorized segmented cumulative sums.
+    Time Complexity: O(n log n) for n samples, regardless of the number of groups
+    """
+    
+    def __init__(self, alpha=0.05):
+        """
+        Initialize the estimator.
+        
+        Args:
+            alpha: Significance level of the confidence intervals (0.10, 0.05 or 0.01)
+        """
+        if alpha not in NORMAL_QUANTILES:
+            raise ValueError(f"alpha must be one of {sorted(NORMAL_QUANTILES)}")
+        self.alpha = alpha
+        self.is_fitted = False
+    
+    def fit(self, durations, event_observed, groups=None):
+        """
+        Fit Kaplan-Meier curves for every group.
+        
+        Args:
+            durations: Array of survival times
+            event_observed: Array of event indicators (1=event, 0=censored)
+            groups: Optional group label of every sample; a single curve is
+                    fitted when omitted
+        
+        Returns:
+            self
+        """
+        durations = np.asarray(durations, dtype=float)
+        events = np.asarray(event_observed).astype(bool)
+        if groups is None:
+            labels, group_idx = np.array([None], dtype=object), np.zeros(len(durations), dtype=np.int64)
+        else:
+            labels, group_idx = np.unique(np.asarray(groups), return_inverse=True)
+            group_idx = group_idx.reshape(-1)
+        
+        # One sort over (group, time)
+        order = np.lexsort((durations, group_idx))
+        time_sorted = durations[order]
+        group_sorted = group_idx[order]
+        event_sorted = events[order].astype(np.int64)
+        n = len(time_sorted)
+        
+        # Collapse to unique (group, time) rows
+        is_new = np.r_[True, (group_sorted[1:] != group_sorted[:-1]) | (time_sorted[1:] != time_sorted[:-1])]
+        starts = np.flatnonzero(is_new)
+        times = time_sorted[starts]
+        row_group = group_sorted[starts]
+        deaths = np.add.reduceat(event_sorted, starts) if n else np.zeros(0, dtype=np.int64)
+        
+        # At risk: group size minus the samples of the group before this time
+        group_sizes = np.bincount(group_idx, minlength=len(labels))
+        group_offsets = np.r_[0, np.cumsum(group_sizes)[:-1]]
+        at_risk = group_sizes[row_group] - (starts - group_offsets[row_group])
+        
+        # First row of every group in the collapsed arrays
+        self._group_starts = np.searchsorted(row_group, np.arange(len(labels)), side='left')
+        row_starts = self._group_starts[row_group]
+        
+        # Survival as a product of (1 - d/n) per group; factors of exactly 0
+        # are counted separately so the log stays finite
+        factor = 1 - deaths / at_risk
+        is_zero = factor <= 0
+        log_survival = _segmented_cumsum(np.log(np.where(is_zero, 1.0, factor)), row_starts)
+        zero_count = _segmented_cumsum(is_zero.astype(np.int64), row_starts)
+        survival = np.where(zero_count > 0, 0.0, np.exp(log_survival))
+        
+        # Greenwood sum of d / (n (n - d)), skipping rows where everyone dies
+        with np.errstate(divide='ignore', invalid='ignore'):
+            greenwood_terms = np.where(is_zero, 0.0, deaths / (at_risk * (at_risk - deaths)))
+        greenwood = _segmented_cumsum(greenwood_terms, row_starts)
+        
+        # Exponential Greenwood (log-log) confidence intervals
+        z = NORMAL_QUANTILES[self.alpha]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            v = np.log(survival)
+            spread = z * np.sqrt(greenwood) / v
+            lower = np.exp(-np.exp(np.log(-v) - spread))
+            upper = np.exp(-np.exp(np.log(-v) + spread))
+        lower = np.where(np.isnan(lower), 1.0, lower)
+        upper = np.where(np.isnan(upper), 1.0, upper)
+        
+        # Median: first time at which survival drops to 0.5 or below
+        median = np.full(len(labels), np.inf)
+        below_half = np.flatnonzero(survival <= 0.5)
+        found_groups, first = np.unique(row_group[below_half], return_index=True)
+        median[found_groups] = times[below_half[first]]
+        
+        self.labels_ = labels
+        self.times_ = times
+        self.row_group_ = row_group
+        self.at_risk_ = at_risk
+        self.deaths_ = deaths
+        self.survival_ = survival
+        self.lower_ = lower
+        self.upper_ = upper
+        self.median_survival_ = median
+        self.is_fitted = True
+        
+        return self
+    
+    def select(self, label):
+        """
+        Extract the curve of a single group as its own fitted estimator.
+        
+        Args:
+            label: Group label
+        
+        Returns:
+            Single-group GroupedKaplanMeier
+        """
+        g = self.group_index(label)
+        rows = self.row_group_ == g
+        
+        single = GroupedKaplanMeier(self.alpha)
+        single.labels_ = np.array([None], dtype=object)
+        single._group_starts = np.zeros(1, dtype=np.int64)
+        single.row_group_ = np.zeros(int(rows.sum()), dtype=np.int64)
+        for name in ('times_', 'at_risk_', 'deaths_', 'survival_', 'lower_', 'upper_'):
+            setattr(single, name, getattr(self, name)[rows])
+        single.median_survival_ = self.median_survival_[[g]]
+        single.is_fitted = True
+        return single
+    
+    def group_index(self, label):
+        """Return the row of a group label in the predict() output"""
+        if label is None and self.labels_[0] is None:
+            return 0
+        idx = np.flatnonzero(self.labels_ == label)
+        if idx.size == 0:
+            raise KeyError(f"Unknown group: {label}")
+        return int(idx[0])
+    
+    def predict(self, times):
+        """
+        Evaluate all fitted curves on a time grid.
+        
+        Args:
+            times: Time points for prediction
+        
+        Returns:
+            Dictionary with (n_groups, n_times) arrays of survival
+            probabilities and lower/upper confidence limits
+        """
+        if not self.is_fitted:
+            raise ValueError("Model must be fitted before prediction")
+        
+        times = np.asarray(times, dtype=float)
+        n_groups = len(self.labels_)
+        
+        # Shift every group into its own disjoint time range so a single
+        # searchsorted over the concatenated curves serves all groups
+        origin = min(self.times_.min(initial=0.0), times.min(initial=0.0))
+        span = max(self.times_.max(initial=0.0), times.max(initial=0.0)) - origin + 1
+        keys = (self.times_ - origin) + self.row_group_ * span
+        queries = (times[np.newaxis, :] - origin) + np.arange(n_groups)[:, np.newaxis] * span
+        
+        pos = np.searchsorted(keys, queries, side='right') - 1
+        # Before a group's first time the curve is still at 1
+        valid = pos >= self._group_starts[:, np.newaxis]
+        pos = np.maximum(pos, 0)
+        
+        return {
+            'times': times,
+            'survival': np.where(valid, self.survival_[pos], 1.0),
+            'lower': np.where(valid, self.lower_[pos], 1.0),
+            'upper': np.where(valid, self.upper_[pos], 1.0)
+        }
 
 class KaplanMeierModel:
     """
@@ -10,11 +201,12 @@ class KaplanMeierModel:
     
     def __init__(self):
         """Initialize the Kaplan-Meier estimator."""
-        self.model = KaplanMeierFitter()
+        self.model = GroupedKaplanMeier()
         self.is_fitted = False
+        self.label = None
         self.survival_function = None
         self.confidence_intervals = None
-        
+    
     def fit(self, durations, event_observed, label=None):
         """
         Fit the Kaplan-Meier estimator.
@@ -24,12 +216,27 @@ class KaplanMeierModel:
             event_observed: Array of event indicators (1=event, 0=censored)
             label: Optional label for the survival curve
         """
-        self.model.fit(durations, event_observed, label=label)
+        return self._set_estimator(GroupedKaplanMeier().fit(durations, event_observed), label)
+    
+    def _set_estimator(self, estimator, label=None):
+        """
+        Use an already fitted single-group estimator.
+        
+        Args:
+            estimator: Fitted single-group GroupedKaplanMeier
+            label: Optional label for the survival curve
+        """
+        self.model = estimator
         self.is_fitted = True
+        self.label = label or "KM_estimate"
         
         # Store survival function and confidence intervals
-        self.survival_function = self.model.survival_function_
-        self.confidence_intervals = self.model.confidence_interval_
+        index = pd.Index(self.model.times_, name='timeline')
+        self.survival_function = pd.DataFrame({self.label: self.model.survival_}, index=index)
+        self.confidence_intervals = pd.DataFrame({
+            f'{self.label}_lower_{1 - self.model.alpha:g}': self.model.lower_,
+            f'{self.label}_upper_{1 - self.model.alpha:g}': self.model.upper_
+        }, index=index)
         
         return self
     
@@ -39,7 +246,7 @@ class KaplanMeierModel:
         
         Args:
             times: Array of time points for prediction
-            
+        
         Returns:
             Dictionary with survival probabilities and confidence intervals
         """
@@ -49,54 +256,13 @@ class KaplanMeierModel:
         if times is None:
             times = np.arange(0, 61, 3)  # 0 to 60 months in 3-month intervals
         
-        # Get survival probabilities at specified times
-        survival_probs = []
-        upper_ci = []
-        lower_ci = []
-        
-        for t in times:
-            # Find the closest time point in the survival function
-            if t in self.survival_function.index:
-                prob = float(self.survival_function.iloc[self.survival_function.index.get_loc(t), 0])
-                upper = float(self.confidence_intervals.iloc[self.confidence_intervals.index.get_loc(t), 1])
-                lower = float(self.confidence_intervals.iloc[self.confidence_intervals.index.get_loc(t), 0])
-            else:
-                # Interpolate if exact time not available
-                available_times = self.survival_function.index
-                if t < available_times.min():
-                    prob = 1.0
-                    upper = 1.0
-                    lower = 1.0
-                elif t > available_times.max():
-                    prob = float(self.survival_function.iloc[-1, 0])
-                    upper = float(self.confidence_intervals.iloc[-1, 1])
-                    lower = float(self.confidence_intervals.iloc[-1, 0])
-                else:
-                    # Linear interpolation
-                    idx = available_times.searchsorted(t)
-                    t1, t2 = available_times[idx-1], available_times[idx]
-                    
-                    prob1 = float(self.survival_function.iloc[idx-1, 0])
-                    prob2 = float(self.survival_function.iloc[idx, 0])
-                    prob = prob1 + (prob2 - prob1) * (t - t1) / (t2 - t1)
-                    
-                    upper1 = float(self.confidence_intervals.iloc[idx-1, 1])
-                    upper2 = float(self.confidence_intervals.iloc[idx, 1])
-                    upper = upper1 + (upper2 - upper1) * (t - t1) / (t2 - t1)
-                    
-                    lower1 = float(self.confidence_intervals.iloc[idx-1, 0])
-                    lower2 = float(self.confidence_intervals.iloc[idx, 0])
-                    lower = lower1 + (lower2 - lower1) * (t - t1) / (t2 - t1)
-            
-            survival_probs.append(prob)
-            upper_ci.append(upper)
-            lower_ci.append(lower)
+        curves = self.model.predict(times)
         
         return {
             'times': times,
-            'survival_probabilities': survival_probs,
-            'upper_confidence': upper_ci,
-            'lower_confidence': lower_ci
+            'survival_probabilities': curves['survival'][0].tolist(),
+            'upper_confidence': curves['upper'][0].tolist(),
+            'lower_confidence': curves['lower'][0].tolist()
         }
     
     def get_median_survival(self):
@@ -109,7 +275,7 @@ class KaplanMeierModel:
         if not self.is_fitted:
             raise ValueError("Model must be fitted before getting median survival")
         
-        return self.model.median_survival_time_
+        return float(self.model.median_survival_[0])
     
     def get_survival_at_time(self, time):
         """
@@ -117,14 +283,14 @@ class KaplanMeierModel:
         
         Args:
             time: Time point for survival probability
-            
+        
         Returns:
             Survival probability at the specified time
         """
         if not self.is_fitted:
             raise ValueError("Model must be fitted before prediction")
         
-        return self.model.survival_function_at_times(time).iloc[0]
+        return float(self.model.predict([time])['survival'][0, 0])
     
     @staticmethod
     def compare_groups(group1_durations, group1_events, group2_durations, group2_events, 
@@ -139,32 +305,35 @@ class KaplanMeierModel:
             group2_events: Event indicators for group 2
             group1_label: Label for group 1
             group2_label: Label for group 2
-            
+        
         Returns:
             Dictionary with fitted models and comparison data
         """
-        # Fit Kaplan-Meier for each group
-        km1 = KaplanMeierModel()
-        km1.fit(group1_durations, group1_events, label=group1_label)
-        
-        km2 = KaplanMeierModel()
-        km2.fit(group2_durations, group2_events, label=group2_label)
+        # Fit Kaplan-Meier for both groups in one batched pass
+        grouped = GroupedKaplanMeier().fit(
+            np.concatenate([np.asarray(group1_durations, dtype=float), np.asarray(group2_durations, dtype=float)]),
+            np.concatenate([np.asarray(group1_events), np.asarray(group2_events)]),
+            np.r_[np.zeros(len(group1_durations), dtype=int), np.ones(len(group2_durations), dtype=int)]
+        )
+        km1 = KaplanMeierModel()._set_estimator(grouped.select(0), label=group1_label)
+        km2 = KaplanMeierModel()._set_estimator(grouped.select(1), label=group2_label)
         
         # Generate comparison data
         times = np.arange(0, 61, 3)
-        group1_data = km1.predict_survival_function(times)
-        group2_data = km2.predict_survival_function(times)
+        curves = grouped.predict(times)
         
+        key1 = group1_label.lower().replace(" ", "_")
+        key2 = group2_label.lower().replace(" ", "_")
         comparison_data = []
         for i, t in enumerate(times):
             comparison_data.append({
                 'month': t,
-                f'{group1_label.lower().replace(" ", "_")}': group1_data['survival_probabilities'][i],
-                f'{group2_label.lower().replace(" ", "_")}': group2_data['survival_probabilities'][i],
-                f'{group1_label.lower().replace(" ", "_")}_upper': group1_data['upper_confidence'][i],
-                f'{group1_label.lower().replace(" ", "_")}_lower': group1_data['lower_confidence'][i],
-                f'{group2_label.lower().replace(" ", "_")}_upper': group2_data['upper_confidence'][i],
-                f'{group2_label.lower().replace(" ", "_")}_lower': group2_data['lower_confidence'][i],
+                f'{key1}': float(curves['survival'][0, i]),
+                f'{key2}': float(curves['survival'][1, i]),
+                f'{key1}_upper': float(curves['upper'][0, i]),
+                f'{key1}_lower': float(curves['lower'][0, i]),
+                f'{key2}_upper': float(curves['upper'][1, i]),
+                f'{key2}_lower': float(curves['lower'][1, i]),
             })
         
         return {
@@ -187,9 +356,13 @@ class KaplanMeierModel:
         
         import matplotlib.pyplot as plt
         
+        times = np.r_[0, self.model.times_]
         plt.figure(figsize=(10, 6))
-        self.model.plot_survival_function(title=title)
+        plt.step(times, np.r_[1, self.model.survival_], where='post', label=self.label)
+        plt.fill_between(times, np.r_[1, self.model.lower_], np.r_[1, self.model.upper_], step='post', alpha=0.3)
+        plt.title(title)
         plt.xlabel('Time (months)')
         plt.ylabel('Survival Probability')
+        plt.legend()
         plt.grid(True, alpha=0.3)
         plt.show()
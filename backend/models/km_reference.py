@@ -0,0 +1,172 @@
+import pickle
+import numpy as np
+from models.kaplan_meier import GroupedKaplanMeier
+
+# Risk score strata: 10 equal-width bins over [0, 1]
+RISK_BIN_EDGES = np.linspace(0, 1, 11)
+
+class KaplanMeierReference:
+    """
+    Precomputed Kaplan-Meier reference curves, one per risk-score stratum.
+    Built once from a cohort (at training time or startup) so that the request
+    path is a constant-time lookup instead of a Kaplan-Meier refit.
+    """
+
+    def __init__(self, bin_edges, strata):
+        """
+        Initialize the reference table.
+
+        Args:
+            bin_edges: Sorted risk score bin edges, shape (n_bins + 1,)
+            strata: One entry per bin with the median survival and the
+                    survival curve with its confidence bands, in API format
+        """
+        self.bin_edges = np.asarray(bin_edges, dtype=float)
+        self.strata = strata
+        self.columnar_strata = [self._to_columnar(entry) for entry in strata]
+
+    @staticmethod
+    def _to_columnar(entry):
+        """Copy of a reference table entry with the survival curve as parallel arrays"""
+        curve = entry['survivalCurve']
+        return {
+            **entry,
+            'survivalCurve': {
+                field: [point[field] for point in curve]
+                for field in ('month', 'survival', 'upper_ci', 'lower_ci')
+            }
+        }
+
+    @staticmethod
+    def _build_strata(bin_edges, durations, events, strata_idx):
+        """
+        Fit the curves of all strata in one batched Kaplan-Meier pass and
+        format them as reference table entries.
+
+        Args:
+            bin_edges: Risk score bin edges
+            durations: Survival times of all (possibly repeated) samples
+            events: Event indicators of all samples
+            strata_idx: Stratum index of every sample
+
+        Returns:
+            List of reference table entries, one per stratum
+        """
+        times = np.arange(0, 61, 3)  # 0 to 60 months in 3-month intervals
+        km_model = GroupedKaplanMeier().fit(durations, events, strata_idx)
+        curves = km_model.predict(times)
+
+        strata = []
+        for row, b in enumerate(km_model.labels_):
+            strata.append({
+                'riskStratum': {'lower': round(float(bin_edges[b]), 6), 'upper': round(float(bin_edges[b + 1]), 6)},
+                'medianSurvival': float(km_model.median_survival_[row]),
+                'survivalCurve': [
+                    {
+                        'month': int(t),
+                        'survival': float(s),
+                        'upper_ci': float(u),
+                        'lower_ci': float(l)
+                    }
+                    for t, s, u, l in zip(times, curves['survival'][row], curves['upper'][row], curves['lower'][row])
+                ]
+            })
+        return strata
+
+    @classmethod
+    def from_cohort(cls, durations, events, risk_scores, bin_edges=RISK_BIN_EDGES, min_patients=20):
+        """
+        Build reference curves from a cohort with known outcomes.
+
+        Args:
+            durations: Survival times (months)
+            events: Event indicators (1=event, 0=censored)
+            risk_scores: Model risk scores in [0, 1] for the same patients
+            bin_edges: Risk score bin edges
+            min_patients: Minimum number of patients per curve; sparse strata
+                          borrow patients from neighbouring bins
+
+        Returns:
+            KaplanMeierReference instance
+        """
+        durations = np.asarray(durations, dtype=float)
+        events = np.asarray(events, dtype=int)
+        bins = cls._bin_index(bin_edges, risk_scores)
+        n_bins = len(bin_edges) - 1
+        counts = np.bincount(bins, minlength=n_bins)
+
+        members = []
+        for b in range(n_bins):
+            # Widen the window symmetrically until it holds enough patients
+            lo, hi = b, b
+            while counts[lo:hi + 1].sum() < min(min_patients, len(durations)) and (lo > 0 or hi < n_bins - 1):
+                lo, hi = max(lo - 1, 0), min(hi + 1, n_bins - 1)
+            members.append(np.flatnonzero((bins >= lo) & (bins <= hi)))
+
+        # Patients shared by several windows are repeated, once per stratum
+        idx = np.concatenate(members)
+        strata_idx = np.repeat(np.arange(n_bins), [len(m) for m in members])
+
+        return cls(bin_edges, cls._build_strata(bin_edges, durations[idx], events[idx], strata_idx))
+
+    @classmethod
+    def from_synthetic(cls, bin_edges=RISK_BIN_EDGES, n_patients=100, base_survival=36, event_rate=0.7):
+        """
+        Build reference curves from synthetic exponential survival data,
+        for deployments without a saved training cohort. Each stratum is
+        simulated at its bin centre.
+
+        Args:
+            bin_edges: Risk score bin edges
+            n_patients: Number of simulated patients per stratum
+            base_survival: Mean survival time (months) at zero risk
+            event_rate: Fraction of simulated patients with an observed event
+
+        Returns:
+            KaplanMeierReference instance
+        """
+        survival_times, event_indicators = [], []
+        for lower, upper in zip(bin_edges[:-1], bin_edges[1:]):
+            risk_factor = 1 - (lower + upper) / 2
+            rng = np.random.RandomState(42)  # For reproducible results
+            survival_times.append(rng.exponential(base_survival * risk_factor, n_patients))
+            event_indicators.append(rng.binomial(1, event_rate, n_patients))
+
+        strata_idx = np.repeat(np.arange(len(bin_edges) - 1), n_patients)
+        return cls(bin_edges, cls._build_strata(
+            bin_edges, np.concatenate(survival_times), np.concatenate(event_indicators), strata_idx
+        ))
+
+    @staticmethod
+    def _bin_index(bin_edges, risk_scores):
+        """Map risk scores to stratum indices, clipping to the outer bins"""
+        idx = np.searchsorted(bin_edges, risk_scores, side='right') - 1
+        return np.clip(idx, 0, len(bin_edges) - 2)
+
+    def lookup(self, risk_score, columnar=False):
+        """
+        Return the reference curve for a patient's risk score.
+
+        Args:
+            risk_score: Risk score in [0, 1]
+            columnar: Return the survival curve as parallel arrays (month,
+                      survival, upper_ci, lower_ci) instead of one dictionary
+                      per time point
+
+        Returns:
+            Dictionary with the risk stratum, median survival and survival curve
+        """
+        strata = self.columnar_strata if columnar else self.strata
+        return strata[int(self._bin_index(self.bin_edges, risk_score))]
+
+    def save(self, path):
+        """Save the reference table with pickle"""
+        with open(path, 'wb') as f:
+            pickle.dump({'bin_edges': self.bin_edges, 'strata': self.strata}, f)
+
+    @classmethod
+    def load(cls, path):
+        """Load a reference table saved with save()"""
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        return cls(state['bin_edges'], state['strata'])
@@ -0,0 +1,237 @@
+import json
+import numpy as np
+from models.artifacts import save_artifact, load_artifact
+
+ACTIVATIONS = {
+    None: lambda x: x,
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+    'tanh': np.tanh,
+    'softplus': lambda x: np.logaddexp(0, x),
+    'elu': lambda x: np.where(x > 0, x, np.expm1(np.minimum(x, 0))),
+    'selu': lambda x: 1.0507009873554805 * np.where(x > 0, x, 1.6732632423543772 * np.expm1(np.minimum(x, 0))),
+}
+
+# Layers that are the identity at inference time
+PASSTHROUGH_LAYERS = {'InputLayer', 'Dropout', 'GaussianNoise', 'GaussianDropout', 'AlphaDropout'}
+
+class NumpyNetwork:
+    """
+    Inference-only forward pass for a sequential Keras network of
+    Dense/BatchNormalization/Dropout layers, using plain NumPy arrays.
+    Avoids the per-call setup cost of keras predict and does not need
+    TensorFlow to be imported.
+    """
+
+    ARTIFACT_KIND = 'numpy_network'
+
+    def __init__(self, layers):
+        """
+        Initialize the network.
+
+        Args:
+            layers: List of (kind, params) tuples where kind is 'dense',
+                    'batchnorm' or 'activation'
+        """
+        self.layers = layers
+
+    @classmethod
+    def from_h5(cls, path):
+        """
+        Export the weights of a Keras .h5 model file.
+
+        Args:
+            path: Path to the saved .h5 model
+
+        Returns:
+            NumpyNetwork instance
+        """
+        import h5py
+
+        with h5py.File(path, 'r') as f:
+            config = f.attrs['model_config']
+            config = json.loads(config.decode('utf-8') if isinstance(config, bytes) else config)
+            weights_root = f['model_weights'] if 'model_weights' in f else f
+
+            def layer_weights(name):
+                # Keras 2 stores "<layer>/<layer>/kernel:0", Keras 3 nests one
+                # level deeper; both end in the weight name
+                found = {}
+
+                def collect(key, obj):
+                    if isinstance(obj, h5py.Dataset):
+                        found[key.split('/')[-1].split(':')[0]] = obj[()]
+
+                if name in weights_root:
+                    weights_root[name].visititems(collect)
+                return found
+
+            layers = [
+                (layer['class_name'], layer['config'], layer_weights(layer['config'].get('name')))
+                for layer in cls._sequential_layers(config)
+            ]
+
+        return cls(cls._convert(layers))
+
+    @classmethod
+    def from_keras(cls, model):
+        """
+        Export the weights of an in-memory Keras Sequential model.
+
+        Args:
+            model: Keras Sequential model
+
+        Returns:
+            NumpyNetwork instance
+        """
+        layers = []
+        for layer in model.layers:
+            names = [w.name.split('/')[-1].split(':')[0] for w in layer.weights]
+            layers.append((type(layer).__name__, layer.get_config(), dict(zip(names, layer.get_weights()))))
+        return cls(cls._convert(layers))
+
+    @staticmethod
+    def _sequential_layers(config):
+        """Return the layer configs of a serialized Sequential model"""
+        if config.get('class_name') != 'Sequential':
+            raise NotImplementedError(f"Only Sequential models are supported, got {config.get('class_name')}")
+        layers = config['config']
+        # Older Keras versions serialize the layer list directly
+        return layers['layers'] if isinstance(layers, dict) else layers
+
+    @staticmethod
+    def _convert(layers):
+        """
+        Convert (class name, config, weights) triples into forward-pass steps.
+
+        Args:
+            layers: List of (class_name, config, weights dict) tuples
+
+        Returns:
+            List of (kind, params) tuples
+        """
+        steps = []
+        for class_name, config, weights in layers:
+            if class_name in PASSTHROUGH_LAYERS:
+                continue
+
+            if class_name == 'Dense':
+                activation = config.get('activation')
+                if activation not in ACTIVATIONS:
+                    raise NotImplementedError(f"Unsupported activation: {activation}")
+                kernel = np.asarray(weights['kernel'], dtype=np.float32)
+                bias = np.asarray(weights['bias'], dtype=np.float32) if config.get('use_bias', True) else None
+                steps.append(('dense', (kernel, bias, activation)))
+
+            elif class_name == 'BatchNormalization':
+                axis = config.get('axis', -1)
+                if axis not in (-1, 1, [-1], [1]):
+                    raise NotImplementedError(f"Unsupported BatchNormalization axis: {axis}")
+                mean = np.asarray(weights['moving_mean'], dtype=np.float32)
+                variance = np.asarray(weights['moving_variance'], dtype=np.float32)
+                gamma = np.asarray(weights['gamma'], dtype=np.float32) if config.get('scale', True) else np.ones_like(mean)
+                beta = np.asarray(weights['beta'], dtype=np.float32) if config.get('center', True) else np.zeros_like(mean)
+                # Fold the normalization into a single scale and shift
+                scale = gamma / np.sqrt(variance + config.get('epsilon', 1e-3))
+                steps.append(('batchnorm', (scale, beta - mean * scale)))
+
+            elif class_name == 'Activation':
+                activation = config.get('activation')
+                if activation not in ACTIVATIONS:
+                    raise NotImplementedError(f"Unsupported activation: {activation}")
+                steps.append(('activation', activation))
+
+            else:
+                raise NotImplementedError(f"Unsupported layer type: {class_name}")
+
+        return steps
+
+    def save(self, path, metadata=None, publish=True):
+        """
+        Save the network as a memory-mappable artifact.
+
+        Args:
+            path: Artifact path
+            metadata: Additional JSON metadata
+            publish: Make the new version current (see save_artifact)
+
+        Returns:
+            Content hash of the artifact
+        """
+        arrays, layers = {}, []
+        for i, (kind, params) in enumerate(self.layers):
+            if kind == 'dense':
+                kernel, bias, activation = params
+                arrays[f'layer{i}_kernel'] = kernel
+                if bias is not None:
+                    arrays[f'layer{i}_bias'] = bias
+                layers.append({'kind': kind, 'activation': activation, 'bias': bias is not None})
+            elif kind == 'batchnorm':
+                arrays[f'layer{i}_scale'], arrays[f'layer{i}_shift'] = params
+                layers.append({'kind': kind})
+            else:
+                layers.append({'kind': kind, 'activation': params})
+        return save_artifact(path, self.ARTIFACT_KIND, arrays, dict(metadata or {}, layers=layers), publish=publish)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load a network from an artifact; the weights are memory-mapped read-only.
+
+        Args:
+            path: Artifact path
+            mmap: Memory-map the weights instead of reading them
+
+        Returns:
+            NumpyNetwork instance
+        """
+        artifact = load_artifact(path, kind=cls.ARTIFACT_KIND, mmap=mmap)
+        arrays = artifact.arrays
+        layers = []
+        for i, layer in enumerate(artifact.metadata['layers']):
+            if layer['kind'] == 'dense':
+                bias = arrays[f'layer{i}_bias'] if layer['bias'] else None
+                layers.append(('dense', (arrays[f'layer{i}_kernel'], bias, layer['activation'])))
+            elif layer['kind'] == 'batchnorm':
+                layers.append(('batchnorm', (arrays[f'layer{i}_scale'], arrays[f'layer{i}_shift'])))
+            else:
+                layers.append(('activation', layer['activation']))
+        return cls(layers)
+
+    @property
+    def input_dim(self):
+        """Number of input features expected by the first Dense layer"""
+        for kind, params in self.layers:
+            if kind == 'dense':
+                return params[0].shape[0]
+        return None
+
+    def predict(self, X):
+        """
+        Run the forward pass.
+
+        Args:
+            X: Feature matrix, shape (n_samples, n_features)
+
+        Returns:
+            Network outputs, shape (n_samples, n_outputs)
+        """
+        out = np.asarray(X, dtype=np.float32)
+        if out.ndim == 1:
+            out = out.reshape(1, -1)
+
+        for kind, params in self.layers:
+            if kind == 'dense':
+                kernel, bias, activation = params
+                out = out @ kernel
+                if bias is not None:
+                    out += bias
+                out = ACTIVATIONS[activation](out)
+            elif kind == 'batchnorm':
+                scale, shift = params
+                out = out * scale + shift
+            else:
+                out = ACTIVATIONS[params](out)
+
+        return out
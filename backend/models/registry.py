@@ -0,0 +1,222 @@
+import sys
+import time
+import threading
+
+# Heavy third-party packages whose import cost is reported separately
+HEAVY_MODULES = ('tensorflow', 'lifelines', 'sksurv', 'shap', 'sklearn')
+
+class RegistrySnapshot:
+    """
+    The models of one registry generation.
+    A request that takes a snapshot keeps using the same versions of all
+    models even if a reload swaps in new ones while it runs.
+    """
+
+    def __init__(self, registry, instances, generation):
+        """
+        Initialize the snapshot.
+
+        Args:
+            registry: ModelRegistry the snapshot was taken from
+            instances: Dictionary of name -> loaded model of the generation
+            generation: Generation number
+        """
+        self._registry = registry
+        self._instances = instances
+        self.generation = generation
+
+    def get(self, name):
+        """Return a model of the snapshot, loading it into the snapshot's generation if not loaded yet"""
+        try:
+            return self._instances[name]
+        except KeyError:
+            return self._registry.load_into(name, self._instances, self.generation)
+
+class ModelRegistry:
+    """
+    Registry of lazily loaded models and artifacts.
+    Each entry is loaded (together with its heavy dependencies) on first use
+    or on explicit warm-up, and the load time is recorded for the startup report.
+    The loaded models form a generation that reload() replaces as a whole.
+    """
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._loaders = {}
+        self._instances = {}
+        self._locks = {}
+        self._load_stats = {}
+        self._created_at = time.perf_counter()
+        self._reload_lock = threading.Lock()
+        # Generation being built by reload(), visible to the reloading thread only
+        self._staging = threading.local()
+        self.generation = 0
+
+    def register(self, name, loader):
+        """
+        Register a loader for a model.
+
+        Args:
+            name: Model name used with get()
+            loader: Callable without arguments returning the loaded model
+        """
+        self._loaders[name] = loader
+        self._locks[name] = threading.Lock()
+        return self
+
+    @property
+    def names(self):
+        """Names of all registered models"""
+        return list(self._loaders)
+
+    def is_loaded(self, name):
+        """Return whether the model has already been loaded"""
+        return name in self._instances
+
+    def get(self, name):
+        """
+        Return a model, loading it on first use.
+
+        Args:
+            name: Registered model name
+
+        Returns:
+            Loaded model instance
+        """
+        # Loaders that depend on other entries resolve them in the generation being built
+        staged = getattr(self._staging, 'instances', None)
+        if staged is not None:
+            if name not in staged:
+                self._load(name, staged)
+            return staged[name]
+
+        instances = self._instances
+        try:
+            return instances[name]
+        except KeyError:
+            pass
+
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model: '{name}'")
+
+        # Per-model lock: concurrent first requests load once, other models are not blocked
+        with self._locks[name]:
+            if name not in instances:
+                self._load(name, instances)
+
+        return instances[name]
+
+    def _load(self, name, instances):
+        """Run the loader of a model, storing the instance and its load statistics"""
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model: '{name}'")
+
+        modules_before = set(sys.modules)
+        start = time.perf_counter()
+        instance = self._loaders[name]()
+        elapsed = time.perf_counter() - start
+
+        new_modules = set(sys.modules) - modules_before
+        self._load_stats[name] = {
+            'loadSeconds': elapsed,
+            'loadedAfterSeconds': time.perf_counter() - self._created_at,
+            'importedHeavyModules': sorted(m for m in HEAVY_MODULES if m in new_modules)
+        }
+        instances[name] = instance
+
+    def load_into(self, name, instances, generation):
+        """
+        Load a model missing from a snapshot into the snapshot's generation.
+        Waits for a reload in progress; a generation that has been replaced is
+        not extended, since its artifacts may no longer be on disk.
+
+        Args:
+            name: Registered model name
+            instances: Dictionary of loaded models of the snapshot's generation
+            generation: Generation number of the snapshot
+
+        Returns:
+            Loaded model instance
+        """
+        # The generation being built by reload() on this thread, e.g. during validation
+        if getattr(self._staging, 'instances', None) is instances:
+            return self.get(name)
+
+        with self._reload_lock:
+            if instances is not self._instances:
+                raise RuntimeError(f"Model '{name}' was not loaded in generation {generation}, "
+                                   f"which has been replaced by generation {self.generation}")
+            return self.get(name)
+
+    def snapshot(self):
+        """
+        Pin the current generation of models.
+
+        Returns:
+            RegistrySnapshot
+        """
+        return RegistrySnapshot(self, self._instances, self.generation)
+
+    def reload(self, names=None, validate=None):
+        """
+        Load a new generation of models and swap it in atomically.
+        The new models are loaded next to the current ones, which keep
+        serving until the swap; requests holding a snapshot finish on the
+        old generation. If loading or validation fails, nothing is swapped.
+
+        Args:
+            names: Models to load, by default those loaded in the current
+                   generation (the others stay lazy)
+            validate: Optional callable receiving a RegistrySnapshot of the
+                      new generation; raising rejects it
+
+        Returns:
+            Number of the new generation
+        """
+        with self._reload_lock:
+            if names is None:
+                names = [name for name in self.names if name in self._instances]
+
+            staged = {}
+            self._staging.instances = staged
+            try:
+                for name in names:
+                    self.get(name)
+                if validate is not None:
+                    validate(RegistrySnapshot(self, staged, self.generation + 1))
+            finally:
+                self._staging.instances = None
+
+            # Replacing the dictionary is a single reference assignment, so
+            # readers see either the old or the new generation, never a mix
+            self._instances = staged
+            self.generation += 1
+            return self.generation
+
+    def warm_up(self, names=None):
+        """
+        Load models ahead of the first request.
+
+        Args:
+            names: Model names to load, all registered models when None
+        """
+        for name in names or self.names:
+            self.get(name)
+        return self
+
+    def startup_report(self):
+        """
+        Summarize load times and loaded heavy dependencies.
+
+        Returns:
+            Dictionary with per-model load statistics
+        """
+        return {
+            'uptimeSeconds': time.perf_counter() - self._created_at,
+            'generation': self.generation,
+            'models': {
+                name: {'loaded': self.is_loaded(name), **self._load_stats.get(name, {})}
+                for name in self.names
+            },
+            'heavyModulesImported': [m for m in HEAVY_MODULES if m in sys.modules]
+        }
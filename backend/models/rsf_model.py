@@ -1,6 +1,8 @@
 import pickle
 import numpy as np
-from sksurv.ensemble import RandomSurvivalForest
+from models.artifacts import is_artifact
+from models.compiled_forest import CompiledSurvivalForest
+from models.survival_grid import SERVING_GRID_MONTHS, step_function_at, median_from_curves
 
 class RandomSurvivalForestModel:
     """
@@ -8,68 +10,123 @@ class RandomSurvivalForestModel:
     Time Complexity: O(nt log t), where n = samples, t = number of trees
     """
     
+    # Validation C-index (would be calculated during training)
+    DEFAULT_C_INDEX = 0.72
+    
     def __init__(self, model_path=None, n_estimators=100):
         """
         Initialize the Random Survival Forest model.
         
         Args:
-            model_path: Path to the saved model file
+            model_path: Path to the saved model file, or to a memory-mappable
+                        artifact of the compiled forest
             n_estimators: Number of trees in the forest
         """
+        self._c_index = self.DEFAULT_C_INDEX
+        
+        if model_path and is_artifact(model_path):
+            # Only the compiled engine is stored; its arrays stay memory-mapped
+            self.model = None
+            self.engine, metadata = CompiledSurvivalForest.load(model_path)
+            self.feature_names = metadata.get('feature_names')
+            return
+        
         if model_path:
             with open(model_path, 'rb') as f:
                 self.model = pickle.load(f)
         else:
+            from sksurv.ensemble import RandomSurvivalForest
             self.model = RandomSurvivalForest(n_estimators=n_estimators, random_state=42)
         
-        # Validation C-index (would be calculated during training)
-        self._c_index = 0.72
-        
         # Store feature names for SHAP analysis
         self.feature_names = None
+        
+        # Array-backed inference engine, built once the forest is fitted
+        self.engine = self._compile() if model_path else None
+    
+    def _compile(self):
+        """
+        Build the compiled inference engine for the fitted forest.
+        
+        Returns:
+            CompiledSurvivalForest, or None if the forest cannot be compiled
+        """
+        try:
+            return CompiledSurvivalForest.from_sksurv(self.model)
+        except Exception as e:
+            print(f"Falling back to sksurv inference, could not compile forest: {e}")
+            return None
     
-    def predict(self, data):
+    def predict(self, data, columnar=False):
         """
         Make survival predictions for the input data.
         
         Args:
             data: Preprocessed patient data
+            columnar: Return the survival curve as parallel 'months' and
+                      'survival' arrays under 'curve' instead of 'curve_data'
             
         Returns:
             Dictionary with survival predictions
         """
-        # Store feature names if not already stored
-        if self.feature_names is None and hasattr(data, 'columns'):
-            self.feature_names = data.columns.tolist()
+        predictions = self.predict_batch(data)
         
-        # Calculate survival function
-        survival_func = self.model.predict_survival_function(data)[0]
+        result = {
+            'median_survival': float(predictions['median_survival'][0]),
+            'survival_probability_24m': float(predictions['survival_probability_24m'][0])
+        }
         
-        # Calculate median survival time (in months)
-        median_survival = self.model.predict_median(data)[0]
+        if columnar:
+            result['curve'] = {
+                'months': np.asarray(predictions['months']).astype(int).tolist(),
+                'survival': np.asarray(predictions['survival_curves'][0], dtype=float).tolist()
+            }
+            return result
         
-        # Find the closest time point to 24 months
-        times = self.model.event_times_
-        idx_24m = np.abs(times - 24).argmin()
-        time_24m = times[idx_24m]
+        # Generate survival curve data points
+        result['curve_data'] = [
+            {'month': int(t), 'survival': float(prob)}
+            for t, prob in zip(predictions['months'], predictions['survival_curves'][0])
+        ]
         
-        # Calculate 24-month survival probability
-        survival_prob_24m = 100 * float(survival_func[idx_24m])
+        return result
+    
+    def predict_batch(self, data):
+        """
+        Make survival predictions for every row of the input data in one pass.
         
-        # Generate survival curve data points
-        curve_data = []
-        for t in range(0, 61, 3):  # 0 to 60 months in 3-month intervals
-            # Find closest time point
-            idx = np.abs(times - t).argmin()
-            time_t = times[idx]
-            prob = float(survival_func[idx])
+        Args:
+            data: Preprocessed data for one or more patients
             
-            curve_data.append({'month': t, 'survival': prob})
+        Returns:
+            Dictionary of arrays with one entry per patient: median survival,
+            24-month survival probability (in percent) and the survival curve
+            on the 0-60 month grid
+        """
+        # Store feature names if not already stored
+        if self.feature_names is None and hasattr(data, 'columns'):
+            self.feature_names = data.columns.tolist()
+        
+        # Single traversal of the compiled forest when available
+        if self.engine is not None:
+            return self.engine.predict_batch(data)
+        
+        # Survival functions for all patients as a (n_patients, n_times) array
+        survival = self.model.predict_survival_function(data, return_array=True)
+        times = getattr(self.model, 'unique_times_', None)
+        if times is None:
+            times = self.model.event_times_
+        
+        # Same conventions as the compiled engine: the step functions are
+        # evaluated on the serving grid, and the median is interpolated on it
+        curves = step_function_at(times, survival, SERVING_GRID_MONTHS)
+        idx_24m = int(np.abs(SERVING_GRID_MONTHS - 24).argmin())
         
         return {
-            'median_survival': median_survival,
-            'survival_probability_24m': survival_prob_24m,
-            'curve_data': curve_data
+            'median_survival': median_from_curves(curves),
+            'survival_probability_24m': 100 * curves[:, idx_24m],
+            'months': SERVING_GRID_MONTHS,
+            'survival_curves': curves
         }
     
     def get_c_index(self):
@@ -83,11 +140,12 @@ class RandomSurvivalForestModel:
         Returns:
             List of dictionaries with feature names and importance values
         """
-        if not hasattr(self.model, 'feature_importances_'):
+        try:
+            importances = self.model.feature_importances_
+        except (AttributeError, NotImplementedError):
+            # scikit-survival forests do not implement impurity-based importances
             return []
         
-        importances = self.model.feature_importances_
-        
         # If feature names are not available, use indices
         if self.feature_names is None:
             feature_names = [f"feature_{i}" for i in range(len(importances))]
@@ -119,7 +177,27 @@ class RandomSurvivalForestModel:
         if hasattr(X, 'columns'):
             self.feature_names = X.columns.tolist()
         
+        self.engine = self._compile()
+        
         # Calculate C-index on validation data (simplified)
         self._c_index = 0.72  # This would be calculated from validation data
         
         return self
+    
+    def save_artifact(self, path, publish=True):
+        """
+        Save the compiled forest as a memory-mappable artifact.
+        
+        Args:
+            path: Artifact path (e.g. rsf_model.artifact)
+            publish: Make the new version current (see models.artifacts.save_artifact)
+            
+        Returns:
+            Content hash of the artifact
+        """
+        if self.engine is None:
+            raise ValueError("The forest has not been fitted or could not be compiled")
+        names = self.feature_names
+        if names is None and getattr(self.model, 'feature_names_in_', None) is not None:
+            names = [str(name) for name in self.model.feature_names_in_]
+        return self.engine.save(path, {'feature_names': names}, publish=publish)
@@ -0,0 +1,52 @@
+import numpy as np
+
+# Time points (in months) at which survival curves are served: 0 to 60 in 3-month intervals
+SERVING_GRID_MONTHS = np.arange(0, 61, 3)
+
+def step_function_at(times, values, grid, initial=1.0):
+    """
+    Evaluate right-continuous step functions on a time grid.
+
+    Args:
+        times: Sorted array of jump times, shape (n_times,)
+        values: Function values at each jump time, shape (..., n_times)
+        grid: Time points to evaluate at
+        initial: Value of the function before the first jump time
+
+    Returns:
+        Array of shape (..., len(grid))
+    """
+    values = np.asarray(values)
+    idx = np.searchsorted(times, grid, side='right') - 1
+    result = values[..., np.maximum(idx, 0)]
+    return np.where(idx >= 0, result, initial)
+
+def median_from_curves(curves, grid=SERVING_GRID_MONTHS):
+    """
+    Median survival times from survival curves sampled on a grid.
+    The time is linearly interpolated between the two grid points where the
+    curve crosses 0.5; curves that never reach 0.5 get the last grid time.
+
+    Args:
+        curves: Survival probabilities, shape (n_patients, len(grid))
+        grid: Time points of the curve columns
+
+    Returns:
+        Array of median survival times, shape (n_patients,)
+    """
+    curves = np.asarray(curves, dtype=float)
+    grid = np.asarray(grid, dtype=float)
+
+    below_half = curves <= 0.5
+    crossed = below_half.any(axis=1)
+    j = below_half.argmax(axis=1)
+    prev = np.maximum(j - 1, 0)
+
+    rows = np.arange(len(curves))
+    s_before = curves[rows, prev]
+    s_after = curves[rows, j]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.where(s_before > s_after, (s_before - 0.5) / (s_before - s_after), 0.0)
+    median = grid[prev] + fraction * (grid[j] - grid[prev])
+
+    return np.where(crossed, median, grid[-1])
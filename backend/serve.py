@@ -0,0 +1,528 @@
+"""
+Production entry point: a preforking multi-worker server.
+
+The master process imports the app, loads and warms every model, freezes the
+garbage collector and binds the listening socket. It then forks the workers,
+which share the loaded models copy-on-write and accept connections from the
+shared socket, so one slow upload only occupies one worker. Workers that
+exit are replaced. The master periodically reports the resident (RSS),
+proportional (PSS) and private memory of every process together with each
+worker's request and patient throughput, also served at /api/workers.
+Only the master polls the model directory for new artifacts; once they have
+settled it signals every worker to reload (SIGHUP), so the workers switch
+model generations together. /api/reload asks the master (SIGUSR1) to force a
+reload of every worker.
+Workers save their metrics to a shared directory every --metrics-interval
+seconds, so /api/metrics reports the totals of all workers whichever worker
+answers the scrape.
+
+Usage:
+    python serve.py --port 5000 --workers 4
+    python serve.py --workers 8 --threads 4 --max-requests 10000 --report-interval 30
+"""
+import argparse
+import gc
+import json
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import RawArray
+from utils.instrumentation import METRICS, MODEL_GENERATION
+from utils.synthetic_cohort import generate_cohort, input_fields
+
+# Per-worker slots in the shared counter array: requests served, patients scored
+COUNTERS_PER_WORKER = 2
+
+def memory_usage(pid):
+    """
+    Memory of a process from /proc (Linux).
+
+    Args:
+        pid: Process id
+
+    Returns:
+        Dictionary with rssMb, pssMb, privateMb and sharedMb (PSS and the
+        private/shared split need /proc/<pid>/smaps_rollup), or None if the
+        process is gone or /proc is unavailable
+    """
+    values = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                    values[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        values['Rss'] = int(line.split()[1])
+        except OSError:
+            return None
+    if 'Rss' not in values:
+        return None
+
+    usage = {'rssMb': values['Rss'] / 1024}
+    if 'Pss' in values:
+        usage['pssMb'] = values['Pss'] / 1024
+        usage['privateMb'] = (values.get('Private_Clean', 0) + values.get('Private_Dirty', 0)) / 1024
+        usage['sharedMb'] = (values.get('Shared_Clean', 0) + values.get('Shared_Dirty', 0)) / 1024
+    return usage
+
+def warm_up(app_module):
+    """
+    Load every registry entry and run each model once, so that imports,
+    compiled engines and first-call paths are done before forking.
+    Thread pools are not used here: their threads would not exist in the
+    forked workers.
+    """
+    registry = app_module.registry
+    for name in registry.names:
+        try:
+            registry.get(name)
+        except Exception as e:
+            print(f"Warm-up: could not load '{name}': {e}")
+
+    try:
+        patient = input_fields(generate_cohort(1)).iloc[0].to_dict()
+        processed = app_module.preprocess(patient)
+    except Exception as e:
+        print(f"Warm-up: could not preprocess the sample patient: {e}")
+        return
+    for name in app_module.MODEL_CLASSES:
+        if registry.is_loaded(name):
+            try:
+                registry.get(name).predict(processed)
+            except Exception as e:
+                print(f"Warm-up: '{name}' failed on the sample patient: {e}")
+    registry.get('km_reference').lookup(0.5)
+
+    # Fingerprint of the served artifacts, so workers do not each hash MODEL_DIR
+    app_module.model_reloader.current()
+
+    # Builds the SHAP explainer, otherwise every worker imports shap and
+    # builds its own copy on the first explained request
+    if registry.is_loaded('rsf') and registry.get('shap_background') is not None:
+        try:
+            app_module.explain_patient(processed)
+        except Exception as e:
+            print(f"Warm-up: SHAP explanation failed on the sample patient: {e}")
+
+class Worker:
+    """
+    A forked worker process serving requests from the shared socket.
+    """
+
+    def __init__(self, app_module, listener, slot, counters, args):
+        """
+        Initialize the worker (in the child process).
+
+        Args:
+            app_module: Imported app module
+            listener: Shared listening socket
+            slot: Index of the worker's counters
+            counters: Shared RawArray of per-worker counters
+            args: Parsed command line arguments
+        """
+        self.app_module = app_module
+        self.listener = listener
+        self.slot = slot
+        self.counters = counters
+        self.args = args
+        self.stopping = False
+        self.served = 0
+        self.inflight = 0
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(args.threads)
+        self._reload = threading.Event()
+        self._force_reload = False
+
+    def _request_finished(self):
+        """Update the shared counters once a response has been sent completely"""
+        with self._lock:
+            self.inflight -= 1
+            base = self.slot * COUNTERS_PER_WORKER
+            self.counters[base] += 1
+            self.counters[base + 1] = self.app_module.patients_scored
+        self._slots.release()
+
+    def wsgi_app(self, environ, start_response):
+        """Serve one request, counting it when its response is closed"""
+        from werkzeug.wsgi import ClosingIterator
+
+        self._slots.acquire()
+        with self._lock:
+            self.inflight += 1
+            self.served += 1
+        try:
+            response = self.app_module.app(environ, start_response)
+        except BaseException:
+            self._request_finished()
+            raise
+        return ClosingIterator(response, [self._request_finished])
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+
+    def _reload_requested(self, signum, frame):
+        self._force_reload = self._force_reload or signum == signal.SIGUSR1
+        self._reload.set()
+
+    def reload_models(self):
+        """Reload the models whenever the master signals it, on a background thread"""
+        reloader = self.app_module.model_reloader
+        while True:
+            self._reload.wait()
+            self._reload.clear()
+            force, self._force_reload = self._force_reload, False
+            try:
+                # The master has already seen the new files settle
+                reloader.check(force=force, debounce=False)
+            except Exception as e:
+                print(f"Worker {os.getpid()}: model reload failed: {e}")
+
+    def save_metrics(self):
+        """Save the worker's metrics for the workers answering /api/metrics"""
+        MODEL_GENERATION.set(self.app_module.registry.generation)
+        METRICS.save()
+
+    def run(self):
+        """
+        Serve until asked to stop or until max_requests have been served.
+
+        Returns:
+            Exit status
+        """
+        from werkzeug.serving import make_server, WSGIRequestHandler
+
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGHUP, self._reload_requested)
+        signal.signal(signal.SIGUSR1, self._reload_requested)
+
+        # A worker forked after a reload catches up with the other workers
+        self._reload.set()
+        threading.Thread(target=self.reload_models, name='model-reload', daemon=True).start()
+
+        # A replacement worker continues the metrics of the one it replaces
+        METRICS.share(self.args.metrics_dir, self.slot)
+        METRICS.restore()
+
+        class RequestHandler(WSGIRequestHandler):
+            def log_request(handler, *args, **kwargs):
+                if self.args.access_log:
+                    super().log_request(*args, **kwargs)
+
+        server = make_server(self.args.host, self.args.port, self.wsgi_app, threaded=self.args.threads > 1,
+                             request_handler=RequestHandler, fd=self.listener.fileno())
+        # Wake up regularly to check for a stop request
+        server.timeout = 0.5
+
+        next_save = time.monotonic()
+        while not self.stopping and (self.args.max_requests <= 0 or self.served < self.args.max_requests):
+            server.handle_request()
+            if time.monotonic() >= next_save:
+                self.save_metrics()
+                next_save = time.monotonic() + self.args.metrics_interval
+
+        # Let threaded requests finish before exiting
+        deadline = time.monotonic() + self.args.graceful_timeout
+        while self.inflight and time.monotonic() < deadline:
+            time.sleep(0.05)
+        server.server_close()
+        self.save_metrics()
+        return 0
+
+class Master:
+    """
+    Preforking master: forks the workers, replaces those that exit and
+    reports memory and throughput.
+    """
+
+    def __init__(self, app_module, listener, args):
+        """
+        Initialize the master.
+
+        Args:
+            app_module: Imported and warmed-up app module
+            listener: Bound, non-blocking listening socket
+            args: Parsed command line arguments
+        """
+        self.app_module = app_module
+        self.listener = listener
+        self.args = args
+        self.counters = RawArray('q', args.workers * COUNTERS_PER_WORKER)
+        self.workers = {}  # pid -> slot
+        self.started = {}  # slot -> start time
+        self.stopping = False
+        self.reload_requested = False
+        self._last_counts = [(0, 0)] * args.workers
+        self._last_report = time.monotonic()
+
+    def spawn(self, slot):
+        """Fork a worker for a counter slot"""
+        base = slot * COUNTERS_PER_WORKER
+        self.counters[base] = 0
+        self.counters[base + 1] = 0
+        self._last_counts[slot] = (0, 0)
+
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                status = Worker(self.app_module, self.listener, slot, self.counters, self.args).run()
+            except BaseException as e:
+                print(f"Worker {os.getpid()} crashed: {e}")
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(status)
+
+        self.workers[pid] = slot
+        self.started[slot] = time.time()
+        return pid
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+
+    def _reload_requested(self, signum, frame):
+        self.reload_requested = True
+
+    def signal_workers(self, signum):
+        """Send a signal to every worker"""
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def reap(self):
+        """Collect exited workers and replace them unless shutting down"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            slot = self.workers.pop(pid, None)
+            if slot is None:
+                continue
+            if self.stopping:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            lifetime = time.time() - self.started[slot]
+            if code != 0:
+                print(f"Worker {pid} exited with status {code} after {lifetime:.1f}s, restarting")
+            # Do not fork in a tight loop when workers crash on startup
+            if code != 0 and lifetime < 1.0:
+                time.sleep(1.0)
+            self.spawn(slot)
+
+    def report(self):
+        """
+        Measure memory and throughput of the master and every worker.
+
+        Returns:
+            Report dictionary
+        """
+        now = time.monotonic()
+        elapsed = max(now - self._last_report, 1e-9)
+        self._last_report = now
+
+        workers = []
+        for pid, slot in sorted(self.workers.items(), key=lambda item: item[1]):
+            base = slot * COUNTERS_PER_WORKER
+            requests, patients = self.counters[base], self.counters[base + 1]
+            last_requests, last_patients = self._last_counts[slot]
+            self._last_counts[slot] = (requests, patients)
+            workers.append({
+                'slot': slot,
+                'pid': pid,
+                'uptimeSeconds': time.time() - self.started[slot],
+                'requests': requests,
+                'patients': patients,
+                'requestsPerSecond': max(requests - last_requests, 0) / elapsed,
+                'patientsPerSecond': max(patients - last_patients, 0) / elapsed,
+                **(memory_usage(pid) or {})
+            })
+
+        master = {'pid': os.getpid(), **(memory_usage(os.getpid()) or {})}
+        patients_per_second = sum(w['patientsPerSecond'] for w in workers)
+        total_pss = master.get('pssMb', 0) + sum(w.get('pssMb', 0) for w in workers)
+        return {
+            'reportedAt': time.time(),
+            'intervalSeconds': elapsed,
+            'master': master,
+            'workers': workers,
+            'totals': {
+                'workers': len(workers),
+                # PSS splits shared pages between the processes mapping them,
+                # so the sum is the memory the whole server really uses
+                'pssMb': total_pss,
+                'rssMb': master.get('rssMb', 0) + sum(w.get('rssMb', 0) for w in workers),
+                'requestsPerSecond': sum(w['requestsPerSecond'] for w in workers),
+                'patientsPerSecond': patients_per_second,
+                'mbPerPatientPerSecond': total_pss / patients_per_second if patients_per_second else None
+            }
+        }
+
+    def write_report(self, report):
+        """Print a memory summary and publish the report for /api/workers"""
+        totals = report['totals']
+        print(f"[serve] {totals['workers']} workers, PSS {totals['pssMb']:.0f} MB total, "
+              f"{totals['requestsPerSecond']:.1f} requests/s, {totals['patientsPerSecond']:.1f} patients/s")
+        for w in report['workers']:
+            print(f"[serve]   worker {w['slot']} (pid {w['pid']}): RSS {w.get('rssMb', 0):.0f} MB, "
+                  f"PSS {w.get('pssMb', 0):.0f} MB, private {w.get('privateMb', 0):.0f} MB, "
+                  f"{w['patientsPerSecond']:.1f} patients/s")
+
+        staging = f"{self.args.report_file}.tmp"
+        with open(staging, 'w') as f:
+            json.dump(report, f, indent=2)
+        os.replace(staging, self.args.report_file)
+
+    def run(self):
+        """Fork the workers and supervise them until SIGTERM or SIGINT"""
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        # Installed before forking, so a worker signalled before it has set up
+        # its own handlers is not killed
+        signal.signal(signal.SIGHUP, self._reload_requested)
+        signal.signal(signal.SIGUSR1, self._reload_requested)
+
+        for slot in range(self.args.workers):
+            self.spawn(slot)
+        print(f"[serve] Listening on http://{self.args.host}:{self.args.port} with {self.args.workers} workers")
+
+        reloader = self.app_module.model_reloader
+        next_report = time.monotonic() + self.args.report_interval
+        next_poll = time.monotonic() + reloader.poll_interval
+        while not self.stopping:
+            time.sleep(0.2)
+            self.reap()
+            if self.reload_requested:
+                self.reload_requested = False
+                print("[serve] Reload requested, reloading the models of every worker")
+                self.signal_workers(signal.SIGUSR1)
+            if reloader.poll_interval > 0 and time.monotonic() >= next_poll:
+                try:
+                    if reloader.poll():
+                        print("[serve] Model artifacts changed, reloading the models of every worker")
+                        self.signal_workers(signal.SIGHUP)
+                except Exception as e:
+                    print(f"[serve] Model reload check failed: {e}")
+                next_poll = time.monotonic() + reloader.poll_interval
+            if self.args.report_interval > 0 and time.monotonic() >= next_report:
+                self.write_report(self.report())
+                next_report = time.monotonic() + self.args.report_interval
+
+        self.shutdown()
+
+    def shutdown(self):
+        """Stop the workers, waiting up to the graceful timeout before killing them"""
+        print("[serve] Shutting down workers...")
+        self.signal_workers(signal.SIGTERM)
+
+        deadline = time.monotonic() + self.args.graceful_timeout + 1
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.05)
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        self.reap()
+        self.listener.close()
+
+def add_workers_endpoint(app_module, report_file):
+    """Serve the master's latest memory and throughput report at /api/workers"""
+    from flask import jsonify
+
+    @app_module.app.route('/api/workers', methods=['GET'])
+    def workers_report():
+        """Latest per-worker memory and throughput report of the preforking server"""
+        try:
+            with open(report_file) as f:
+                return jsonify(json.load(f))
+        except (OSError, ValueError):
+            return jsonify({'error': 'No worker report yet'}), 503
+
+def parse_args(argv=None):
+    """Parse the command line arguments"""
+    parser = argparse.ArgumentParser(description="Preforking multi-worker server for the prediction API")
+    parser.add_argument('--host', default='0.0.0.0', help="Interface to listen on")
+    parser.add_argument('--port', type=int, default=5000, help="Port to listen on")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument('--threads', type=int, default=1,
+                        help="Concurrent requests per worker (1 serves requests one at a time)")
+    parser.add_argument('--max-requests', type=int, default=0,
+                        help="Replace a worker after this many requests (0 = never)")
+    parser.add_argument('--graceful-timeout', type=float, default=30.0,
+                        help="Seconds workers get to finish requests on shutdown")
+    parser.add_argument('--backlog', type=int, default=128, help="Listen backlog of the shared socket")
+    parser.add_argument('--report-interval', type=float, default=60.0,
+                        help="Seconds between memory and throughput reports (0 = off)")
+    parser.add_argument('--report-file', default=None, help="Path of the JSON worker report")
+    parser.add_argument('--metrics-interval', type=float, default=1.0,
+                        help="Seconds between saves of each worker's metrics for /api/metrics")
+    parser.add_argument('--model-dir', default=None, help="Model artifact directory (default: the app's MODEL_DIR)")
+    parser.add_argument('--access-log', action='store_true', help="Log every request")
+    args = parser.parse_args(argv)
+    if args.workers < 1 or args.threads < 1:
+        parser.error("--workers and --threads must be at least 1")
+    return args
+
+def main(argv=None):
+    """Load the models, fork the workers and supervise them; returns the exit status"""
+    if not hasattr(os, 'fork'):
+        print("serve.py needs os.fork(); use `python app.py` on this platform")
+        return 1
+
+    args = parse_args(argv)
+    if args.model_dir:
+        os.environ['MODEL_DIR'] = os.path.abspath(args.model_dir)
+    if args.report_file is None:
+        args.report_file = os.path.join(tempfile.gettempdir(), f"survival-serve-{os.getpid()}.json")
+    args.metrics_dir = tempfile.mkdtemp(prefix='survival-metrics-')
+
+    start = time.perf_counter()
+    import app as app_module
+    warm_up(app_module)
+    add_workers_endpoint(app_module, args.report_file)
+    # The master polls for new models and tells the workers when to reload
+    master_pid = os.getpid()
+    app_module.model_reloader.request_reload = lambda: os.kill(master_pid, signal.SIGUSR1)
+    print(f"[serve] Models loaded and warmed up in {time.perf_counter() - start:.2f}s")
+
+    listener = socket.create_server((args.host, args.port), backlog=args.backlog)
+    listener.set_inheritable(True)
+    # Workers poll the shared socket; a connection taken by another worker
+    # must not block the others in accept()
+    listener.setblocking(False)
+
+    # Move everything loaded so far out of the collector's reach, so that
+    # garbage collections in the workers do not write to (and copy) the
+    # pages holding the models
+    gc.collect()
+    gc.freeze()
+
+    master = Master(app_module, listener, args)
+    try:
+        master.run()
+    finally:
+        if os.path.exists(args.report_file):
+            os.remove(args.report_file)
+        shutil.rmtree(args.metrics_dir, ignore_errors=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,110 +1,418 @@
-# --- START OF FILE train_and_save_models.py ---
+"""
+Train the survival models and save the serving artifacts.
 
-import pandas as pd
-import numpy as np
+The cohort is split into training and validation sets; the preprocessor is
+fitted on the training set, and the Cox, Random Survival Forest and DeepSurv
+models are trained concurrently in separate processes. All artifacts are
+written next to their final names and moved into place only once every step
+has succeeded, so a failed run never leaves a half-updated model directory.
+
+Usage:
+    python train_and_save_models.py --data cohort.csv
+    python train_and_save_models.py --synthetic 5000 --n-jobs 4 --output-dir data/trained_models
+"""
+import argparse
+import json
+import multiprocessing
+import os
 import pickle
+import resource
+import shutil
+import sys
+import time
+import numpy as np
+import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
-from sklearn.pipeline import Pipeline
-
-# For sksurv models (RSF)
-from sksurv.ensemble import RandomSurvivalForest
-
-# For DeepSurv model (Keras/TensorFlow)
-import tensorflow as tf
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense, Dropout
-
-print("Starting model training and saving process...")
-
-# --- 1. Generate Synthetic Patient Data ---
-# In your real project, you would load your data here, e.g., pd.read_csv('your_data.csv')
-print("Generating synthetic data...")
-np.random.seed(42)
-n_patients = 200
-data = {
-    'age': np.random.randint(40, 80, n_patients),
-    'tumor_stage': np.random.choice(['I', 'II', 'III', 'IV'], n_patients),
-    'treatment_type': np.random.choice(['A', 'B'], n_patients),
-    'lymph_node_status': np.random.randint(0, 10, n_patients),
-    'time_to_event': np.random.randint(1, 100, n_patients), # Survival time in months
-    'event_observed': np.random.choice([0, 1], n_patients)  # 0=Censored, 1=Event (e.g., death)
+
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'trained_models')
+
+# Input fields of the API used as model features
+NUMERICAL_FEATURES = ['age', 'tumorSize', 'lymphNodes', 'histologicalGrade', 'tp53Expression',
+                      'brca1Expression', 'methylationScore', 'mirnaProfile']
+CATEGORICAL_FEATURES = ['gender', 'tumorStage', 'erStatus', 'prStatus', 'her2Status', 'treatmentHistory']
+
+MODEL_FILES = {
+    'cox': 'cox_model.pkl',
+    'rsf': 'rsf_model.pkl',
+    'deepsurv': 'deepsurv_model.h5'
 }
-df = pd.DataFrame(data)
-
-# Define feature types
-categorical_features = ['tumor_stage', 'treatment_type']
-numerical_features = ['age', 'lymph_node_status']
-features = categorical_features + numerical_features
-X = df[features]
-y = np.array(list(zip(df['event_observed'], df['time_to_event'])), dtype=[('event', bool), ('time', float)])
-
-
-# --- 2. Create and Save the Preprocessor ---
-print("Creating and saving the preprocessor...")
-# Create a pipeline for preprocessing
-# One-hot encode categorical features, and scale numerical features
-preprocessor = ColumnTransformer(
-    transformers=[
-        ('num', StandardScaler(), numerical_features),
-        ('cat', OneHotEncoder(handle_unknown='ignore'), categorical_features)
-    ])
-
-# Save the preprocessor to a .pkl file
-with open('preprocessor.pkl', 'wb') as f:
-    pickle.dump(preprocessor, f)
-print("-> preprocessor.pkl saved successfully.")
-
-
-# --- 3. Train and Save the Random Survival Forest Model ---
-print("\nTraining and saving the RSF model...")
-X_processed = preprocessor.fit_transform(X) # Preprocess data for training
-
-rsf_model = RandomSurvivalForest(n_estimators=100, random_state=42)
-rsf_model.fit(X_processed, y)
-
-# Save the trained RSF model to a .pkl file
-with open('rsf_model.pkl', 'wb') as f:
-    pickle.dump(rsf_model, f)
-print("-> rsf_model.pkl saved successfully.")
-
-
-# --- 4. Train and Save the DeepSurv-like Model ---
-# NOTE: This is a very simplified Keras model for demonstration. A real DeepSurv
-# model requires a custom loss function (negative log partial likelihood).
-print("\nTraining and saving the DeepSurv-like Keras model...")
-
-deepsurv_model = Sequential([
-    Dense(64, activation='relu', input_shape=(X_processed.shape[1],)),
-    Dropout(0.3),
-    Dense(32, activation='relu'),
-    Dropout(0.3),
-    Dense(1, activation='linear') # Output is a single risk score
-])
-
-# For this example, we'll just save the architecture and random weights.
-# In a real scenario, you would compile and fit the model.
-# deepsurv_model.compile(optimizer='adam', loss=your_custom_survival_loss)
-# deepsurv_model.fit(X_processed, y['time'], epochs=50)
-
-# Save the Keras model to a .h5 file
-deepsurv_model.save('deepsurv_model.h5')
-print("-> deepsurv_model.h5 saved successfully.")
-
-
-# --- What about cox_model.pkl? ---
-# You would train and save it just like the RSF model.
-# from sksurv.linear_model import CoxPHSurvivalAnalysis
-# cox_model = CoxPHSurvivalAnalysis()
-# cox_model.fit(X_processed, y)
-# with open('cox_model.pkl', 'wb') as f:
-#     pickle.dump(cox_model, f)
-# print("\n-> Placeholder for cox_model.pkl created.")
-# For now, we'll just copy the RSF model to act as a placeholder for the Cox model.
-import shutil
-shutil.copy('rsf_model.pkl', 'cox_model.pkl')
-print("\nCreated a placeholder cox_model.pkl for demonstration.")
 
+def load_cohort(path):
+    """
+    Load a cohort file.
+
+    Args:
+        path: CSV, TSV/TXT (tab-separated) or Parquet file, one row per patient
+
+    Returns:
+        DataFrame
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.parquet':
+        return pd.read_parquet(path)
+    return pd.read_csv(path, sep='\t' if extension in ('.tsv', '.txt') else ',')
+
+def prepare_cohort(df, numerical, categorical, duration_col, event_col):
+    """
+    Select the training columns and handle missing values.
+    Rows without an outcome are dropped; missing numerical values get the
+    column median and missing categories their own 'unknown' level.
+
+    Args:
+        df: Cohort DataFrame
+        numerical: Numerical feature columns
+        categorical: Categorical feature columns
+        duration_col: Survival time column (months)
+        event_col: Event indicator column (1=event, 0=censored)
+
+    Returns:
+        Tuple (features DataFrame, structured outcome array)
+    """
+    missing = [c for c in numerical + categorical + [duration_col, event_col] if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns in cohort file: {', '.join(missing)}")
+
+    df = df.dropna(subset=[duration_col, event_col])
+    df = df[df[duration_col] > 0]
+    if len(df) == 0:
+        raise ValueError("No patients with a positive survival time and a known event status")
+
+    X = df[numerical + categorical].copy()
+    for col in numerical:
+        X[col] = pd.to_numeric(X[col], errors='coerce')
+        X[col] = X[col].fillna(X[col].median() if X[col].notna().any() else 0)
+    for col in categorical:
+        X[col] = X[col].astype(object).where(X[col].notna(), 'unknown').astype(str)
+
+    y = np.empty(len(df), dtype=[('event', bool), ('time', float)])
+    y['event'] = df[event_col].astype(int).to_numpy() == 1
+    y['time'] = df[duration_col].to_numpy(dtype=float)
+    return X.reset_index(drop=True), y
+
+def build_preprocessor(numerical, categorical):
+    """Scale numerical features and one-hot encode categorical ones"""
+    return ColumnTransformer(
+        transformers=[
+            ('num', StandardScaler(), numerical),
+            ('cat', OneHotEncoder(handle_unknown='ignore', sparse_output=False), categorical)
+        ])
+
+def staging_path(output_dir, filename):
+    """Temporary path an artifact is written to before it is moved into place"""
+    return os.path.join(output_dir, f".tmp-{os.getpid()}-{filename}")
+
+def publish(staged, output_dir):
+    """
+    Move staged artifacts to their final names.
+    Every file is flushed to disk first and replaced atomically, so readers
+    see either the previous or the new version of each file.
+
+    Args:
+        staged: Dictionary of final file name -> staged path
+        output_dir: Model directory
+    """
+    for path in staged.values():
+        # Artifact links point at version directories that are already synced
+        if os.path.islink(path):
+            continue
+        with open(path, 'rb') as f:
+            os.fsync(f.fileno())
+    for filename, path in staged.items():
+        os.replace(path, os.path.join(output_dir, filename))
+    dir_fd = os.open(output_dir, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+def discard(staged, new_versions=()):
+    """Remove staged artifacts, and the artifact versions written for them, after a failed run"""
+    for path in staged.values():
+        if os.path.lexists(path):
+            os.remove(path)
+    for version_dir in new_versions:
+        shutil.rmtree(version_dir, ignore_errors=True)
+
+def peak_rss_mb():
+    """Peak resident memory of the current process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def train_cox(X, y, params, path):
+    """Fit a lifelines Cox proportional hazards model and pickle it"""
+    from lifelines import CoxPHFitter
+
+    df = X.copy()
+    df['duration'] = y['time']
+    df['event'] = y['event'].astype(int)
+    model = CoxPHFitter(penalizer=params['cox_penalizer'])
+    model.fit(df, duration_col='duration', event_col='event')
+    with open(path, 'wb') as f:
+        pickle.dump(model, f)
+
+def train_rsf(X, y, params, path):
+    """Fit a Random Survival Forest with parallel tree building and pickle it"""
+    from sksurv.ensemble import RandomSurvivalForest
+
+    model = RandomSurvivalForest(
+        n_estimators=params['rsf_trees'],
+        min_samples_leaf=params['rsf_min_samples_leaf'],
+        max_features='sqrt',
+        n_jobs=params['n_jobs'],
+        random_state=params['random_state']
+    )
+    model.fit(X, y)
+    # Trees are evaluated by the compiled engine at serving time
+    model.n_jobs = None
+    with open(path, 'wb') as f:
+        pickle.dump(model, f)
+
+def train_deepsurv(X, y, params, path):
+    """Train the DeepSurv network on the Cox partial likelihood and save it as .h5"""
+    import tensorflow as tf
+    from models.deepsurv_model import DeepSurvModel
+
+    tf.keras.utils.set_random_seed(params['random_state'])
+    model = DeepSurvModel(input_dim=X.shape[1])
+    model.train(np.asarray(X, dtype=np.float32), y, epochs=params['epochs'], batch_size=params['batch_size'],
+                validation_split=0, verbose=0)
+    model.model.save(path)
+
+TRAINERS = {
+    'cox': train_cox,
+    'rsf': train_rsf,
+    'deepsurv': train_deepsurv
+}
+
+def train_model(name, X, y, params, path):
+    """
+    Train one model and save it (runs in a worker process).
+
+    Returns:
+        Dictionary with the training wall time and the peak memory of the worker
+    """
+    start = time.time()
+    TRAINERS[name](X, y, params, path)
+    return {'seconds': time.time() - start, 'peakRssMb': peak_rss_mb()}
+
+def train_models(names, X, y, params, staged, workers):
+    """
+    Train models concurrently, one fresh process per model.
+    Processes are spawned rather than forked (TensorFlow and OpenMP thread
+    pools do not survive a fork) and replaced after every model, so each
+    model's peak memory is measured on its own.
+
+    Args:
+        names: Models to train
+        X: Preprocessed training features
+        y: Structured outcome array
+        params: Training parameters
+        staged: Dictionary of final file name -> staged path
+        workers: Number of models trained at the same time
+
+    Returns:
+        Dictionary of model name -> training statistics
+    """
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes=min(workers, len(names)), maxtasksperchild=1) as pool:
+        jobs = {
+            name: pool.apply_async(train_model, (name, X, y, params, staged[MODEL_FILES[name]]))
+            for name in names
+        }
+        results = {}
+        for name, job in jobs.items():
+            results[name] = job.get()
+            print(f"-> {name} trained in {results[name]['seconds']:.1f}s "
+                  f"(peak memory {results[name]['peakRssMb']:.0f} MB)")
+    return results
+
+def parse_args(argv=None):
+    """Parse the command line arguments"""
+    parser = argparse.ArgumentParser(description="Train the survival models and save the serving artifacts")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--data', help="Cohort file (CSV, TSV or Parquet)")
+    source.add_argument('--synthetic', type=int, metavar='N', help="Train on a synthetic cohort of N patients")
+    parser.add_argument('--duration-col', default='survivalMonths', help="Survival time column (months)")
+    parser.add_argument('--event-col', default='event', help="Event indicator column (1=event, 0=censored)")
+    parser.add_argument('--numerical', nargs='+', default=NUMERICAL_FEATURES, help="Numerical feature columns")
+    parser.add_argument('--categorical', nargs='+', default=CATEGORICAL_FEATURES, help="Categorical feature columns")
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR, help="Directory the artifacts are written to")
+    parser.add_argument('--models', nargs='+', choices=list(MODEL_FILES), default=list(MODEL_FILES),
+                        help="Models to train")
+    parser.add_argument('--workers', type=int, default=len(MODEL_FILES), help="Models trained at the same time")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="Threads building the forest (-1 for all CPUs)")
+    parser.add_argument('--validation-size', type=float, default=0.2, help="Fraction held out for validation")
+    parser.add_argument('--bootstrap', type=int, default=1000, help="Bootstrap resamples of the validation metrics")
+    parser.add_argument('--rsf-trees', type=int, default=100, help="Trees in the Random Survival Forest")
+    # Every node stores a curve over all distinct event times, so small leaves
+    # make the pickled forest very large
+    parser.add_argument('--rsf-min-samples-leaf', type=int, default=15, help="Minimum patients per forest leaf")
+    parser.add_argument('--cox-penalizer', type=float, default=0.1, help="L2 penalty of the Cox model")
+    parser.add_argument('--epochs', type=int, default=50, help="DeepSurv training epochs")
+    parser.add_argument('--batch-size', type=int, default=256, help="DeepSurv batch size")
+    parser.add_argument('--random-state', type=int, default=42, help="Seed of the split, the forest and the network")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Run the training pipeline; returns the exit status"""
+    from models.cox_model import CoxModel
+    from models.rsf_model import RandomSurvivalForestModel
+    from models.deepsurv_model import DeepSurvModel
+    from models.km_reference import KaplanMeierReference
+    from models.artifacts import artifact_path, version_path, link_artifact, remove_old_versions, resolve_model_path
+    from utils.bootstrap import evaluate_models, VALIDATION_REPORT_FILE
+    from utils.synthetic_cohort import generate_cohort
+
+    args = parse_args(argv)
+    started = time.time()
+
+    # --- 1. Load the Cohort ---
+    if args.data:
+        print(f"Loading cohort from {args.data}...")
+        df = load_cohort(args.data)
+    else:
+        print(f"Generating a synthetic cohort of {args.synthetic} patients...")
+        df = generate_cohort(args.synthetic, random_state=args.random_state)
+    X, y = prepare_cohort(df, args.numerical, args.categorical, args.duration_col, args.event_col)
+    print(f"-> {len(X)} patients, {int(y['event'].sum())} events")
+
+    X_train, X_val, y_train, y_val = train_test_split(
+        X, y, test_size=args.validation_size, random_state=args.random_state, stratify=y['event']
+    )
+
+    # --- 2. Fit the Preprocessor ---
+    # When only some models are retrained, the others keep serving, so the
+    # preprocessor and SHAP background they were trained with are kept
+    partial = set(args.models) != set(MODEL_FILES)
+    preprocessor_path = os.path.join(args.output_dir, 'preprocessor.pkl')
+    if partial:
+        if not os.path.exists(preprocessor_path):
+            raise ValueError(f"Training only {', '.join(args.models)} needs the preprocessor of a run "
+                             f"with all models in {args.output_dir}")
+        print(f"\nReusing the preprocessor in {args.output_dir}...")
+        with open(preprocessor_path, 'rb') as f:
+            preprocessor = pickle.load(f)
+    else:
+        print("\nFitting the preprocessor...")
+        preprocessor = build_preprocessor(args.numerical, args.categorical).fit(X_train)
+    columns = list(preprocessor.get_feature_names_out())
+    X_train_processed = pd.DataFrame(preprocessor.transform(X_train), columns=columns)
+    X_val_processed = pd.DataFrame(preprocessor.transform(X_val), columns=columns)
+    print(f"-> {len(columns)} features")
+
+    # The reference curves are binned by the forest's risk score
+    rebuild_km = not partial or 'rsf' in args.models
+    os.makedirs(args.output_dir, exist_ok=True)
+    filenames = ([] if partial else ['preprocessor.pkl', 'shap_background.npy']) \
+        + (['km_reference.pkl'] if rebuild_km else []) \
+        + [VALIDATION_REPORT_FILE, 'training_report.json'] + [MODEL_FILES[name] for name in args.models]
+    staged = {filename: staging_path(args.output_dir, filename) for filename in filenames}
+    new_versions = []
+
+    try:
+        if not partial:
+            with open(staged['preprocessor.pkl'], 'wb') as f:
+                pickle.dump(preprocessor, f)
+
+        # --- 3. Train the Models Concurrently ---
+        print(f"\nTraining {', '.join(args.models)} ({args.workers} at a time)...")
+        params = {
+            'cox_penalizer': args.cox_penalizer,
+            'rsf_trees': args.rsf_trees,
+            'rsf_min_samples_leaf': args.rsf_min_samples_leaf,
+            'n_jobs': args.n_jobs,
+            'epochs': args.epochs,
+            'batch_size': args.batch_size,
+            'random_state': args.random_state
+        }
+        training = train_models(args.models, X_train_processed, y_train, params, staged, args.workers)
+
+        loaders = {'cox': CoxModel, 'rsf': RandomSurvivalForestModel, 'deepsurv': DeepSurvModel}
+        models = {name: loaders[name](model_path=staged[MODEL_FILES[name]]) for name in args.models}
+
+        # --- 4. Precompute Kaplan-Meier Reference Curves per Risk Stratum ---
+        # The API serves these by lookup instead of refitting Kaplan-Meier per request
+        if rebuild_km:
+            print("\nBuilding Kaplan-Meier reference curves...")
+            risk_model = models['rsf'] if 'rsf' in models else next(iter(models.values()))
+            risk_scores = 1 - risk_model.predict_batch(X_train_processed)['survival_probability_24m'] / 100
+            KaplanMeierReference.from_cohort(y_train['time'], y_train['event'], risk_scores).save(staged['km_reference.pkl'])
+
+        # --- 5. Save the SHAP Background ---
+        # The API summarizes these rows with k-means once and reuses the explainer for every request
+        if not partial:
+            print("Saving the SHAP background data...")
+            background = X_train_processed.to_numpy(dtype=float)
+            background = background[np.random.RandomState(0).permutation(len(background))[:1000]]
+            with open(staged['shap_background.npy'], 'wb') as f:
+                np.save(f, background)
+
+        # --- 6. Validate with Bootstrap Confidence Intervals ---
+        # Models that were not retrained are evaluated too, so the report covers every served model
+        evaluated = {}
+        for name, filename in MODEL_FILES.items():
+            if name in models:
+                evaluated[name] = models[name]
+            elif os.path.exists(os.path.join(args.output_dir, filename)):
+                evaluated[name] = loaders[name](model_path=resolve_model_path(os.path.join(args.output_dir, filename)))
+        print(f"Evaluating on {len(X_val)} validation patients ({args.bootstrap} bootstrap resamples)...")
+        report = evaluate_models(evaluated, X_val_processed, y_val['time'], y_val['event'], n_bootstrap=args.bootstrap,
+                                 random_state=args.random_state)
+        with open(staged[VALIDATION_REPORT_FILE], 'w') as f:
+            json.dump(report, f, indent=2)
+        for name, metrics in report['models'].items():
+            c_index = metrics['cIndex']
+            print(f"-> {name}: C-index {c_index['estimate']:.3f} ({c_index['lower']:.3f}-{c_index['upper']:.3f})")
+
+        # Training statistics of the models that were not retrained are kept
+        previous_training = {}
+        if partial and os.path.exists(os.path.join(args.output_dir, 'training_report.json')):
+            with open(os.path.join(args.output_dir, 'training_report.json')) as f:
+                previous_training = json.load(f).get('models', {})
+        with open(staged['training_report.json'], 'w') as f:
+            json.dump({
+                'trainedAt': pd.Timestamp.now().isoformat(),
+                'source': args.data or f"synthetic:{args.synthetic}",
+                'nTrain': len(X_train),
+                'nValidation': len(X_val),
+                'features': columns,
+                'parameters': params,
+                'models': {**previous_training, **training},
+                'retrained': list(args.models),
+                'totalSeconds': time.time() - started
+            }, f, indent=2)
+
+        # --- 7. Save Memory-Mappable Artifacts ---
+        # The app serves from these; the model files above are kept for retraining and inspection.
+        # The version directories are written next to the served ones, and the links to them
+        # are published together with the other files
+        artifact_paths = []
+        for name, model in models.items():
+            path = artifact_path(os.path.join(args.output_dir, MODEL_FILES[name]))
+            existed = set(os.listdir(args.output_dir))
+            sha256 = model.save_artifact(path, publish=False)
+            version_dir = version_path(path, sha256)
+            if os.path.basename(version_dir) not in existed:
+                new_versions.append(version_dir)
+            filename = os.path.basename(path)
+            staged[filename] = staging_path(args.output_dir, filename)
+            link_artifact(version_dir, staged[filename])
+            artifact_paths.append(path)
+            print(f"-> {name} artifact version {sha256[:16]}")
+
+        publish(staged, args.output_dir)
+    except BaseException:
+        discard(staged, new_versions)
+        raise
+
+    for path in artifact_paths:
+        remove_old_versions(path)
+
+    print(f"\nAll artifacts written to {args.output_dir} in {time.time() - started:.1f}s.")
+    return 0
 
-print("\nAll model files have been generated.")
\ No newline at end of file
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,42 @@
+import os
+import hmac
+from functools import wraps
+from flask import request, jsonify
+
+# Token admin requests (model reload, request profiling) must carry, in the
+# X-Admin-Token header or as "Authorization: Bearer <token>"; unset disables them
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN') or None
+
+def supplied_token(environ):
+    """Admin token sent with a request, None if there is none"""
+    token = environ.get('HTTP_X_ADMIN_TOKEN')
+    if token:
+        return token
+    scheme, _, value = environ.get('HTTP_AUTHORIZATION', '').partition(' ')
+    return (value.strip() or None) if scheme.lower() == 'bearer' else None
+
+def is_admin(environ):
+    """
+    Check whether a request carries the admin token.
+
+    Args:
+        environ: WSGI environment of the request
+
+    Returns:
+        True if admin requests are enabled and the token matches
+    """
+    supplied = supplied_token(environ)
+    if ADMIN_TOKEN is None or supplied is None:
+        return False
+    return hmac.compare_digest(supplied.encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))
+
+def admin_required(view):
+    """Restrict a view to requests carrying the admin token"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if ADMIN_TOKEN is None:
+            return jsonify({'error': "Admin endpoints are disabled; set ADMIN_TOKEN to enable them"}), 403
+        if not is_admin(request.environ):
+            return jsonify({'error': "Missing or invalid admin token"}), 401
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,200 @@
+import numpy as np
+from utils.data_preprocessing import preprocess_input
+from utils.instrumentation import timed
+
+# Number of patients preprocessed and scored together
+DEFAULT_BATCH_SIZE = 2048
+
+# Numeric result fields, in response order after patientId
+RESULT_COLUMNS = ('survivalProbability', 'riskScore', 'predictedSurvivalMonths')
+
+# Risk score thresholds used for the summary statistics
+HIGH_RISK_THRESHOLD = 0.6
+LOW_RISK_THRESHOLD = 0.3
+
+def score_columns(df, preprocessor, model, id_column='patient_id', start_index=0, plan=None, explainers=None):
+    """
+    Score a batch of patients with a single model call, keeping the results
+    as one column per field.
+
+    Args:
+        df: DataFrame with one row per patient
+        preprocessor: Fitted sklearn preprocessor
+        model: Model wrapper exposing predict_batch
+        id_column: Name of the column containing the patient identifier
+        start_index: Position of the first row in the whole file, used for
+                     generated patient IDs
+        plan: Optional compiled PreprocessingPlan used instead of preprocess_input
+        explainers: Optional ExplainerCache; when given, every patient also gets
+                    its own top SHAP attributions
+
+    Returns:
+        Dictionary of parallel columns: patientId (list), survivalProbability,
+        riskScore and predictedSurvivalMonths (NumPy arrays), and
+        featureImportance (list) when explainers is given
+    """
+    if len(df) == 0:
+        columns = {name: np.empty(0) for name in RESULT_COLUMNS}
+        columns['patientId'] = []
+        if explainers is not None:
+            columns['featureImportance'] = []
+        return columns
+
+    # Preprocess the whole batch at once (the ID column is not a feature)
+    features = df.drop(columns=[id_column]) if id_column in df.columns else df
+    with timed('preprocess'):
+        if plan is not None:
+            processed_data = plan.transform(features)
+        else:
+            processed_data = preprocess_input(features, preprocessor, row_wise=True)
+
+    # One prediction call for the whole batch
+    with timed('predict_batch'):
+        prediction = model.predict_batch(processed_data)
+    survival_probability = np.asarray(prediction['survival_probability_24m'], dtype=float) / 100
+
+    if id_column in df.columns:
+        patient_ids = df[id_column].tolist()
+    else:
+        patient_ids = [f"PATIENT-{i + 1}" for i in range(start_index, start_index + len(df))]
+
+    columns = {
+        'patientId': patient_ids,
+        'survivalProbability': survival_probability,
+        'riskScore': 1 - survival_probability,
+        'predictedSurvivalMonths': np.asarray(prediction['median_survival'], dtype=float)
+    }
+
+    if explainers is not None:
+        with timed('feature_importance'):
+            columns['featureImportance'] = explainers.explain(model, processed_data, top_n=5)
+
+    return columns
+
+def columns_to_records(columns):
+    """
+    Convert columnar results to one dictionary per patient.
+
+    Args:
+        columns: Columns as returned by score_columns
+
+    Returns:
+        List of dictionaries with the prediction for each patient
+    """
+    names = list(columns)
+    values = [v.tolist() if isinstance(v, np.ndarray) else v for v in columns.values()]
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+def concat_columns(batches):
+    """Concatenate the columnar results of consecutive batches"""
+    if not batches:
+        return {}
+    return {
+        name: np.concatenate([b[name] for b in batches]) if isinstance(batches[0][name], np.ndarray)
+        else [item for b in batches for item in b[name]]
+        for name in batches[0]
+    }
+
+def score_batch(df, preprocessor, model, id_column='patient_id', start_index=0, plan=None, explainers=None):
+    """
+    Score a batch of patients with a single model call.
+
+    Args:
+        df: DataFrame with one row per patient
+        preprocessor: Fitted sklearn preprocessor
+        model: Model wrapper exposing predict_batch
+        id_column: Name of the column containing the patient identifier
+        start_index: Position of the first row in the whole file, used for
+                     generated patient IDs
+        plan: Optional compiled PreprocessingPlan used instead of preprocess_input
+        explainers: Optional ExplainerCache; when given, every patient also gets
+                    its own top SHAP attributions
+
+    Returns:
+        List of dictionaries with the prediction for each patient
+    """
+    if len(df) == 0:
+        return []
+    return columns_to_records(score_columns(df, preprocessor, model, id_column, start_index, plan, explainers))
+
+def predict_dataframe(df, preprocessor, model, id_column='patient_id', batch_size=DEFAULT_BATCH_SIZE, plan=None,
+                      explainers=None, columnar=False):
+    """
+    Score every patient in a DataFrame, batch_size rows at a time.
+
+    Args:
+        df: DataFrame with one row per patient
+        preprocessor: Fitted sklearn preprocessor
+        model: Model wrapper exposing predict_batch
+        id_column: Name of the column containing the patient identifier
+        batch_size: Maximum number of rows preprocessed and scored together
+        plan: Optional compiled PreprocessingPlan used instead of preprocess_input
+        explainers: Optional ExplainerCache for per-patient SHAP attributions
+        columnar: Return the results as columns (see score_columns) instead
+                  of one dictionary per patient
+
+    Returns:
+        List of dictionaries with the prediction for each patient, or a
+        dictionary of columns when columnar is set
+    """
+    if batch_size <= 0:
+        raise ValueError("batch_size must be a positive integer")
+
+    batches = []
+    for start in range(0, len(df), batch_size):
+        batch = df.iloc[start:start + batch_size]
+        batches.append(score_columns(batch, preprocessor, model, id_column, start_index=start, plan=plan,
+                                     explainers=explainers))
+
+    if not batches:
+        batches.append(score_columns(df, preprocessor, model, id_column, plan=plan, explainers=explainers))
+    columns = concat_columns(batches)
+    return columns if columnar else columns_to_records(columns)
+
+class RiskSummary:
+    """
+    Running summary statistics over scored patients.
+    Can be updated batch by batch so the full result list is not required.
+    """
+
+    def __init__(self):
+        """Initialize an empty summary."""
+        self.total_patients = 0
+        self.high_risk = 0
+        self.medium_risk = 0
+        self.low_risk = 0
+        self._survival_months_sum = 0.0
+
+    def update(self, results):
+        """
+        Add a batch of results to the summary.
+
+        Args:
+            results: List of result dictionaries as returned by score_batch,
+                     or columns as returned by score_columns
+        """
+        if isinstance(results, dict):
+            risk = np.asarray(results['riskScore'], dtype=float)
+            months = np.asarray(results['predictedSurvivalMonths'], dtype=float)
+        else:
+            risk = np.fromiter((r['riskScore'] for r in results), dtype=float, count=len(results))
+            months = np.fromiter((r['predictedSurvivalMonths'] for r in results), dtype=float, count=len(results))
+        if len(risk) == 0:
+            return self
+
+        self.total_patients += len(risk)
+        self.high_risk += int(np.count_nonzero(risk > HIGH_RISK_THRESHOLD))
+        self.medium_risk += int(np.count_nonzero((risk >= LOW_RISK_THRESHOLD) & (risk <= HIGH_RISK_THRESHOLD)))
+        self.low_risk += int(np.count_nonzero(risk < LOW_RISK_THRESHOLD))
+        self._survival_months_sum += float(months.sum())
+
+        return self
+
+    def to_dict(self):
+        """Return the summary in the API response format"""
+        return {
+            'averageSurvivalMonths': self._survival_months_sum / self.total_patients if self.total_patients else 0,
+            'highRiskPatients': self.high_risk,
+            'mediumRiskPatients': self.medium_risk,
+            'lowRiskPatients': self.low_risk
+        }
@@ -0,0 +1,254 @@
+import os
+import json
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from models.survival_grid import SERVING_GRID_MONTHS
+from utils.metrics import harrell_c_index, calculate_integrated_brier_score
+
+# Resamples computed per task by the parallel bootstrap
+BOOTSTRAP_CHUNK = 25
+VALIDATION_REPORT_FILE = 'validation_report.json'
+
+class SharedArrays:
+    """
+    NumPy arrays copied once into shared memory.
+    Worker processes attach to the blocks by name and read them without
+    copying or pickling the data.
+    """
+
+    def __init__(self, arrays):
+        """
+        Copy arrays into shared memory.
+
+        Args:
+            arrays: Dictionary of name -> NumPy array
+        """
+        self._blocks = []
+        self.spec = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self._blocks.append(block)
+            self.spec[name] = (block.name, array.shape, array.dtype.str)
+
+    @staticmethod
+    def attach(spec):
+        """
+        Attach to shared arrays created in another process.
+
+        Args:
+            spec: SharedArrays.spec of the creating process
+
+        Returns:
+            Tuple (dictionary of read-only arrays, shared memory handles)
+        """
+        arrays, blocks = {}, []
+        for name, (block_name, shape, dtype) in spec.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+            array.flags.writeable = False
+            arrays[name] = array
+            blocks.append(block)
+        return arrays, blocks
+
+    def close(self):
+        """Release and remove the shared memory blocks"""
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Arrays attached by a worker process
+_worker_arrays = None
+_worker_blocks = None
+
+def _attach_worker(spec):
+    """Process pool initializer attaching the shared arrays"""
+    global _worker_arrays, _worker_blocks
+    _worker_arrays, _worker_blocks = SharedArrays.attach(spec)
+
+def _resample_metrics(arrays, times, n_resamples, seed):
+    """
+    Metrics of every model on n_resamples bootstrap resamples.
+
+    Args:
+        arrays: Dictionary with 'durations', 'events', 'risk' (n_models, n)
+                and 'survival' (n_models, n, n_times)
+        times: Time grid of the survival matrices
+        n_resamples: Number of resamples
+        seed: Seed of the resampling
+
+    Returns:
+        Array of shape (n_resamples, n_models, 2) with the C-index and the
+        integrated Brier score
+    """
+    rng = np.random.default_rng(seed)
+    durations, events = arrays['durations'], arrays['events']
+    n_models, n = arrays['risk'].shape
+    results = np.empty((n_resamples, n_models, 2))
+
+    for b in range(n_resamples):
+        idx = rng.integers(0, n, n)
+        y = {'time': durations[idx], 'event': events[idx]}
+        for m in range(n_models):
+            results[b, m, 0] = harrell_c_index(y['time'], y['event'], arrays['risk'][m, idx])['c_index']
+            results[b, m, 1] = calculate_integrated_brier_score(y, arrays['survival'][m, idx], times)['integrated_brier_score']
+    return results
+
+def _bootstrap_chunk(times, n_resamples, seed):
+    """Resample metrics over the shared arrays (runs in a worker process)"""
+    return _resample_metrics(_worker_arrays, times, n_resamples, seed)
+
+def _interval(estimate, samples, alpha):
+    """Point estimate and percentile interval, ignoring undefined resamples"""
+    samples = samples[np.isfinite(samples)]
+    if len(samples) == 0:
+        return {'estimate': float(estimate), 'lower': None, 'upper': None, 'stdError': None}
+    lower, upper = np.percentile(samples, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+    return {
+        'estimate': float(estimate),
+        'lower': float(lower),
+        'upper': float(upper),
+        'stdError': float(samples.std(ddof=1)) if len(samples) > 1 else 0.0
+    }
+
+def bootstrap_metrics(durations, events, risk_scores, survival_curves, times, n_bootstrap=1000, alpha=0.05,
+                      n_jobs=None, random_state=0):
+    """
+    Bootstrap confidence intervals of the C-index and the integrated Brier
+    score from predictions computed once. Only the patient indices are
+    resampled; the predictions are placed in shared memory and read by the
+    worker processes. Resamples are split into fixed, independently seeded
+    chunks, so the result does not depend on the number of workers.
+
+    Args:
+        durations: Observed times of the validation set
+        events: Event indicators (1=event, 0=censored)
+        risk_scores: Dictionary of model name -> risk scores, shape (n,)
+        survival_curves: Dictionary of model name -> survival probabilities,
+                         shape (n, n_times)
+        times: Sorted time grid of the survival curves
+        n_bootstrap: Number of bootstrap resamples
+        alpha: Significance level of the percentile intervals
+        n_jobs: Worker processes; None uses all CPUs, 1 runs in the calling process
+        random_state: Seed of the resampling
+
+    Returns:
+        Dictionary of model name -> {'cIndex', 'integratedBrierScore'}, each
+        with the point estimate, the interval bounds and the standard error
+    """
+    names = list(risk_scores)
+    times = np.asarray(times, dtype=float)
+    arrays = {
+        'durations': np.asarray(durations, dtype=float),
+        'events': np.asarray(events, dtype=bool),
+        'risk': np.stack([np.asarray(risk_scores[name], dtype=float) for name in names]),
+        'survival': np.stack([np.asarray(survival_curves[name], dtype=float) for name in names])
+    }
+
+    sizes = [min(BOOTSTRAP_CHUNK, n_bootstrap - start) for start in range(0, n_bootstrap, BOOTSTRAP_CHUNK)]
+    seeds = np.random.SeedSequence(random_state).spawn(len(sizes))
+    n_jobs = n_jobs or os.cpu_count() or 1
+
+    if n_jobs == 1 or len(sizes) == 1:
+        chunks = [_resample_metrics(arrays, times, size, seed) for size, seed in zip(sizes, seeds)]
+    else:
+        with SharedArrays(arrays) as shared:
+            with ProcessPoolExecutor(max_workers=min(n_jobs, len(sizes)), initializer=_attach_worker,
+                                     initargs=(shared.spec,)) as executor:
+                futures = [executor.submit(_bootstrap_chunk, times, size, seed) for size, seed in zip(sizes, seeds)]
+                chunks = [future.result() for future in futures]
+    samples = np.concatenate(chunks)
+
+    y = {'time': arrays['durations'], 'event': arrays['events']}
+    results = {}
+    for m, name in enumerate(names):
+        c_index = harrell_c_index(y['time'], y['event'], arrays['risk'][m])['c_index']
+        ibs = calculate_integrated_brier_score(y, arrays['survival'][m], times)['integrated_brier_score']
+        results[name] = {
+            'cIndex': _interval(c_index, samples[:, m, 0], alpha),
+            'integratedBrierScore': _interval(ibs, samples[:, m, 1], alpha)
+        }
+    return results
+
+def evaluate_models(models, X, durations, events, times=None, n_bootstrap=1000, alpha=0.05, n_jobs=None,
+                    random_state=0):
+    """
+    Score every model on the validation set once and bootstrap its metrics.
+    The risk score is the predicted 24-month risk, as reported by the API.
+
+    Args:
+        models: Dictionary of model name -> model wrapper exposing predict_batch
+        X: Preprocessed validation features
+        durations: Observed times of the validation set
+        events: Event indicators (1=event, 0=censored)
+        times: Time grid of the Brier score; defaults to the serving grid
+               points within the follow-up of the validation set
+        n_bootstrap: Number of bootstrap resamples
+        alpha: Significance level of the percentile intervals
+        n_jobs: Worker processes; None uses all CPUs
+        random_state: Seed of the resampling
+
+    Returns:
+        Validation report dictionary
+    """
+    durations = np.asarray(durations, dtype=float)
+    if times is None:
+        times = SERVING_GRID_MONTHS[(SERVING_GRID_MONTHS > 0) & (SERVING_GRID_MONTHS < durations.max())]
+    times = np.asarray(times, dtype=float)
+
+    start = time.time()
+    risk_scores, survival_curves = {}, {}
+    for name, model in models.items():
+        predictions = model.predict_batch(X)
+        grid = np.asarray(predictions['months'], dtype=float)
+        curves = np.asarray(predictions['survival_curves'], dtype=float)
+        # Survival at the Brier time points (step function over the model's grid)
+        idx = np.searchsorted(grid, times, side='right') - 1
+        survival_curves[name] = np.where(idx >= 0, curves[:, np.maximum(idx, 0)], 1.0)
+        risk_scores[name] = 1 - np.asarray(predictions['survival_probability_24m'], dtype=float) / 100
+    scoring_seconds = time.time() - start
+
+    start = time.time()
+    metrics = bootstrap_metrics(durations, events, risk_scores, survival_curves, times, n_bootstrap=n_bootstrap,
+                                alpha=alpha, n_jobs=n_jobs, random_state=random_state)
+
+    return {
+        'nPatients': int(len(durations)),
+        'nEvents': int(np.asarray(events, dtype=bool).sum()),
+        'nBootstrap': int(n_bootstrap),
+        'confidenceLevel': 1 - alpha,
+        'times': times.tolist(),
+        'models': metrics,
+        'scoringSeconds': scoring_seconds,
+        'bootstrapSeconds': time.time() - start
+    }
+
+def save_validation_report(report, path):
+    """Write a validation report as JSON"""
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+def load_validation_report(path):
+    """
+    Load a validation report.
+
+    Args:
+        path: Path of the JSON report
+
+    Returns:
+        Report dictionary, or None if there is no report
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
@@ -1,13 +1,36 @@
 import pandas as pd
 import numpy as np
 
-def preprocess_input(data, preprocessor=None):
+# Categorical encodings for the API fields: column -> (value map, default for
+# missing or unknown values)
+GENDER_MAP = {'female': 0, 'male': 1}
+STATUS_MAP = {'negative': 0, 'positive': 1}
+STAGE_MAP = {'I': 1, 'II': 2, 'III': 3, 'IV': 4}
+TREATMENT_MAP = {
+    'none': 0,
+    'surgery': 1,
+    'chemotherapy': 2,
+    'radiation': 3,
+    'combination': 4
+}
+CATEGORY_MAPS = {
+    'gender': (GENDER_MAP, 0),
+    'erStatus': (STATUS_MAP, 0),
+    'prStatus': (STATUS_MAP, 0),
+    'her2Status': (STATUS_MAP, 0),
+    'tumorStage': (STAGE_MAP, 2),
+    'treatmentHistory': (TREATMENT_MAP, 0)
+}
+
+def preprocess_input(data, preprocessor=None, row_wise=False):
     """
     Preprocess input data for model prediction.
     
     Args:
         data: Dictionary or DataFrame with patient data
         preprocessor: Fitted sklearn preprocessor
+        row_wise: Treat every row of a DataFrame as if it had been passed on its
+                  own, so batch results do not depend on which rows share a batch
         
     Returns:
         Preprocessed data ready for model input
@@ -16,11 +39,16 @@ def preprocess_input(data, preprocessor=None):
     if isinstance(data, dict):
         data = pd.DataFrame([data])
     
+    # A ColumnTransformer fitted on the raw training columns (as saved by
+    # train_and_save_models.py) encodes the categorical features itself
+    if hasattr(preprocessor, 'transformers_') and hasattr(preprocessor, 'feature_names_in_'):
+        return transform_raw_columns(data, preprocessor, row_wise=row_wise)
+    
     # Handle missing values
-    data = handle_missing_values(data)
+    data = handle_missing_values(data, row_wise=row_wise)
     
     # Convert categorical features
-    data = encode_categorical_features(data)
+    data = encode_categorical_features(data, row_wise=row_wise)
     
     # Apply feature scaling if preprocessor is provided
     if preprocessor is not None:
@@ -29,12 +57,14 @@ def preprocess_input(data, preprocessor=None):
     
     return data
 
-def handle_missing_values(df):
+def handle_missing_values(df, row_wise=False):
     """
     Handle missing values in the input data.
     
     Args:
         df: Input DataFrame
+        row_wise: Fill with the single-row defaults (0 and "unknown") instead of
+                  column statistics
         
     Returns:
         DataFrame with handled missing values
@@ -47,7 +77,7 @@ def handle_missing_values(df):
     for col in numeric_cols:
         if df[col].isna().any():
             # Use median as a simple imputation strategy
-            median_value = df[col].median()
+            median_value = 0 if row_wise else df[col].median()
             if pd.isna(median_value):  # If all values are NA
                 median_value = 0
             df[col] = df[col].fillna(median_value)
@@ -57,17 +87,19 @@ def handle_missing_values(df):
     for col in categorical_cols:
         if df[col].isna().any():
             # Use most frequent value
-            mode_value = df[col].mode()[0] if not df[col].mode().empty else "unknown"
+            mode_value = "unknown" if row_wise or df[col].mode().empty else df[col].mode()[0]
             df[col] = df[col].fillna(mode_value)
     
     return df
 
-def encode_categorical_features(df):
+def encode_categorical_features(df, row_wise=False):
     """
     Encode categorical features in the input data.
     
     Args:
         df: Input DataFrame
+        row_wise: Drop non-numeric columns instead of one-hot encoding them,
+                  which is what a single-row call ends up doing
         
     Returns:
         DataFrame with encoded categorical features
@@ -76,37 +108,52 @@ def encode_categorical_features(df):
     df = df.copy()
     
     # Map common categorical variables
-    gender_map = {'female': 0, 'male': 1}
-    if 'gender' in df.columns:
-        df['gender'] = df['gender'].map(gender_map).fillna(0)
-    
-    status_map = {'negative': 0, 'positive': 1}
-    for col in ['erStatus', 'prStatus', 'her2Status']:
+    for col, (mapping, default) in CATEGORY_MAPS.items():
         if col in df.columns:
-            df[col] = df[col].map(status_map).fillna(0)
-    
-    stage_map = {'I': 1, 'II': 2, 'III': 3, 'IV': 4}
-    if 'tumorStage' in df.columns:
-        df['tumorStage'] = df['tumorStage'].map(stage_map).fillna(2)
-    
-    treatment_map = {
-        'none': 0,
-        'surgery': 1,
-        'chemotherapy': 2,
-        'radiation': 3,
-        'combination': 4
-    }
-    if 'treatmentHistory' in df.columns:
-        df['treatmentHistory'] = df['treatmentHistory'].map(treatment_map).fillna(0)
+            df[col] = df[col].map(mapping).fillna(default)
     
     # Convert any remaining object columns to numeric if possible
     for col in df.select_dtypes(include=['object']).columns:
         try:
             df[col] = pd.to_numeric(df[col])
         except:
+            if row_wise:
+                df = df.drop(col, axis=1)
+                continue
             # If conversion fails, use one-hot encoding
             dummies = pd.get_dummies(df[col], prefix=col, drop_first=True)
             df = pd.concat([df, dummies], axis=1)
             df = df.drop(col, axis=1)
     
     return df
+
+def transform_raw_columns(df, preprocessor, row_wise=False):
+    """
+    Apply a ColumnTransformer fitted on the raw input columns.
+    Categorical columns are passed as strings, with "unknown" for missing
+    values as at training time; the other columns are converted to numbers
+    and missing values filled by handle_missing_values.
+    
+    Args:
+        df: Input DataFrame
+        preprocessor: Fitted ColumnTransformer with feature_names_in_
+        row_wise: Fill missing numbers with 0 instead of column medians
+        
+    Returns:
+        DataFrame with the preprocessor's output features
+    """
+    categorical = set()
+    for _, step, selected in preprocessor.transformers_:
+        if type(step).__name__ == 'OneHotEncoder':
+            categorical.update(str(c) for c in selected)
+    
+    columns = {}
+    for col in (str(c) for c in preprocessor.feature_names_in_):
+        values = df[col] if col in df.columns else pd.Series(np.nan, index=df.index, dtype=object)
+        if col in categorical:
+            columns[col] = values.astype(object).where(values.notna(), 'unknown').astype(str)
+        else:
+            columns[col] = pd.to_numeric(values, errors='coerce').astype(float)
+    X = handle_missing_values(pd.DataFrame(columns, index=df.index), row_wise=row_wise)
+    
+    return pd.DataFrame(preprocessor.transform(X), columns=preprocessor.get_feature_names_out())
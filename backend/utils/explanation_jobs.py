@@ -0,0 +1,173 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Job states
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+class ExplanationJobManager:
+    """
+    Background explanation jobs.
+    Explanations are computed on a dedicated worker pool so predictions can be
+    returned immediately; results are kept for polling and shared between
+    requests with identical inputs.
+    """
+
+    def __init__(self, compute, max_workers=2, max_jobs=4096, ttl_seconds=3600, max_pending=64):
+        """
+        Initialize the job manager.
+
+        Args:
+            compute: Callable computing the explanation for one job's input
+            max_workers: Number of worker threads computing explanations
+            max_jobs: Maximum number of jobs kept; the oldest finished jobs are
+                      dropped first
+            ttl_seconds: Seconds a finished job is kept for polling
+            max_pending: Maximum number of queued or running jobs; new inputs
+                         are rejected while the queue is full
+        """
+        self.compute = compute
+        self.max_jobs = max_jobs
+        self.ttl_seconds = ttl_seconds
+        self.max_pending = max_pending
+        self._unfinished = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='explain')
+        self._jobs = OrderedDict()
+        # Finished job ids in the order they finished, which is their expiry order
+        self._finished = OrderedDict()
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.deduplicated = 0
+        self.rejected = 0
+
+    @staticmethod
+    def job_id(input_key):
+        """Job identifier for an input key (e.g. a feature vector and artifact hash)"""
+        return hashlib.sha256(input_key.encode('utf-8')).hexdigest()[:32]
+
+    def submit(self, input_key, *args):
+        """
+        Schedule an explanation, reusing the job of an identical earlier input.
+
+        Args:
+            input_key: Canonical key of the input; identical inputs share a job
+            *args: Arguments passed to the compute function
+
+        Returns:
+            Job identifier, or None if the queue is full
+        """
+        job_id = self.job_id(input_key)
+        now = time.time()
+
+        with self._lock:
+            self._expire(now)
+            job = self._jobs.get(job_id)
+            if job is not None and job['status'] != FAILED:
+                self._jobs.move_to_end(job_id)
+                self.deduplicated += 1
+                return job_id
+
+            # Explanations cost far more than predictions; a burst of distinct
+            # inputs must not build an unbounded backlog
+            if self._unfinished >= self.max_pending:
+                self.rejected += 1
+                return None
+
+            self._finished.pop(job_id, None)
+            self._jobs[job_id] = {
+                'id': job_id,
+                'status': PENDING,
+                'createdAt': now,
+                'startedAt': None,
+                'finishedAt': None,
+                'result': None,
+                'error': None
+            }
+            self._jobs.move_to_end(job_id)
+            self.submitted += 1
+            self._unfinished += 1
+            self._evict()
+
+        self._executor.submit(self._run, job_id, args)
+        return job_id
+
+    def _run(self, job_id, args):
+        """Compute one job on a worker thread"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            with self._lock:
+                self._unfinished -= 1
+            return
+        job['startedAt'] = time.time()
+        job['status'] = RUNNING
+        try:
+            job['result'] = self.compute(*args)
+            job['status'] = DONE
+        except Exception as e:
+            print(f"Explanation job {job_id} failed: {e}")
+            job['error'] = str(e)
+            job['status'] = FAILED
+        with self._lock:
+            job['finishedAt'] = time.time()
+            self._finished[job_id] = job['finishedAt']
+            self._unfinished -= 1
+
+    def get(self, job_id):
+        """
+        Return a snapshot of a job.
+
+        Args:
+            job_id: Job identifier from submit()
+
+        Returns:
+            Dictionary with the job state and, once finished, its result or
+            error; None for unknown or expired jobs
+        """
+        with self._lock:
+            self._expire(time.time())
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def _expire(self, now):
+        """Drop finished jobs older than the TTL, oldest first (caller holds the lock)"""
+        while self._finished:
+            job_id, finished_at = next(iter(self._finished.items()))
+            if now - finished_at <= self.ttl_seconds:
+                break
+            del self._finished[job_id]
+            del self._jobs[job_id]
+
+    def _evict(self):
+        """Drop the least recently used finished jobs above max_jobs (caller holds the lock)"""
+        excess = len(self._jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        # At most max_pending unfinished jobs are passed over
+        evicted = []
+        for job_id, job in self._jobs.items():
+            if len(evicted) == excess:
+                break
+            if job['finishedAt'] is not None:
+                evicted.append(job_id)
+        for job_id in evicted:
+            del self._jobs[job_id]
+            self._finished.pop(job_id, None)
+
+    def stats(self):
+        """
+        Return job statistics.
+
+        Returns:
+            Dictionary with job counts per state and submission and rejection counters
+        """
+        with self._lock:
+            counts = {state: 0 for state in (PENDING, RUNNING, DONE, FAILED)}
+            for job in self._jobs.values():
+                counts[job['status']] += 1
+            return {'jobs': counts, 'submitted': self.submitted, 'deduplicated': self.deduplicated,
+                    'rejected': self.rejected}
@@ -2,6 +2,7 @@ import pandas as pd
 import numpy as np
 import os
 import io # Required to read string content as a file
+import csv
 
 # MODIFIED: The function now takes file content and filename, not a path.
 def process_uploaded_file(file_content, filename, id_column='patient_id'):
@@ -15,6 +16,7 @@ def process_uploaded_file(file_content, filename, id_column='patient_id'):
                         Used to infer the separator.
         id_column (str): The name of the column containing the patient identifier.
                          Defaults to 'patient_id'. For TCGA, you might use 'bcr_patient_barcode'.
+                         Detected from the header when None.
         
     Returns:
         DataFrame with processed data
@@ -32,6 +34,9 @@ def process_uploaded_file(file_content, filename, id_column='patient_id'):
     file_stream = io.StringIO(file_content)
     df = pd.read_csv(file_stream, sep=separator)
     
+    if id_column is None:
+        id_column = detect_id_column(df.columns)
+    
     # MODIFIED: Check for the user-specified ID column
     required_columns = [id_column]
     missing_columns = [col for col in required_columns if col not in df.columns]
@@ -52,6 +57,63 @@ def process_uploaded_file(file_content, filename, id_column='patient_id'):
     
     return df
 
+def detect_id_column(header_columns):
+    """
+    Pick the patient identifier column from a file header.
+    
+    Args:
+        header_columns: Column names from the first line of the file
+        
+    Returns:
+        'bcr_patient_barcode' for TCGA exports, 'patient_id' otherwise
+    """
+    return 'bcr_patient_barcode' if 'bcr_patient_barcode' in header_columns else 'patient_id'
+
+def iter_uploaded_file_chunks(binary_stream, filename, id_column=None, chunksize=2048):
+    """
+    Parse an uploaded file incrementally, chunksize rows at a time.
+    Only the current chunk is held in memory, so large files can be scored
+    while they are still being read.
+    
+    Args:
+        binary_stream: Binary file-like object with the uploaded content
+        filename (str): The original name of the file, used to infer the separator.
+        id_column (str): Name of the patient identifier column. Detected from the
+                         header when None.
+        chunksize (int): Number of rows per chunk
+        
+    Returns:
+        Tuple (id_column, generator of (start_row, DataFrame) chunks). The
+        header is read and validated before returning, so a missing ID column
+        raises immediately rather than halfway through the stream.
+    """
+    separator = '\t' if filename.lower().endswith(('.tsv', '.txt')) else ','
+    
+    # Decode on the fly instead of materializing the whole file as a string
+    text_stream = io.TextIOWrapper(binary_stream, encoding='utf-8', newline='')
+    header_line = text_stream.readline()
+    header = next(csv.reader([header_line], delimiter=separator), [])
+    
+    if id_column is None:
+        id_column = detect_id_column(header)
+    if id_column not in header:
+        raise ValueError(f"Missing required ID column: '{id_column}'")
+    
+    def chunks():
+        reader = pd.read_csv(text_stream, sep=separator, header=None, names=header, chunksize=chunksize)
+        start = 0
+        missing_total = 0
+        for chunk in reader:
+            if chunk[id_column].duplicated().any():
+                print(f"Warning: Found {chunk[id_column].duplicated().sum()} duplicate patient IDs in rows {start}-{start + len(chunk) - 1}")
+            missing_total += int(chunk.isnull().sum().sum())
+            yield start, chunk
+            start += len(chunk)
+        if missing_total > 0:
+            print(f"Warning: Found {missing_total} missing values")
+    
+    return id_column, chunks()
+
 # NEW FUNCTION: Replaces `save_results` to be compatible with the environment
 def generate_results_csv(results):
     """
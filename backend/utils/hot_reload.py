@@ -0,0 +1,181 @@
+import os
+import time
+import threading
+
+class ModelReloader:
+    """
+    Background hot reload of the models when their artifacts change.
+    The artifact directory's fingerprint is polled; once a new fingerprint
+    has been stable for a whole poll interval (so a retraining run that is
+    still writing files is not picked up halfway), the registry loads,
+    validates and swaps in a new generation of models.
+    A process that serves next to others (a serve.py worker) can leave the
+    polling to a coordinator by setting request_reload: it then reloads when
+    told to, and forced reloads are requested from the coordinator.
+    """
+
+    def __init__(self, registry, fingerprint, validate=None, poll_interval=10.0, names=None):
+        """
+        Initialize the reloader.
+
+        Args:
+            registry: ModelRegistry to reload
+            fingerprint: ArtifactFingerprint of the model directory
+            validate: Callable receiving a RegistrySnapshot of the new models,
+                      raising if they must not be served
+            poll_interval: Seconds between fingerprint checks
+            names: Models to reload, by default the ones already loaded
+        """
+        self.registry = registry
+        self.fingerprint = fingerprint
+        self.validate = validate
+        self.poll_interval = poll_interval
+        self.names = names
+        self._served = None
+        self._candidate = None
+        self._rejected = None
+        self._announced = None
+        self.request_reload = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self.reloads = 0
+        self.failures = 0
+        self.last_reload = None
+        self.last_error = None
+
+    def current(self):
+        """
+        Fingerprint of the artifacts the served models were loaded from, so
+        the reloader can key caches in place of an ArtifactFingerprint.
+
+        Returns:
+            Hex digest string
+        """
+        if self._served is None:
+            with self._lock:
+                if self._served is None:
+                    self._served = self.fingerprint.current()
+        return self._served
+
+    def check(self, force=False, debounce=True):
+        """
+        Check the artifacts once and reload the models if they changed.
+
+        Args:
+            force: Reload even if the fingerprint is unchanged or was rejected
+            debounce: Wait until a new fingerprint has been seen twice; off when
+                      a coordinator has already seen the files settle
+
+        Returns:
+            True if a new generation of models was swapped in
+        """
+        with self._lock:
+            fingerprint = self.fingerprint.current()
+            if self._served is None:
+                self._served = fingerprint
+            if not force:
+                if fingerprint == self._served or fingerprint == self._rejected:
+                    self._candidate = None
+                    return False
+                # Wait until the files have stopped changing
+                if debounce and fingerprint != self._candidate:
+                    self._candidate = fingerprint
+                    return False
+
+            start = time.perf_counter()
+            try:
+                generation = self.registry.reload(self.names, validate=self.validate)
+            except Exception as e:
+                self.failures += 1
+                self._rejected = fingerprint
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"Model reload failed, still serving generation {self.registry.generation}: {self.last_error}")
+                return False
+
+            self.reloads += 1
+            self._served = fingerprint
+            self._candidate = None
+            self._rejected = None
+            self.last_error = None
+            self.last_reload = {
+                'generation': generation,
+                'fingerprint': fingerprint,
+                'seconds': time.perf_counter() - start,
+                'at': time.time()
+            }
+            print(f"Models reloaded as generation {generation} in {self.last_reload['seconds']:.2f}s")
+            return True
+
+    def poll(self):
+        """
+        Check the artifacts once without reloading, for a coordinator that
+        tells other processes to reload (the serve.py master).
+
+        Returns:
+            True once changed artifacts have stayed the same for a whole poll
+            interval; the same artifacts are reported only once
+        """
+        served = self.current()
+        with self._lock:
+            fingerprint = self.fingerprint.current()
+            if fingerprint == (self._announced or served):
+                self._candidate = None
+                return False
+            if fingerprint != self._candidate:
+                self._candidate = fingerprint
+                return False
+            self._candidate = None
+            self._announced = fingerprint
+            return True
+
+    def _run(self):
+        """Poll until stopped"""
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Model reload check failed: {e}")
+
+    def ensure_running(self):
+        """
+        Start the polling thread if it is not running in this process.
+        Threads do not survive fork(), so a forked worker starts its own
+        unless a coordinator polls for it.
+        """
+        if self.poll_interval <= 0 or self.request_reload is not None:
+            return
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid != os.getpid() or self._thread is None:
+                self._stop = threading.Event()
+                self._thread = threading.Thread(target=self._run, name='model-reload', daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def stop(self):
+        """Stop the polling thread"""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join()
+        self._thread = None
+
+    def status(self):
+        """
+        Return the reload state.
+
+        Returns:
+            Dictionary with the served generation, counters and the last reload or error
+        """
+        return {
+            'enabled': self.poll_interval > 0,
+            'pollIntervalSeconds': self.poll_interval,
+            'generation': self.registry.generation,
+            'fingerprint': self._served,
+            'reloads': self.reloads,
+            'failures': self.failures,
+            'lastReload': self.last_reload,
+            'lastError': self.last_error
+        }
@@ -0,0 +1,341 @@
+import os
+import json
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Prometheus text exposition format served at /api/metrics
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Endpoint label of the stages timed while serving the current request
+_endpoint = contextvars.ContextVar('endpoint', default='none')
+
+def _escape(value):
+    """Escape a label value for the text format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_value(value):
+    """Format a sample value for the text format"""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """
+    Base class of a labelled metric.
+    One series is kept per combination of label values; updates are
+    thread-safe.
+    """
+
+    TYPE = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        """
+        Initialize the metric.
+
+        Args:
+            name: Metric name, e.g. 'survival_rows_processed_total'
+            documentation: Help text
+            labelnames: Names of the labels every sample carries
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        """Label values in labelnames order"""
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key, extra=None):
+        """Render the label set of a series"""
+        pairs = list(zip(self.labelnames, key)) + (extra or [])
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+    @staticmethod
+    def _copy(value):
+        """Copy of a series value"""
+        return value
+
+    @staticmethod
+    def _combine(total, value):
+        """Add the value of a series in another process to a total"""
+        return total + value
+
+    def state(self):
+        """Copy of every series, keyed by label values"""
+        with self._lock:
+            return {key: self._copy(value) for key, value in self._series.items()}
+
+    def load_state(self, state):
+        """Replace every series with those of a state()"""
+        with self._lock:
+            self._series = {tuple(key): self._copy(value) for key, value in state.items()}
+
+    def merged(self, states):
+        """Add up the series of several processes' states"""
+        series = {}
+        for state in states:
+            for key, value in state.items():
+                series[key] = self._combine(series[key], value) if key in series else self._copy(value)
+        return series
+
+    def samples(self, series):
+        """Yield (suffix, label string, value) for every sample of the series"""
+        raise NotImplementedError
+
+    def render(self, states=None):
+        """
+        Render the metric in the Prometheus text format.
+
+        Args:
+            states: Optional list of (worker, state) pairs to combine instead of
+                    this process's series
+
+        Returns:
+            List of lines
+        """
+        series = self.state() if states is None else self.merged(state for _, state in states)
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+        for suffix, labels, value in self.samples(series):
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    """Monotonically increasing count, e.g. of processed rows or errors"""
+
+    TYPE = 'counter'
+
+    def inc(self, amount=1, **labels):
+        """Add amount to the series of the given labels"""
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def samples(self, series):
+        for key, value in sorted(series.items()):
+            yield '', self._labels(key), value
+
+class Gauge(Metric):
+    """Value that can go up and down, e.g. the served model generation"""
+
+    TYPE = 'gauge'
+
+    def set(self, value, **labels):
+        """Set the series of the given labels"""
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+    def samples(self, series):
+        for key, value in sorted(series.items()):
+            yield '', self._labels(key), value
+
+    def render(self, states=None):
+        """Render the metric; values of several processes are labelled by worker"""
+        if states is None:
+            return super().render()
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+        for worker, state in states:
+            for key, value in sorted(state.items()):
+                lines.append(f"{self.name}{self._labels(key, [('worker', worker)])} {_format_value(value)}")
+        return lines
+
+class Histogram(Metric):
+    """
+    Distribution of observed values over fixed buckets, with their sum and count.
+    """
+
+    TYPE = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        Initialize the histogram.
+
+        Args:
+            name: Metric name
+            documentation: Help text
+            labelnames: Names of the labels every sample carries
+            buckets: Increasing bucket upper bounds (+Inf is added)
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        """Record one observation in the series of the given labels"""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, the last one is +Inf, then sum
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @staticmethod
+    def _copy(value):
+        return list(value)
+
+    @staticmethod
+    def _combine(total, value):
+        return [a + b for a, b in zip(total, value)]
+
+    def samples(self, series):
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values[:-1]):
+                cumulative += count
+                yield '_bucket', self._labels(key, [('le', _format_value(float(bound)))]), cumulative
+            yield '_sum', self._labels(key), values[-1]
+            yield '_count', self._labels(key), cumulative
+
+class MetricsRegistry:
+    """
+    Collection of metrics rendered together at the metrics endpoint.
+    Processes serving the same endpoint (the workers of serve.py) can share
+    their metrics through a directory: each one writes its series there with
+    save(), and render() adds up the counters and histograms of all of them
+    and labels gauges with the worker they come from.
+    """
+
+    def __init__(self):
+        """Initialize an empty collection."""
+        self._metrics = {}
+        self._directory = None
+        self._worker = None
+
+    def register(self, metric):
+        """Add a metric and return it"""
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def share(self, directory, worker):
+        """
+        Combine the metrics of this process with those saved by others.
+
+        Args:
+            directory: Directory the processes save their series to
+            worker: Name of this process's series, e.g. the worker slot
+        """
+        self._directory = directory
+        self._worker = str(worker)
+
+    def _path(self, worker):
+        """File the series of a worker are saved to"""
+        return os.path.join(self._directory, f"metrics-{worker}.json")
+
+    def save(self):
+        """Write the series of this process to the shared directory"""
+        state = {name: [[list(key), value] for key, value in metric.state().items()]
+                 for name, metric in self._metrics.items()}
+        path = self._path(self._worker)
+        staging = f"{path}.tmp"
+        with open(staging, 'w') as f:
+            json.dump(state, f)
+        os.replace(staging, path)
+
+    def restore(self):
+        """
+        Continue from the series saved under this process's worker name, so
+        the counters of a replaced worker do not go back to zero.
+        Counts inherited from the parent process are dropped; gauges keep
+        their current value.
+        """
+        saved = self._load(self._worker) or {}
+        for name, metric in self._metrics.items():
+            if not isinstance(metric, Gauge):
+                metric.load_state(saved.get(name, {}))
+
+    def _load(self, worker):
+        """Series saved by a worker, None if there are none"""
+        try:
+            with open(self._path(worker)) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return {name: {tuple(key): value for key, value in series} for name, series in saved.items()}
+
+    def _states(self):
+        """(worker, series by metric) of this and every other sharing process"""
+        states = [(self._worker, {name: metric.state() for name, metric in self._metrics.items()})]
+        for filename in sorted(os.listdir(self._directory)):
+            if not (filename.startswith('metrics-') and filename.endswith('.json')):
+                continue
+            worker = filename[len('metrics-'):-len('.json')]
+            if worker != self._worker:
+                saved = self._load(worker)
+                if saved is not None:
+                    states.append((worker, saved))
+        return sorted(states, key=lambda item: item[0])
+
+    def render(self):
+        """
+        Render all metrics in the Prometheus text format.
+
+        Returns:
+            Exposition text
+        """
+        states = self._states() if self._directory is not None else None
+        lines = []
+        for name, metric in self._metrics.items():
+            if states is None:
+                lines.extend(metric.render())
+            else:
+                lines.extend(metric.render([(worker, state.get(name, {})) for worker, state in states]))
+        return '\n'.join(lines) + '\n'
+
+METRICS = MetricsRegistry()
+
+REQUEST_SECONDS = METRICS.register(Histogram(
+    'survival_request_duration_seconds', "Request latency until the response is closed",
+    labelnames=('endpoint', 'method', 'status')))
+STAGE_SECONDS = METRICS.register(Histogram(
+    'survival_stage_duration_seconds', "Time spent in each stage of request handling",
+    labelnames=('endpoint', 'stage')))
+ROWS_PROCESSED = METRICS.register(Counter(
+    'survival_rows_processed_total', "Patients scored", labelnames=('endpoint',)))
+ERRORS = METRICS.register(Counter(
+    'survival_errors_total', "Exceptions raised in a stage", labelnames=('endpoint', 'stage')))
+MODEL_GENERATION = METRICS.register(Gauge(
+    'survival_model_generation', "Generation of the served models (incremented by every hot reload)"))
+
+def set_endpoint(endpoint):
+    """Label the stages timed in the current context with an endpoint"""
+    _endpoint.set(endpoint or 'none')
+
+def current_endpoint():
+    """Endpoint label of the current context"""
+    return _endpoint.get()
+
+@contextmanager
+def timed(stage, endpoint=None):
+    """
+    Time a stage into the stage latency histogram, counting exceptions as errors.
+
+    Args:
+        stage: Stage name, e.g. 'preprocess' or 'model.rsf'
+        endpoint: Endpoint label, by default the one set for the current request
+                  (pass it explicitly from worker threads)
+    """
+    endpoint = endpoint or _endpoint.get()
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.inc(endpoint=endpoint, stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, stage=stage)
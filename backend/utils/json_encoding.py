@@ -0,0 +1,146 @@
+import os
+import json
+import gzip
+import math
+import zlib
+import numpy as np
+from flask import Response, request
+
+# orjson (see requirements.txt) serializes NumPy arrays natively and several
+# times faster than the standard library encoder, which remains the fallback
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Buffered responses smaller than this are not worth compressing; 0 disables gzip
+GZIP_MIN_BYTES = int(os.environ.get('RESPONSE_GZIP_MIN_BYTES', 1024))
+GZIP_LEVEL = int(os.environ.get('RESPONSE_GZIP_LEVEL', 6))
+
+def numpy_default(obj):
+    """
+    Convert NumPy values the JSON encoders do not handle themselves.
+
+    Args:
+        obj: Object the encoder could not serialize
+
+    Returns:
+        Equivalent Python list or scalar
+    """
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def replace_non_finite(obj):
+    """
+    Copy an object for the standard library encoder, replacing NaN and
+    infinite floats with None, as orjson writes them.
+
+    Args:
+        obj: Object to serialize
+
+    Returns:
+        Object of lists, dictionaries and Python scalars
+    """
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: replace_non_finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [replace_non_finite(value) for value in obj]
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind == 'f':
+            values = obj.astype(object)
+            values[~np.isfinite(obj)] = None
+            return values.tolist()
+        return replace_non_finite(obj.tolist()) if obj.dtype.hasobject else obj.tolist()
+    if isinstance(obj, np.generic):
+        return replace_non_finite(obj.item())
+    return obj
+
+def dumps(obj):
+    """
+    Serialize an object to compact JSON, encoding NumPy arrays and scalars.
+    NaN and infinite floats are written as null by both encoders, so the
+    output is always valid JSON.
+
+    Args:
+        obj: Object to serialize
+
+    Returns:
+        UTF-8 encoded JSON bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=numpy_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(replace_non_finite(obj), default=numpy_default, separators=(',', ':'),
+                      allow_nan=False).encode('utf-8')
+
+def accepts_gzip():
+    """Return whether gzip is enabled and the current request accepts it"""
+    return GZIP_MIN_BYTES > 0 and request.accept_encodings['gzip'] > 0
+
+def json_response(payload, status=200):
+    """
+    Build a JSON response with dumps(), gzip-compressed when the client
+    accepts it and the body is at least GZIP_MIN_BYTES long.
+
+    Args:
+        payload: Object to serialize
+        status: HTTP status code
+
+    Returns:
+        Flask response
+    """
+    body = dumps(payload)
+    response = Response(body, status=status, mimetype='application/json')
+    if GZIP_MIN_BYTES > 0:
+        response.vary.add('Accept-Encoding')
+        if len(body) >= GZIP_MIN_BYTES and accepts_gzip():
+            response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+            response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+def gzip_stream(chunks, level=GZIP_LEVEL):
+    """
+    Compress a stream of byte chunks into one gzip stream.
+    Every chunk is flushed, so the client can decode each one as it arrives.
+
+    Args:
+        chunks: Iterable of bytes
+        level: Compression level
+
+    Yields:
+        Compressed bytes
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        # Closing the response closes the wrapped generator too
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+def stream_response(chunks, mimetype='application/x-ndjson'):
+    """
+    Build a streaming response, gzip-compressed when the client accepts it.
+
+    Args:
+        chunks: Iterable of bytes, e.g. a generator wrapped in stream_with_context
+        mimetype: Content type of the stream
+
+    Returns:
+        Flask response
+    """
+    if not accepts_gzip():
+        return Response(chunks, mimetype=mimetype)
+    response = Response(gzip_stream(chunks), mimetype=mimetype)
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
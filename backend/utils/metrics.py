@@ -1,7 +1,189 @@
 import numpy as np
-from lifelines.utils import concordance_index
-from sklearn.metrics import brier_score_loss
-from scipy.stats import logrank_test
+from concurrent.futures import ProcessPoolExecutor
+from scipy.stats import chi2
+from models.kaplan_meier import GroupedKaplanMeier
+
+# Rows of the survival matrix (or patients, for the concordance indices)
+# processed at once by the vectorized metrics
+METRIC_CHUNK_SIZE = 65536
+
+def _dense_rank(values):
+    """Dense integer ranks of values (equal values share a rank) and the number of distinct values"""
+    distinct, ranks = np.unique(values, return_inverse=True)
+    return ranks.reshape(-1).astype(np.int64), len(distinct)
+
+def _later_rank_counts(ranks, n_ranks):
+    """
+    Count, for every position p, the later positions q > p with a smaller rank
+    and with an equal rank. Bottom-up merge sort: at every level sorted blocks
+    are merged pairwise, and an element of a left block is passed by exactly
+    those elements of its right neighbour that rank below it. Each level is a
+    stable sort of pre-sorted runs, so the whole count is O(n log n).
+    
+    Args:
+        ranks: Integer ranks in [0, n_ranks)
+        n_ranks: Number of distinct ranks
+        
+    Returns:
+        Tuple (smaller counts, equal counts), one entry per position
+    """
+    n = len(ranks)
+    positions = np.arange(n)
+    smaller = np.zeros(n, dtype=np.int64)
+    smaller_or_equal = np.zeros(n, dtype=np.int64)
+    current = ranks.astype(np.int64)
+    origin = positions.copy()
+    merged = np.empty(n, dtype=np.int64)
+    
+    width = 1
+    while width < n:
+        is_right = (positions // width) & 1
+        is_left = is_right == 0
+        key = ((positions // (2 * width)) * n_ranks + current) * 2
+        
+        # Left elements first among equal ranks: right elements passing them rank strictly lower
+        order = np.argsort(key + is_right, kind='stable')
+        merged[order] = positions
+        smaller[origin[is_left]] += merged[is_left] - positions[is_left]
+        
+        # Right elements first among equal ranks: also counts the equal ones
+        merged[np.argsort(key + 1 - is_right, kind='stable')] = positions
+        smaller_or_equal[origin[is_left]] += merged[is_left] - positions[is_left]
+        
+        current = current[order]
+        origin = origin[order]
+        width *= 2
+    
+    return smaller, smaller_or_equal - smaller
+
+def _concordance_counts(durations, events, risk_scores):
+    """
+    Per-patient concordance counts over comparable pairs.
+    Patient i with an event is comparable with every patient j that was
+    observed longer, or censored at the same time; the pair is concordant
+    when i has the higher risk score.
+    
+    Args:
+        durations: Observed times
+        events: Event indicators
+        risk_scores: Predicted risk scores (higher means shorter survival)
+        
+    Returns:
+        Dictionary of arrays in time order: 'time', 'event', 'risk',
+        'concordant', 'tied' (equal risk) and 'comparable' counts per patient
+    """
+    durations = np.asarray(durations, dtype=float)
+    events = np.asarray(events, dtype=bool)
+    risk_scores = np.asarray(risk_scores, dtype=float)
+    
+    # Time order; at equal times events precede censored patients, and tied
+    # events are in ascending risk so they never count as concordant
+    order = np.lexsort((risk_scores, ~events, durations))
+    t, e, r = durations[order], events[order], risk_scores[order]
+    ranks, n_ranks = _dense_rank(r)
+    
+    smaller, equal = _later_rank_counts(ranks, n_ranks)
+    
+    # Events sharing both time and risk score were counted as tied, but are not comparable
+    n = len(t)
+    new_group = np.r_[True, ~(e[1:] & e[:-1] & (t[1:] == t[:-1]) & (r[1:] == r[:-1]))]
+    group_last = np.r_[np.flatnonzero(new_group)[1:] - 1, n - 1]
+    equal = equal - (group_last[np.cumsum(new_group) - 1] - np.arange(n))
+    
+    # Comparable: everyone observed longer, plus those censored at the same time
+    longer = n - np.searchsorted(t, t, side='right')
+    censored_times = t[~e]
+    censored_same = (np.searchsorted(censored_times, t, side='right')
+                     - np.searchsorted(censored_times, t, side='left'))
+    
+    return {
+        'time': t,
+        'event': e,
+        'risk': r,
+        'concordant': smaller,
+        'tied': equal,
+        'comparable': longer + censored_same
+    }
+
+def _chunked_concordance_counts(durations, events, risk_scores, chunk_size=METRIC_CHUNK_SIZE):
+    """
+    Per-patient concordance counts as in _concordance_counts, computed chunk
+    by chunk. Chunks are taken from the latest times backwards and never
+    split patients observed at the same time. Pairs within a chunk are
+    counted by _concordance_counts; pairs with patients of later chunks
+    (all observed longer, so comparable) are counted against sorted runs of
+    their risk scores. Runs of similar length are merged, so at most about
+    log2(n / chunk_size) runs are searched per chunk.
+    
+    Args:
+        durations: Observed times
+        events: Event indicators
+        risk_scores: Predicted risk scores (higher means shorter survival)
+        chunk_size: Number of patients whose pairs are counted at once,
+                    bounding the size of the merge sort's temporary arrays
+        
+    Yields:
+        Dictionary of counts per patient of one chunk, as _concordance_counts
+    """
+    durations = np.asarray(durations, dtype=float)
+    events = np.asarray(events, dtype=bool)
+    risk_scores = np.asarray(risk_scores, dtype=float)
+    order = np.argsort(durations, kind='stable')
+    sorted_times = durations[order]
+    
+    runs = []
+    n_later = 0
+    stop = len(order)
+    while stop > 0:
+        start = int(np.searchsorted(sorted_times, sorted_times[max(stop - chunk_size, 0)], side='left'))
+        idx = order[start:stop]
+        counts = _concordance_counts(durations[idx], events[idx], risk_scores[idx])
+        
+        r = counts['risk']
+        for run in runs:
+            below = np.searchsorted(run, r, side='left')
+            counts['concordant'] += below
+            counts['tied'] += np.searchsorted(run, r, side='right') - below
+        counts['comparable'] += n_later
+        yield counts
+        
+        runs.append(np.sort(r))
+        while len(runs) > 1 and len(runs[-2]) <= len(runs[-1]):
+            merged = np.concatenate((runs.pop(), runs.pop()))
+            merged.sort()
+            runs.append(merged)
+        n_later += len(idx)
+        stop = start
+
+def harrell_c_index(durations, events, risk_scores, chunk_size=METRIC_CHUNK_SIZE):
+    """
+    Harrell's concordance index in O(n log n).
+    Pairs tied in risk score count as half concordant; pairs tied in time
+    with both events are not comparable.
+    
+    Args:
+        durations: Observed times
+        events: Event indicators (1=event, 0=censored)
+        risk_scores: Predicted risk scores (higher means shorter survival)
+        chunk_size: Number of patients whose pair counts are accumulated at once
+        
+    Returns:
+        Dictionary with the C-index and the pair counts
+    """
+    concordant = tied = comparable = 0
+    for counts in _chunked_concordance_counts(durations, events, risk_scores, chunk_size):
+        e = counts['event']
+        concordant += int(counts['concordant'][e].sum())
+        tied += int(counts['tied'][e].sum())
+        comparable += int(counts['comparable'][e].sum())
+    
+    return {
+        'c_index': (concordant + 0.5 * tied) / comparable if comparable else float('nan'),
+        'concordant': concordant,
+        'discordant': comparable - concordant - tied,
+        'tied_risk': tied,
+        'comparable': comparable
+    }
 
 def calculate_c_index(y_true, y_pred):
     """
@@ -14,7 +196,154 @@ def calculate_c_index(y_true, y_pred):
     Returns:
         C-index value
     """
-    return concordance_index(y_true['time'], -y_pred, y_true['event'])
+    return harrell_c_index(y_true['time'], y_true['event'], y_pred)['c_index']
+
+def calculate_uno_c_index(y_true, y_pred, y_censoring=None, tau=None, chunk_size=METRIC_CHUNK_SIZE):
+    """
+    Uno's inverse-probability-of-censoring-weighted concordance index.
+    Comparable pairs are weighted by 1 / G(T_i)^2 so that the estimate does
+    not depend on the censoring distribution. G comes from censoring_survival,
+    which lets events precede censoring at tied times, so the result matches
+    scikit-survival's concordance_index_ipcw on tied data too.
+    
+    Args:
+        y_true: Structured array with 'event' and 'time' fields
+        y_pred: Predicted risk scores
+        y_censoring: Optional structured array the censoring distribution is
+                     estimated from (e.g. the training set); defaults to y_true
+        tau: Truncation time; only events before tau are used
+        chunk_size: Number of patients whose pair counts are accumulated at once
+        
+    Returns:
+        C-index value
+    """
+    reference = y_true if y_censoring is None else y_censoring
+    cens_times, cens_survival = censoring_survival(reference['time'], reference['event'])
+    
+    numerator = denominator = 0.0
+    for counts in _chunked_concordance_counts(y_true['time'], y_true['event'], y_pred, chunk_size):
+        t, e = counts['time'], counts['event']
+        g = _step_values(cens_times, cens_survival, t)
+        mask = e & (g > 0)
+        if tau is not None:
+            mask &= t < tau
+        
+        weights = 1 / g[mask] ** 2
+        numerator += (weights * (counts['concordant'][mask] + 0.5 * counts['tied'][mask])).sum()
+        denominator += (weights * counts['comparable'][mask]).sum()
+    return float(numerator / denominator) if denominator else float('nan')
+
+def calculate_cumulative_dynamic_auc(y_true, y_pred, times, y_censoring=None, chunk_size=None):
+    """
+    Cumulative/dynamic AUC at several horizons: how well the risk score
+    separates patients with an event by time t (cases, weighted by 1 / G(T_i))
+    from patients still event-free after t (controls). G uses the same tie
+    convention as censoring_survival, matching scikit-survival's
+    cumulative_dynamic_auc.
+    
+    Args:
+        y_true: Structured array with 'event' and 'time' fields
+        y_pred: Risk scores, shape (n_patients,) or (n_patients, n_times) for
+                time-dependent scores
+        times: Horizons at which to evaluate
+        y_censoring: Optional structured array the censoring distribution is
+                     estimated from; defaults to y_true
+        chunk_size: Number of cases compared against the controls at once,
+                    bounding the size of temporary arrays
+                    
+    Returns:
+        Dictionary with the horizons, the AUC at each horizon and the mean AUC
+        weighted by the Kaplan-Meier event distribution
+    """
+    chunk_size = chunk_size or METRIC_CHUNK_SIZE
+    durations = np.asarray(y_true['time'], dtype=float)
+    events = np.asarray(y_true['event'], dtype=bool)
+    t = np.asarray(times, dtype=float)
+    
+    reference = y_true if y_censoring is None else y_censoring
+    cens_times, cens_survival = censoring_survival(reference['time'], reference['event'])
+    g = _step_values(cens_times, cens_survival, durations)
+    with np.errstate(divide='ignore'):
+        case_weights = np.where(events & (g > 0), 1 / np.where(g > 0, g, 1.0), 0.0)
+    
+    scores = np.empty(len(t))
+    for k, horizon in enumerate(t):
+        risk = np.asarray(y_pred[:, k] if np.ndim(y_pred) == 2 else y_pred, dtype=float)
+        controls = np.sort(risk[durations > horizon])
+        cases = np.flatnonzero(events & (durations <= horizon))
+        
+        # Mann-Whitney count of controls below each case, ties counting half
+        wins = 0.0
+        for start in range(0, len(cases), chunk_size):
+            idx = cases[start:start + chunk_size]
+            below = np.searchsorted(controls, risk[idx], side='left')
+            equal = np.searchsorted(controls, risk[idx], side='right') - below
+            wins += (case_weights[idx] * (below + 0.5 * equal)).sum()
+        
+        total = case_weights[cases].sum() * len(controls)
+        scores[k] = wins / total if total > 0 else np.nan
+    
+    if len(t) == 1:
+        mean_auc = scores[0]
+    else:
+        # Weight every horizon by the drop of the Kaplan-Meier curve up to it
+        km = GroupedKaplanMeier().fit(durations, events)
+        survival = _step_values(km.times_, km.survival_, t)
+        mean_auc = (scores * -np.diff(np.r_[1.0, survival])).sum() / (1.0 - survival[-1])
+    
+    return {
+        'times': t.tolist(),
+        'auc': scores.tolist(),
+        'mean_auc': float(mean_auc)
+    }
+
+def _survival_matrix(survival_probs, times):
+    """
+    Stack predicted survival probabilities into an (n_patients, n_times) matrix.
+    Accepts a matrix already, or per-patient dictionaries keyed by time
+    (missing times count as 0, as before).
+    """
+    if isinstance(survival_probs, np.ndarray):
+        return survival_probs
+    return np.array([[sp.get(t, 0) for t in times] for sp in survival_probs], dtype=float)
+
+def _step_values(step_times, step_values, query):
+    """
+    Evaluate a right-continuous step function that starts at 1.
+    
+    Args:
+        step_times: Sorted jump times
+        step_values: Function value from each jump time on
+        query: Times at which to evaluate
+        
+    Returns:
+        Function values at the query times
+    """
+    pos = np.searchsorted(step_times, query, side='right') - 1
+    return np.where(pos >= 0, step_values[np.maximum(pos, 0)], 1.0)
+
+def censoring_survival(durations, events):
+    """
+    Kaplan-Meier estimate of the censoring distribution G(t) = P(C > t).
+    At tied times, events are taken to happen before censoring, so patients
+    with an event leave the censoring risk set at their own time (as in
+    scikit-survival's kaplan_meier_estimator with reverse=True).
+    
+    Args:
+        durations: Observed times
+        events: Event indicators (1=event, 0=censored)
+        
+    Returns:
+        Tuple (distinct observed times, G at each of them)
+    """
+    times, inverse = np.unique(np.asarray(durations, dtype=float), return_inverse=True)
+    n_events = np.bincount(inverse, weights=np.asarray(events, dtype=float), minlength=len(times))
+    n_total = np.bincount(inverse, minlength=len(times))
+    at_risk = n_total[::-1].cumsum()[::-1] - n_events
+    n_censored = n_total - n_events
+    
+    ratio = np.divide(n_censored, at_risk, out=np.zeros(len(times)), where=at_risk > 0)
+    return times, np.cumprod(1 - ratio)
 
 def calculate_brier_score(y_true, survival_probs, times):
     """
@@ -22,28 +351,336 @@ def calculate_brier_score(y_true, survival_probs, times):
     
     Args:
         y_true: Structured array with 'event' and 'time' fields
-        survival_probs: Predicted survival probabilities at each time point
+        survival_probs: Predicted survival probabilities at each time point,
+                        as an (n_patients, n_times) matrix or per-patient
+                        dictionaries keyed by time
         times: Time points at which to evaluate
         
     Returns:
         Dictionary with Brier scores at each time point
     """
-    brier_scores = {}
+    matrix = _survival_matrix(survival_probs, times)
+    t = np.asarray(times, dtype=float)
+    
+    # Binary outcome: 1 if the event occurred by time t, 0 otherwise
+    y_binary = (np.asarray(y_true['event'], dtype=bool)[:, np.newaxis]
+                & (np.asarray(y_true['time'], dtype=float)[:, np.newaxis] <= t[np.newaxis, :]))
+    
+    scores = ((y_binary - (1 - matrix)) ** 2).mean(axis=0)
+    return {time: float(score) for time, score in zip(times, scores)}
+
+def calculate_ipcw_brier_scores(y_true, survival_matrix, times, y_censoring=None, chunk_size=METRIC_CHUNK_SIZE):
+    """
+    Inverse-probability-of-censoring-weighted Brier score at every time point.
+    Patients with an event by time t contribute S(t)^2 / G(T), patients still
+    at risk contribute (1 - S(t))^2 / G(t), and patients censored before t
+    contribute nothing but are represented through the weights. Censoring
+    tied with an event at T happens after it, so G(T) is the probability of
+    remaining uncensored through the event time.
+    
+    Args:
+        y_true: Structured array with 'event' and 'time' fields
+        survival_matrix: Predicted survival probabilities, shape
+                         (n_patients, n_times); may be a memory-mapped array
+        times: Time points at which to evaluate, shape (n_times,)
+        y_censoring: Optional structured array the censoring distribution is
+                     estimated from (e.g. the training set); defaults to y_true
+        chunk_size: Number of patients processed at once, bounding the size of
+                    temporary arrays
+                    
+    Returns:
+        Array of Brier scores, one per time point
+    """
+    durations = np.asarray(y_true['time'], dtype=float)
+    events = np.asarray(y_true['event'], dtype=bool)
+    t = np.asarray(times, dtype=float)
+    if survival_matrix.shape != (len(durations), len(t)):
+        raise ValueError(f"survival_matrix must have shape {(len(durations), len(t))}, got {survival_matrix.shape}")
+    
+    reference = y_true if y_censoring is None else y_censoring
+    cens_times, cens_survival = censoring_survival(reference['time'], reference['event'])
+    
+    # Weights; G = 0 (no follow-up left) gives no usable weight and contributes 0
+    with np.errstate(divide='ignore'):
+        g_t = _step_values(cens_times, cens_survival, t)
+        inv_g_t = np.where(g_t > 0, 1 / g_t, 0.0)
+        g_event = _step_values(cens_times, cens_survival, durations)
+        inv_g_event = np.where(events & (g_event > 0), 1 / np.where(g_event > 0, g_event, 1.0), 0.0)
+    
+    totals = np.zeros(len(t))
+    for start in range(0, len(durations), chunk_size):
+        stop = min(start + chunk_size, len(durations))
+        s = np.asarray(survival_matrix[start:stop], dtype=float)
+        d = durations[start:stop, np.newaxis]
+        
+        had_event = (d <= t) * inv_g_event[start:stop, np.newaxis]
+        at_risk = d > t
+        totals += (s ** 2 * had_event).sum(axis=0) + ((1 - s) ** 2 * at_risk).sum(axis=0) * inv_g_t
+    
+    return totals / len(durations)
+
+def calculate_integrated_brier_score(y_true, survival_matrix, times, y_censoring=None, chunk_size=METRIC_CHUNK_SIZE):
+    """
+    IPCW Brier scores over a time grid and their integral (trapezoidal rule,
+    normalized by the length of the grid).
+    
+    Args:
+        y_true: Structured array with 'event' and 'time' fields
+        survival_matrix: Predicted survival probabilities, shape (n_patients, n_times)
+        times: Sorted time points of the grid, shape (n_times,)
+        y_censoring: Optional structured array the censoring distribution is
+                     estimated from; defaults to y_true
+        chunk_size: Number of patients processed at once
+        
+    Returns:
+        Dictionary with the time grid, the Brier score at each time and the
+        integrated Brier score
+    """
+    t = np.asarray(times, dtype=float)
+    if len(t) < 2:
+        raise ValueError("The integrated Brier score needs at least two time points")
+    
+    scores = calculate_ipcw_brier_scores(y_true, survival_matrix, t, y_censoring, chunk_size)
+    integral = float(np.sum((scores[1:] + scores[:-1]) / 2 * np.diff(t)) / (t[-1] - t[0]))
+    
+    return {
+        'times': t.tolist(),
+        'brier_scores': scores.tolist(),
+        'integrated_brier_score': integral
+    }
+
+# Permutations computed per task by the parallel permutation test
+PERMUTATION_CHUNK = 64
+
+class LogRankEngine:
+    """
+    Log-rank tests over one cohort.
+    Patients are sorted by (stratum, time) once; every test afterwards, for
+    any grouping, trend scores or permuted labels, is a few bincounts and
+    cumulative sums over that order.
+    """
     
-    for t in times:
-        # Create binary outcome: 1 if event occurred before time t, 0 otherwise
-        y_binary = np.zeros(len(y_true))
-        for i, (event, time) in enumerate(zip(y_true['event'], y_true['time'])):
-            if event and time <= t:
-                y_binary[i] = 1
+    def __init__(self, durations, events, strata=None):
+        """
+        Sort the cohort and collapse it to unique (stratum, time) rows.
+        
+        Args:
+            durations: Observed times
+            events: Event indicators (1=event, 0=censored)
+            strata: Optional stratum label of every patient
+        """
+        durations = np.asarray(durations, dtype=float)
+        events = np.asarray(events).astype(bool)
+        if strata is None:
+            stratum_idx = np.zeros(len(durations), dtype=np.int64)
+        else:
+            _, stratum_idx = np.unique(np.asarray(strata), return_inverse=True)
+            stratum_idx = stratum_idx.reshape(-1)
         
-        # Get survival probability at time t
-        s_t = np.array([sp[t] if t in sp else 0 for sp in survival_probs])
+        self.order = np.lexsort((durations, stratum_idx))
+        t, s = durations[self.order], stratum_idx[self.order]
+        self.events = events[self.order]
+        self.stratum = s
         
-        # Calculate Brier score
-        brier_scores[t] = brier_score_loss(y_binary, 1 - s_t)
+        # Row of every sorted patient in the collapsed (stratum, time) table
+        is_new = np.r_[True, (s[1:] != s[:-1]) | (t[1:] != t[:-1])] if len(t) else np.zeros(0, dtype=bool)
+        self.row = np.cumsum(is_new) - 1
+        self.n_rows = int(is_new.sum())
+        row_stratum = s[is_new]
+        # Last row of every row's stratum, for the per-stratum at-risk sums
+        self.stratum_last_row = np.searchsorted(row_stratum, row_stratum, side='right') - 1
+    
+    def _group_codes(self, groups):
+        """Dense codes of the group labels in sorted patient order, and the labels"""
+        labels, codes = np.unique(np.asarray(groups), return_inverse=True)
+        return codes.reshape(-1)[self.order], labels
     
-    return brier_scores
+    def components(self, codes, n_groups):
+        """
+        Observed minus expected events and their covariance matrix.
+        
+        Args:
+            codes: Group code of every patient, in sorted order
+            n_groups: Number of groups
+            
+        Returns:
+            Tuple (observed, expected, covariance) summed over strata
+        """
+        key = self.row * n_groups + codes
+        size = self.n_rows * n_groups
+        deaths = np.bincount(key, weights=self.events, minlength=size).reshape(self.n_rows, n_groups)
+        counts = np.bincount(key, minlength=size).reshape(self.n_rows, n_groups).astype(float)
+        
+        # At risk: patients of the stratum from this time on
+        cumulative = np.cumsum(counts, axis=0)
+        at_risk = cumulative[self.stratum_last_row] - (cumulative - counts)
+        
+        d = deaths.sum(axis=1)
+        n = at_risk.sum(axis=1)
+        used = d > 0
+        d, n, deaths, at_risk = d[used], n[used], deaths[used], at_risk[used]
+        
+        share = at_risk / n[:, np.newaxis]
+        expected = (share * d[:, np.newaxis]).sum(axis=0)
+        observed = deaths.sum(axis=0)
+        
+        # Hypergeometric variance; a single patient at risk carries none
+        with np.errstate(divide='ignore', invalid='ignore'):
+            w = np.where(n > 1, d * (n - d) / (n - 1), 0.0)
+        weighted = share * np.sqrt(w)[:, np.newaxis]
+        covariance = np.diag((share * w[:, np.newaxis]).sum(axis=0)) - weighted.T @ weighted
+        
+        return observed, expected, covariance
+    
+    @staticmethod
+    def _statistic(observed, expected, covariance, trend_scores=None):
+        """Chi-square statistic and its degrees of freedom"""
+        z = observed - expected
+        if trend_scores is not None:
+            c = np.asarray(trend_scores, dtype=float)
+            variance = c @ covariance @ c
+            return float((c @ z) ** 2 / variance) if variance > 0 else 0.0, 1
+        
+        # Any k - 1 groups carry all the information
+        k = len(z) - 1
+        statistic = z[:k] @ np.linalg.pinv(covariance[:k, :k]) @ z[:k]
+        return float(statistic), k
+    
+    def statistic(self, codes, n_groups, trend_scores=None):
+        """Test statistic for group codes in sorted patient order"""
+        return self._statistic(*self.components(codes, n_groups), trend_scores)[0]
+    
+    def permuted_codes(self, codes, rng):
+        """Shuffle group codes within every stratum"""
+        return codes[np.lexsort((rng.random(len(codes)), self.stratum))]
+    
+    def test(self, groups, trend_scores=None, permutations=0, n_jobs=1, random_state=0):
+        """
+        Log-rank test of equal survival across groups.
+        
+        Args:
+            groups: Group label of every patient (k >= 2 groups)
+            trend_scores: Optional score per group (in sorted label order) for
+                          a one-degree-of-freedom trend test; True uses
+                          0, 1, ..., k - 1
+            permutations: Number of label permutations (within strata) for an
+                          additional permutation p-value; 0 skips it
+            n_jobs: Worker processes for the permutations
+            random_state: Seed of the permutations
+            
+        Returns:
+            Dictionary with the test statistic, degrees of freedom, chi-square
+            p-value, per-group observed and expected events and, when
+            requested, the permutation p-value
+        """
+        codes, labels = self._group_codes(groups)
+        if len(labels) < 2:
+            raise ValueError("The log-rank test needs at least two groups")
+        if trend_scores is True:
+            trend_scores = np.arange(len(labels), dtype=float)
+        
+        observed, expected, covariance = self.components(codes, len(labels))
+        statistic, dof = self._statistic(observed, expected, covariance, trend_scores)
+        
+        result = {
+            'statistic': statistic,
+            'degrees_of_freedom': dof,
+            'p_value': float(chi2.sf(statistic, dof)),
+            'groups': labels.tolist(),
+            'observed': observed.tolist(),
+            'expected': expected.tolist()
+        }
+        
+        if permutations > 0:
+            null = permutation_statistics(self, codes, len(labels), permutations, trend_scores, n_jobs, random_state)
+            result['permutation_p_value'] = float((1 + np.sum(null >= statistic - 1e-12)) / (permutations + 1))
+            result['permutations'] = permutations
+        
+        return result
+    
+    def scan_cut_points(self, scores, cut_points):
+        """
+        Two-group log-rank statistics for risk tiers split at every candidate
+        cut-point (score > cut point is the high-risk tier).
+        
+        Args:
+            scores: Risk score of every patient
+            cut_points: Candidate thresholds
+            
+        Returns:
+            List of dictionaries with the cut-point, statistic and p-value
+        """
+        sorted_scores = np.asarray(scores, dtype=float)[self.order]
+        results = []
+        for cut in cut_points:
+            codes = (sorted_scores > cut).astype(np.int64)
+            if codes.min() == codes.max():
+                results.append({'cut_point': float(cut), 'statistic': 0.0, 'p_value': 1.0})
+                continue
+            statistic = self.statistic(codes, 2)
+            results.append({'cut_point': float(cut), 'statistic': statistic, 'p_value': float(chi2.sf(statistic, 1))})
+        return results
+
+def _permutation_chunk(engine, codes, n_groups, n_permutations, trend_scores, seed):
+    """Test statistics under n_permutations random relabelings (runs in a worker process)"""
+    rng = np.random.default_rng(seed)
+    return np.array([
+        engine.statistic(engine.permuted_codes(codes, rng), n_groups, trend_scores)
+        for _ in range(n_permutations)
+    ])
+
+def permutation_statistics(engine, codes, n_groups, permutations, trend_scores=None, n_jobs=1, random_state=0):
+    """
+    Null distribution of the log-rank statistic by permuting group labels
+    within strata. Permutations are split into fixed, independently seeded
+    chunks, so the result does not depend on the number of workers.
+    
+    Args:
+        engine: LogRankEngine of the cohort
+        codes: Group codes in the engine's sorted order
+        n_groups: Number of groups
+        permutations: Number of permutations
+        trend_scores: Optional trend scores per group
+        n_jobs: Worker processes; 1 runs in the calling process
+        random_state: Seed of the permutations
+        
+    Returns:
+        Array of permuted test statistics
+    """
+    sizes = [min(PERMUTATION_CHUNK, permutations - start) for start in range(0, permutations, PERMUTATION_CHUNK)]
+    seeds = np.random.SeedSequence(random_state).spawn(len(sizes))
+    
+    if n_jobs == 1 or len(sizes) == 1:
+        chunks = [_permutation_chunk(engine, codes, n_groups, size, trend_scores, seed) for size, seed in zip(sizes, seeds)]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = [
+                executor.submit(_permutation_chunk, engine, codes, n_groups, size, trend_scores, seed)
+                for size, seed in zip(sizes, seeds)
+            ]
+            chunks = [future.result() for future in futures]
+    
+    return np.concatenate(chunks)
+
+def log_rank_test(durations, events, groups, strata=None, trend_scores=None, permutations=0, n_jobs=1, random_state=0):
+    """
+    k-group, stratified or trend log-rank test.
+    
+    Args:
+        durations: Observed times
+        events: Event indicators (1=event, 0=censored)
+        groups: Group label of every patient
+        strata: Optional stratum label of every patient
+        trend_scores: Optional score per group for a trend test (True for 0..k-1)
+        permutations: Number of permutations for a permutation p-value
+        n_jobs: Worker processes for the permutations
+        random_state: Seed of the permutations
+        
+    Returns:
+        Dictionary with the test results (see LogRankEngine.test)
+    """
+    engine = LogRankEngine(durations, events, strata)
+    return engine.test(groups, trend_scores, permutations, n_jobs, random_state)
 
 def calculate_log_rank(groups, times, events):
     """
@@ -57,25 +694,9 @@ def calculate_log_rank(groups, times, events):
     Returns:
         Dictionary with test statistic and p-value
     """
-    # Split data by groups
-    unique_groups = np.unique(groups)
-    group_times = {g: [] for g in unique_groups}
-    group_events = {g: [] for g in unique_groups}
-    
-    for g, t, e in zip(groups, times, events):
-        group_times[g].append(t)
-        group_events[g].append(e)
-    
-    # Convert to arrays
-    times1 = np.array(group_times[unique_groups[0]])
-    times2 = np.array(group_times[unique_groups[1]])
-    events1 = np.array(group_events[unique_groups[0]])
-    events2 = np.array(group_events[unique_groups[1]])
-    
-    # Perform log-rank test
-    result = logrank_test(times1, times2, events1, events2)
+    result = log_rank_test(times, events, groups)
     
     return {
-        'statistic': result.test_statistic,
-        'p_value': result.p_value
+        'statistic': result['statistic'],
+        'p_value': result['p_value']
     }
@@ -0,0 +1,67 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+def create_executor(max_workers):
+    """
+    Create the bounded thread pool used to run model predictions concurrently.
+
+    Args:
+        max_workers: Maximum number of concurrent tasks; 0 disables concurrency
+
+    Returns:
+        ThreadPoolExecutor, or None to run tasks sequentially
+    """
+    if max_workers <= 0:
+        return None
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='model')
+
+def run_model_tasks(tasks, executor=None, timeout=None):
+    """
+    Run independent model tasks and collect their outcomes.
+    A task that raises or does not finish within the timeout is reported as
+    degraded instead of failing the whole request.
+
+    Args:
+        tasks: Dictionary mapping task names to callables without arguments
+        executor: Executor to run the tasks on; tasks run sequentially when None
+        timeout: Seconds each task may take, counted from submission
+                 (only enforced when an executor is used)
+
+    Returns:
+        Dictionary mapping task names to {'status': 'ok', 'result': ..., 'seconds': ...}
+        or {'status': 'degraded', 'error': ...}
+    """
+    outcomes = {}
+
+    if executor is None:
+        for name, task in tasks.items():
+            try:
+                result, seconds = _timed(task)
+                outcomes[name] = {'status': 'ok', 'result': result, 'seconds': seconds}
+            except Exception as e:
+                outcomes[name] = {'status': 'degraded', 'error': str(e)}
+        return outcomes
+
+    start = time.perf_counter()
+    futures = {name: executor.submit(_timed, task) for name, task in tasks.items()}
+
+    for name, future in futures.items():
+        remaining = None if timeout is None else max(0.0, timeout - (time.perf_counter() - start))
+        try:
+            result, seconds = future.result(timeout=remaining)
+            outcomes[name] = {'status': 'ok', 'result': result, 'seconds': seconds}
+        except FutureTimeoutError:
+            # The worker thread cannot be interrupted; it finishes in the
+            # background and its result is discarded
+            future.cancel()
+            outcomes[name] = {'status': 'degraded', 'error': f"Timed out after {timeout:g}s"}
+        except Exception as e:
+            outcomes[name] = {'status': 'degraded', 'error': str(e)}
+
+    return outcomes
+
+def _timed(task):
+    """Run a task and return its result with the elapsed seconds"""
+    start = time.perf_counter()
+    result = task()
+    return result, time.perf_counter() - start
@@ -0,0 +1,259 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from models.artifacts import is_published_name
+
+def feature_vector_key(processed_data):
+    """
+    Canonical hash of a preprocessed feature vector.
+    Column names and float64 values are hashed, with -0.0 and NaN
+    normalized so that equal inputs always produce the same key.
+
+    Args:
+        processed_data: Preprocessed DataFrame or array
+
+    Returns:
+        Hex digest string
+    """
+    digest = hashlib.sha256()
+    if hasattr(processed_data, 'columns'):
+        digest.update('\x1f'.join(map(str, processed_data.columns)).encode('utf-8'))
+        values = processed_data.to_numpy()
+    else:
+        values = np.asarray(processed_data)
+
+    try:
+        values = np.ascontiguousarray(values, dtype=np.float64) + 0.0
+        values[np.isnan(values)] = np.nan
+        digest.update(str(values.shape).encode('utf-8'))
+        digest.update(values.tobytes())
+    except (TypeError, ValueError):
+        # Non-numeric leftovers: fall back to their text representation
+        digest.update(repr(values.tolist()).encode('utf-8'))
+
+    return digest.hexdigest()
+
+class ArtifactFingerprint:
+    """
+    Content hash of the model artifacts in a directory.
+    Only published names count: staging files of a running training job and
+    artifact version directories are skipped, and an artifact link is keyed
+    on its target, whose name holds the version's content hash.
+    File contents are only rehashed when a file's size or modification time
+    changes, and the directory is stat-ed at most once per check interval.
+    """
+
+    def __init__(self, directory, check_interval=2.0):
+        """
+        Initialize the fingerprint.
+
+        Args:
+            directory: Directory with the model artifacts
+            check_interval: Minimum seconds between directory scans
+        """
+        self.directory = directory
+        self.check_interval = check_interval
+        self._signature = None
+        self._fingerprint = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def _stat_signature(self):
+        """Names, link targets, sizes and modification times of the published artifacts"""
+        signature = []
+        for root, dirs, files in os.walk(self.directory):
+            dirs[:] = [name for name in dirs if is_published_name(name)]
+            for name in dirs + files:
+                if not is_published_name(name):
+                    continue
+                path = os.path.join(root, name)
+                target = os.readlink(path) if os.path.islink(path) else None
+                if target is None and name in dirs:
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if os.path.isdir(path):
+                    # A linked artifact version is identified by its target alone
+                    signature.append((os.path.relpath(path, self.directory), target, 0, 0))
+                else:
+                    signature.append((os.path.relpath(path, self.directory), target, stat.st_size, stat.st_mtime_ns))
+        return tuple(sorted(signature))
+
+    def _content_hash(self, signature):
+        """SHA-256 over the link targets and file contents of the published artifacts"""
+        digest = hashlib.sha256()
+        for relpath, target, _, _ in signature:
+            digest.update(relpath.encode('utf-8'))
+            if target is not None:
+                digest.update(b'\0' + target.encode('utf-8'))
+            if os.path.isdir(os.path.join(self.directory, relpath)):
+                continue
+            try:
+                with open(os.path.join(self.directory, relpath), 'rb') as f:
+                    for block in iter(lambda: f.read(1 << 20), b''):
+                        digest.update(block)
+            except OSError:
+                continue
+        return digest.hexdigest()
+
+    def current(self):
+        """
+        Return the current fingerprint of the artifact directory.
+
+        Returns:
+            Hex digest string
+        """
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return self._fingerprint
+
+        with self._lock:
+            if self._checked_at is None or now - self._checked_at >= self.check_interval:
+                signature = self._stat_signature()
+                if signature != self._signature:
+                    self._fingerprint = self._content_hash(signature)
+                    self._signature = signature
+                self._checked_at = now
+
+        return self._fingerprint
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache with per-entry TTL for model-layer results.
+    Entries are keyed on the preprocessed feature vector and the whole cache
+    is invalidated when the model artifacts change.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, fingerprint=None):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of cached results; 0 disables caching
+            ttl_seconds: Seconds after which an entry expires
+            fingerprint: Optional ArtifactFingerprint used for invalidation
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.fingerprint = fingerprint
+        self._entries = OrderedDict()
+        self._artifact_version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        """Whether the cache stores anything at all"""
+        return self.max_entries > 0
+
+    def make_key(self, processed_data):
+        """
+        Build the cache key for a preprocessed feature vector.
+
+        Args:
+            processed_data: Preprocessed DataFrame or array
+
+        Returns:
+            Cache key string
+        """
+        version = self._check_artifacts()
+        return f"{version}:{feature_vector_key(processed_data)}"
+
+    def _check_artifacts(self):
+        """Clear the cache if the model artifacts changed, return their version"""
+        if self.fingerprint is None:
+            return ''
+        version = self.fingerprint.current()
+        if version != self._artifact_version:
+            with self._lock:
+                if version != self._artifact_version:
+                    if self._artifact_version is not None:
+                        self.invalidations += 1
+                    self._entries.clear()
+                    self._artifact_version = version
+        return version
+
+    def get(self, key):
+        """
+        Look up a cached result.
+
+        Args:
+            key: Cache key from make_key
+
+        Returns:
+            Cached value, or None on a miss
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Store a result, evicting the least recently used entries if full.
+
+        Args:
+            key: Cache key from make_key
+            value: Result to cache (treated as read-only afterwards)
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Return cache statistics.
+
+        Returns:
+            Dictionary with size, limits and hit/miss/eviction counters
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'size': len(self._entries),
+                'maxEntries': self.max_entries,
+                'ttlSeconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'artifactVersion': self._artifact_version
+            }
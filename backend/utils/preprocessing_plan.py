@@ -0,0 +1,226 @@
+import math
+import numpy as np
+import pandas as pd
+from utils.data_preprocessing import CATEGORY_MAPS
+
+def _to_float(value):
+    """Convert a raw field to float, 0 for missing or non-numeric values"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if math.isnan(value) else value
+
+def encode_values(column, values):
+    """
+    Encode the raw values of one input column as floats.
+    Columns with a category map are mapped (unknown values get the map's
+    default), all others are converted to numbers with 0 for missing values.
+
+    Args:
+        column: Input column name
+        values: Sequence of raw values
+
+    Returns:
+        Float array with one entry per value
+    """
+    if column in CATEGORY_MAPS:
+        mapping, default = CATEGORY_MAPS[column]
+        return np.fromiter((mapping.get(v, default) if isinstance(v, str) else default for v in values),
+                           dtype=float, count=len(values))
+
+    if isinstance(values, np.ndarray) and values.dtype.kind in 'biuf':
+        return np.nan_to_num(values.astype(float), nan=0.0)
+    return np.fromiter(map(_to_float, values), dtype=float, count=len(values))
+
+class PreprocessingPlan:
+    """
+    Preprocessing compiled from a fitted preprocessor.
+    The plan reads the input fields in a fixed order and writes the encoded,
+    scaled and one-hot expanded features straight into a preallocated float
+    array, without building intermediate DataFrames.
+    """
+
+    def __init__(self, input_columns, columns, steps):
+        """
+        Initialize the plan.
+
+        Args:
+            input_columns: Input field names read from each record
+            columns: Output feature names, in output order
+            steps: List of (kind, input index, output offset, params) tuples, where
+                   kind is 'scale' (params: shift, scale), 'copy' or 'onehot'
+                   (params: category -> output position, raise on unknown)
+        """
+        self.input_columns = list(input_columns)
+        self.columns = list(columns)
+        self.steps = steps
+
+    @classmethod
+    def compile(cls, preprocessor):
+        """
+        Compile a plan from a fitted preprocessor.
+        Supported are a StandardScaler fitted on named columns and a
+        ColumnTransformer of StandardScaler, OneHotEncoder, passthrough and
+        drop steps.
+
+        Args:
+            preprocessor: Fitted sklearn preprocessor
+
+        Returns:
+            PreprocessingPlan, or None if the preprocessor is missing, unfitted
+            or not supported (callers then fall back to preprocess_input)
+        """
+        if preprocessor is None:
+            return None
+        try:
+            if type(preprocessor).__name__ == 'ColumnTransformer':
+                return cls._from_column_transformer(preprocessor)
+            if type(preprocessor).__name__ == 'StandardScaler':
+                names = getattr(preprocessor, 'feature_names_in_', None)
+                if names is None or not hasattr(preprocessor, 'n_features_in_'):
+                    return None
+                input_columns = [str(c) for c in names]
+                steps = [('scale', i, i, cls._scaler_params(preprocessor, i)) for i in range(len(input_columns))]
+                return cls(input_columns, input_columns, steps)
+        except ValueError as e:
+            print(f"Could not compile preprocessing plan: {e}")
+        return None
+
+    @staticmethod
+    def _scaler_params(scaler, i):
+        """Shift and scale of feature i of a fitted StandardScaler"""
+        shift = scaler.mean_[i] if getattr(scaler, 'mean_', None) is not None and scaler.with_mean else 0.0
+        scale = scaler.scale_[i] if getattr(scaler, 'scale_', None) is not None and scaler.with_std else 1.0
+        return float(shift), float(scale)
+
+    @classmethod
+    def _from_column_transformer(cls, transformer):
+        """Compile a fitted ColumnTransformer"""
+        if not hasattr(transformer, 'transformers_'):
+            return None
+
+        names_in = getattr(transformer, 'feature_names_in_', None)
+        input_columns, columns, steps = [], [], []
+
+        def input_index(column):
+            if isinstance(column, (int, np.integer)):
+                if names_in is None:
+                    raise ValueError("positional columns require a preprocessor fitted on a DataFrame")
+                column = names_in[column]
+            column = str(column)
+            if column not in input_columns:
+                input_columns.append(column)
+            return input_columns.index(column)
+
+        for name, step, selected in transformer.transformers_:
+            if isinstance(selected, slice) or (isinstance(selected, np.ndarray) and selected.dtype == bool):
+                selected = list(np.arange(len(names_in))[selected]) if names_in is not None else None
+            if selected is None or isinstance(selected, str):
+                selected = [selected] if isinstance(selected, str) else []
+            selected = list(selected)
+            if step == 'drop' or not selected:
+                continue
+
+            kind = 'passthrough' if step == 'passthrough' else type(step).__name__
+            if kind == 'passthrough':
+                for column in selected:
+                    idx = input_index(column)
+                    steps.append(('copy', idx, len(columns), None))
+                    columns.append(f"{name}__{input_columns[idx]}")
+            elif kind == 'StandardScaler':
+                for i, column in enumerate(selected):
+                    idx = input_index(column)
+                    steps.append(('scale', idx, len(columns), cls._scaler_params(step, i)))
+                    columns.append(f"{name}__{input_columns[idx]}")
+            elif kind == 'OneHotEncoder':
+                if getattr(step, 'infrequent_categories_', None) and any(c is not None for c in step.infrequent_categories_):
+                    return None
+                drop_idx = getattr(step, 'drop_idx_', None)
+                raise_unknown = step.handle_unknown == 'error'
+                for i, column in enumerate(selected):
+                    idx = input_index(column)
+                    positions = {}
+                    for j, category in enumerate(step.categories_[i]):
+                        if drop_idx is not None and drop_idx[i] is not None and j == drop_idx[i]:
+                            continue
+                        positions[category.item() if isinstance(category, np.generic) else category] = len(columns)
+                        columns.append(f"{name}__{input_columns[idx]}_{category}")
+                    steps.append(('onehot', idx, None, (positions, raise_unknown)))
+            else:
+                return None
+
+        try:
+            # Prefer sklearn's own output names when it can provide them
+            names_out = [str(c) for c in transformer.get_feature_names_out()]
+            if len(names_out) == len(columns):
+                columns = names_out
+        except (AttributeError, ValueError):
+            pass
+
+        return cls(input_columns, columns, steps)
+
+    def _input_values(self, data):
+        """Raw values of every input column, plus the number of rows"""
+        if isinstance(data, dict):
+            return [[data.get(c)] for c in self.input_columns], 1
+        if isinstance(data, pd.DataFrame):
+            return [data[c].to_numpy() if c in data.columns else [None] * len(data) for c in self.input_columns], len(data)
+        records = list(data)
+        return [[r.get(c) for r in records] for c in self.input_columns], len(records)
+
+    def to_array(self, data, out=None):
+        """
+        Preprocess one or more patients into a float array.
+
+        Args:
+            data: Dictionary for one patient, or a DataFrame or list of
+                  dictionaries for a batch
+            out: Optional preallocated array of shape (n_rows, n_features)
+
+        Returns:
+            Float array of shape (n_rows, n_features), columns as in self.columns
+        """
+        raw, n_rows = self._input_values(data)
+        if out is None:
+            out = np.zeros((n_rows, len(self.columns)))
+        else:
+            out[:] = 0.0
+
+        encoded = {}
+        for kind, idx, offset, params in self.steps:
+            if kind == 'onehot':
+                positions, raise_unknown = params
+                for row, value in enumerate(raw[idx]):
+                    try:
+                        position = positions.get(value)
+                    except TypeError:
+                        position = None
+                    if position is not None:
+                        out[row, position] = 1.0
+                    elif raise_unknown:
+                        raise ValueError(f"Found unknown category {value!r} in column '{self.input_columns[idx]}'")
+                continue
+
+            if idx not in encoded:
+                encoded[idx] = encode_values(self.input_columns[idx], raw[idx])
+            if kind == 'scale':
+                shift, scale = params
+                out[:, offset] = (encoded[idx] - shift) / scale
+            else:
+                out[:, offset] = encoded[idx]
+
+        return out
+
+    def transform(self, data):
+        """
+        Preprocess one or more patients for model input.
+
+        Args:
+            data: Dictionary for one patient, or a DataFrame or list of
+                  dictionaries for a batch
+
+        Returns:
+            DataFrame view over the preprocessed float array
+        """
+        return pd.DataFrame(self.to_array(data), columns=self.columns, copy=False)
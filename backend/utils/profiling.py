@@ -0,0 +1,365 @@
+import os
+import io
+import json
+import time
+import uuid
+import pstats
+import cProfile
+import sysconfig
+import threading
+import tracemalloc
+import contextvars
+from urllib.parse import parse_qs
+from werkzeug.wsgi import ClosingIterator
+
+# Request header and query parameter that turn profiling on for one request.
+# Values: 1/true/yes/all (CPU and memory), cpu, memory
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = 'profile'
+PROFILE_MODES = {'1': ('cpu', 'memory'), 'true': ('cpu', 'memory'), 'yes': ('cpu', 'memory'),
+                 'all': ('cpu', 'memory'), 'cpu': ('cpu',), 'memory': ('memory',)}
+
+# Third-party packages reported separately in the breakdowns, by module prefix
+PACKAGE_GROUPS = (
+    ('sksurv', 'scikit-survival'), ('sklearn', 'scikit-learn'), ('pandas', 'pandas'), ('numpy', 'numpy'),
+    ('scipy', 'scipy'), ('tensorflow', 'tensorflow/keras'), ('keras', 'tensorflow/keras'), ('shap', 'shap'),
+    ('lifelines', 'lifelines'), ('flask', 'flask/werkzeug'), ('werkzeug', 'flask/werkzeug')
+)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STDLIB_DIR = sysconfig.get_paths()['stdlib']
+
+# Mode of the profile running in the current context, None when not profiling
+_active = contextvars.ContextVar('profile_mode', default=None)
+
+def profiling_active():
+    """Whether the current request is being profiled"""
+    return _active.get() is not None
+
+def package_of(filename, function=''):
+    """
+    Attribute a code location to a package.
+
+    Args:
+        filename: Source file of the function ('~' for built-ins)
+        function: Function name, used to attribute built-ins and C methods
+
+    Returns:
+        Package label, e.g. 'pandas', 'backend/models' or 'stdlib'
+    """
+    if filename == '~':
+        # e.g. "<method 'reduce' of 'numpy.ufunc' objects>"
+        for prefix, label in PACKAGE_GROUPS:
+            if prefix in function:
+                return label
+        return 'builtins'
+    if filename.startswith('<'):
+        # e.g. "<frozen importlib._bootstrap>"
+        return 'stdlib' if filename.startswith('<frozen') else 'other'
+
+    path = os.path.abspath(filename)
+    parts = path.replace('\\', '/').split('/')
+    for marker in ('site-packages', 'dist-packages'):
+        if marker in parts:
+            module = parts[parts.index(marker) + 1] if parts.index(marker) + 1 < len(parts) else ''
+            for prefix, label in PACKAGE_GROUPS:
+                if module == prefix or module.startswith(prefix + '_'):
+                    return label
+            return module.split('-')[0] or 'other'
+    if path.startswith(BACKEND_DIR + os.sep):
+        relative = os.path.relpath(path, BACKEND_DIR).split(os.sep)
+        return 'backend/' + (relative[0] if len(relative) > 1 else 'app')
+    if path.startswith(STDLIB_DIR):
+        return 'stdlib'
+    return 'other'
+
+def _location(filename, line, function=None):
+    """Readable code location, relative to the backend for its own modules"""
+    if filename == '~':
+        return function
+    if filename.startswith(BACKEND_DIR + os.sep):
+        filename = os.path.relpath(filename, BACKEND_DIR)
+    for marker in ('site-packages', 'dist-packages'):
+        if f"{os.sep}{marker}{os.sep}" in filename:
+            filename = filename.split(f"{os.sep}{marker}{os.sep}", 1)[1]
+    return f"{filename}:{line}({function})" if function else f"{filename}:{line}"
+
+def requested_mode(environ):
+    """
+    Profiling mode requested by a WSGI request.
+
+    Returns:
+        Tuple of 'cpu' and/or 'memory', or None if profiling was not requested
+    """
+    value = environ.get(PROFILE_HEADER)
+    if value is None:
+        values = parse_qs(environ.get('QUERY_STRING', '')).get(PROFILE_PARAM)
+        value = values[0] if values else None
+    if value is None:
+        return None
+    return PROFILE_MODES.get(value.strip().lower())
+
+class ProfileSession:
+    """
+    One profiled request: a deterministic cProfile of the request thread and
+    a tracemalloc allocation snapshot.
+    """
+
+    def __init__(self, mode, method, path, top_n=40):
+        """
+        Initialize the session.
+
+        Args:
+            mode: Tuple of 'cpu' and/or 'memory'
+            method: HTTP method
+            path: Request path
+            top_n: Number of functions and source lines reported
+        """
+        self.id = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.mode = mode
+        self.method = method
+        self.path = path
+        self.top_n = top_n
+        self.status = None
+        self._profiler = cProfile.Profile() if 'cpu' in mode else None
+        self._started_tracing = False
+        self._snapshot = None
+
+    def start(self):
+        """Start measuring"""
+        if 'memory' in self.mode:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            tracemalloc.reset_peak()
+            self._snapshot = tracemalloc.take_snapshot()
+        self._started_at = time.time()
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        if self._profiler is not None:
+            self._profiler.enable()
+
+    def stop(self):
+        """
+        Stop measuring and build the report.
+
+        Returns:
+            Report dictionary
+        """
+        if self._profiler is not None:
+            self._profiler.disable()
+        report = {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'status': self.status,
+            'mode': list(self.mode),
+            'startedAt': self._started_at,
+            'wallSeconds': time.perf_counter() - self._wall,
+            'cpuSeconds': time.thread_time() - self._cpu
+        }
+        if self._profiler is not None:
+            report['cpu'] = self._cpu_report()
+        if 'memory' in self.mode:
+            report['memory'] = self._memory_report()
+        return report
+
+    def _cpu_report(self):
+        """Slowest functions by cumulative time and self time per package"""
+        stats = pstats.Stats(self._profiler, stream=io.StringIO())
+        functions = []
+        packages = {}
+        for (filename, line, name), (primitive, calls, total, cumulative, _) in stats.stats.items():
+            package = package_of(filename, name)
+            entry = packages.setdefault(package, {'package': package, 'selfSeconds': 0.0, 'calls': 0})
+            entry['selfSeconds'] += total
+            entry['calls'] += calls
+            functions.append({
+                'function': _location(filename, line, name),
+                'package': package,
+                'calls': calls,
+                'primitiveCalls': primitive,
+                'selfSeconds': total,
+                'cumulativeSeconds': cumulative
+            })
+        functions.sort(key=lambda f: f['cumulativeSeconds'], reverse=True)
+        return {
+            'totalCalls': stats.total_calls,
+            'profiledSeconds': stats.total_tt,
+            'packages': sorted(packages.values(), key=lambda p: p['selfSeconds'], reverse=True),
+            'functions': functions[:self.top_n]
+        }
+
+    def _memory_report(self):
+        """Peak traced memory and the allocations made during the request, per package and per line"""
+        _, peak = tracemalloc.get_traced_memory()
+        ignored = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        snapshot = tracemalloc.take_snapshot().filter_traces(ignored)
+        before = self._snapshot.filter_traces(ignored)
+        if self._started_tracing:
+            tracemalloc.stop()
+
+        packages = {}
+        for stat in snapshot.compare_to(before, 'filename'):
+            package = package_of(stat.traceback[0].filename)
+            entry = packages.setdefault(package, {'package': package, 'allocatedMb': 0.0, 'blocks': 0})
+            entry['allocatedMb'] += stat.size_diff / 2 ** 20
+            entry['blocks'] += stat.count_diff
+
+        lines = [
+            {
+                'line': _location(stat.traceback[0].filename, stat.traceback[0].lineno),
+                'package': package_of(stat.traceback[0].filename),
+                'allocatedMb': stat.size_diff / 2 ** 20,
+                'blocks': stat.count_diff
+            }
+            for stat in snapshot.compare_to(before, 'lineno')[:self.top_n]
+        ]
+        return {
+            # Traced memory is only what Python allocators saw since tracing started
+            'peakMb': peak / 2 ** 20,
+            'packages': sorted(packages.values(), key=lambda p: abs(p['allocatedMb']), reverse=True),
+            'lines': lines
+        }
+
+class ProfileStore:
+    """
+    Directory of profile reports: <id>.json with the breakdowns and <id>.prof
+    with the raw pstats data (for snakeviz, pstats or gprof2dot).
+    """
+
+    def __init__(self, directory, keep=50):
+        """
+        Initialize the store.
+
+        Args:
+            directory: Directory for the reports, created on first use
+            keep: Number of most recent profiles kept
+        """
+        self.directory = directory
+        self.keep = keep
+
+    def _path(self, profile_id, suffix):
+        """Path of a profile file; ids never contain path separators"""
+        if not profile_id or os.path.basename(profile_id) != profile_id:
+            raise KeyError(profile_id)
+        return os.path.join(self.directory, profile_id + suffix)
+
+    def save(self, report, profiler=None):
+        """Write a report (and the raw profile) and prune old reports"""
+        os.makedirs(self.directory, exist_ok=True)
+        if profiler is not None:
+            profiler.dump_stats(self._path(report['id'], '.prof'))
+        staging = self._path(report['id'], '.json.tmp')
+        with open(staging, 'w') as f:
+            json.dump(report, f, indent=2)
+        os.replace(staging, self._path(report['id'], '.json'))
+
+        reports = sorted(name for name in os.listdir(self.directory) if name.endswith('.json'))
+        for name in reports[:-self.keep] if self.keep > 0 else []:
+            for suffix in ('.json', '.prof'):
+                try:
+                    os.remove(os.path.join(self.directory, name[:-len('.json')] + suffix))
+                except OSError:
+                    pass
+
+    def load(self, profile_id):
+        """
+        Load a report.
+
+        Returns:
+            Report dictionary, or None if unknown
+        """
+        try:
+            with open(self._path(profile_id, '.json')) as f:
+                return json.load(f)
+        except (KeyError, OSError, ValueError):
+            return None
+
+    def raw_path(self, profile_id):
+        """Path of the raw pstats file of a profile, or None"""
+        try:
+            path = self._path(profile_id, '.prof')
+        except KeyError:
+            return None
+        return path if os.path.exists(path) else None
+
+class ProfilingMiddleware:
+    """
+    WSGI middleware profiling requests that ask for it with the X-Profile
+    header or the profile query parameter. The profile covers the whole
+    request, including streaming the response body, and is stored when the
+    response is closed; the response carries X-Profile-Id and X-Profile-Url.
+    One request is profiled at a time (tracemalloc is process-wide); other
+    profiling requests are served normally with X-Profile-Status: busy, and
+    unauthorized ones with X-Profile-Status: unauthorized.
+    """
+
+    def __init__(self, wsgi_app, store, paths, url_prefix='/api/profiles', top_n=40, enabled=True, authorize=None):
+        """
+        Initialize the middleware.
+
+        Args:
+            wsgi_app: WSGI application to wrap
+            store: ProfileStore for the reports
+            paths: Request paths that may be profiled
+            url_prefix: URL under which the reports are served
+            top_n: Number of functions and source lines reported
+            enabled: Whether profiling can be requested at all
+            authorize: Optional callable receiving the WSGI environment and
+                       returning whether the request may be profiled
+        """
+        self.wsgi_app = wsgi_app
+        self.store = store
+        self.paths = tuple(paths)
+        self.url_prefix = url_prefix
+        self.top_n = top_n
+        self.enabled = enabled
+        self.authorize = authorize
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        mode = requested_mode(environ) if self.enabled and environ.get('PATH_INFO') in self.paths else None
+        if mode is None:
+            return self.wsgi_app(environ, start_response)
+
+        def start_with_status(profile_status):
+            def start(status, headers, exc_info=None):
+                return start_response(status, list(headers) + [('X-Profile-Status', profile_status)], exc_info)
+            return start
+
+        if self.authorize is not None and not self.authorize(environ):
+            return self.wsgi_app(environ, start_with_status('unauthorized'))
+
+        if not self._lock.acquire(blocking=False):
+            return self.wsgi_app(environ, start_with_status('busy'))
+
+        session = ProfileSession(mode, environ.get('REQUEST_METHOD'), environ.get('PATH_INFO'), top_n=self.top_n)
+
+        def start_profiled(status, headers, exc_info=None):
+            session.status = int(status.split(' ', 1)[0])
+            headers = list(headers) + [('X-Profile-Id', session.id),
+                                       ('X-Profile-Url', f"{self.url_prefix}/{session.id}")]
+            return start_response(status, headers, exc_info)
+
+        def finish():
+            try:
+                report = session.stop()
+                self.store.save(report, session._profiler)
+                print(f"Profiled {session.method} {session.path} in {report['wallSeconds']:.3f}s: "
+                      f"{self.url_prefix}/{session.id}")
+            except Exception as e:
+                print(f"Could not store profile {session.id}: {e}")
+            finally:
+                self._lock.release()
+
+        token = _active.set(mode)
+        try:
+            session.start()
+            response = self.wsgi_app(environ, start_profiled)
+        except BaseException:
+            finish()
+            raise
+        finally:
+            _active.reset(token)
+        return ClosingIterator(response, [finish])
@@ -1,89 +1,230 @@
+import os
+import threading
 import numpy as np
 import pandas as pd
-import shap
 
-def generate_shap_values(data, model, top_n=5):
+# Sample budgets: background rows after k-means summarization and model
+# evaluations per explained patient. Explanation cost is roughly
+# SHAP_BACKGROUND_K * SHAP_NSAMPLES model rows per patient.
+SHAP_BACKGROUND_K = int(os.environ.get('SHAP_BACKGROUND_K', 10))
+SHAP_NSAMPLES = int(os.environ.get('SHAP_NSAMPLES', 256))
+# Number of patients explained per KernelExplainer call
+SHAP_BATCH_SIZE = int(os.environ.get('SHAP_BATCH_SIZE', 64))
+
+DEFAULT_FEATURE_IMPORTANCE = [
+    {'feature': 'Tumor Stage', 'importance': 0.28},
+    {'feature': 'Age', 'importance': 0.24},
+    {'feature': 'TP53 Expression', 'importance': 0.19},
+    {'feature': 'Treatment History', 'importance': 0.16},
+    {'feature': 'Lymph Node Status', 'importance': 0.13}
+]
+
+def risk_function(model, feature_names=None):
     """
-    Generate SHAP values for feature importance.
+    Wrap a model as the function explained by SHAP: the 24-month risk
+    (1 - survival probability) for a batch of feature rows.
     
     Args:
-        data: Input data for SHAP analysis
-        model: Trained model with feature_names attribute
-        top_n: Number of top features to return
-        
+        model: Model wrapper exposing predict_batch
+        feature_names: Column names passed to the model, if it expects a DataFrame
+    
     Returns:
-        List of dictionaries with feature names and importance values
+        Callable mapping an (n, n_features) array to n risk values
     """
-    # If no data is provided, return default feature importance
-    if data is None:
-        # Use model's built-in feature importance if available
-        if hasattr(model, 'get_feature_importance'):
-            feature_importance = model.get_feature_importance()
-            if top_n > 0 and len(feature_importance) > top_n:
-                feature_importance = feature_importance[:top_n]
-            return feature_importance
+    def predict_risk(X):
+        data = pd.DataFrame(X, columns=feature_names) if feature_names is not None else X
+        return 1 - np.asarray(model.predict_batch(data)['survival_probability_24m'], dtype=float) / 100
+    return predict_risk
+
+class ExplainerCache:
+    """
+    Persistent SHAP explainers, one per model.
+    Each explainer is built once over a k-means summary of the training
+    background and reused for every request, with fixed sample budgets so
+    that explanation latency is bounded.
+    """
+    
+    def __init__(self, background_loader=None, background_k=SHAP_BACKGROUND_K, nsamples=SHAP_NSAMPLES,
+                 batch_size=SHAP_BATCH_SIZE):
+        """
+        Initialize the cache.
         
-        # Default feature importance if model doesn't have it
-        return [
-            {'feature': 'Tumor Stage', 'importance': 0.28},
-            {'feature': 'Age', 'importance': 0.24},
-            {'feature': 'TP53 Expression', 'importance': 0.19},
-            {'feature': 'Treatment History', 'importance': 0.16},
-            {'feature': 'Lymph Node Status', 'importance': 0.13}
-        ]
+        Args:
+            background_loader: Callable returning the training background
+                               (preprocessed feature rows), or None if unavailable
+            background_k: Number of k-means centroids summarizing the background
+            nsamples: Model evaluations per explained patient
+            batch_size: Number of patients explained per explainer call
+        """
+        self.background_loader = background_loader
+        self.background_k = background_k
+        self.nsamples = nsamples
+        self.batch_size = batch_size
+        self._explainers = {}
+        self._locks = {}
+        self._lock = threading.Lock()
     
-    # For Random Survival Forest, use built-in feature importance
-    if hasattr(model, 'get_feature_importance'):
-        feature_importance = model.get_feature_importance()
-        if top_n > 0 and len(feature_importance) > top_n:
-            feature_importance = feature_importance[:top_n]
-        return feature_importance
+    def _model_lock(self, name):
+        """Lock serializing the explainer of one model (explainers are not thread-safe)"""
+        with self._lock:
+            return self._locks.setdefault(name, threading.Lock())
     
-    # For other models, try to use SHAP
-    try:
-        # Create a background dataset (simplified)
-        background_data = data.iloc[:1].copy() if len(data) > 0 else None
+    def _build(self, model, feature_names):
+        """Build a KernelExplainer over the summarized background"""
+        import shap
+        
+        background = self.background_loader() if self.background_loader is not None else None
+        if background is None:
+            raise ValueError("No SHAP background data available")
+        background = np.asarray(background, dtype=float)
+        if feature_names is not None and background.shape[1] != len(feature_names):
+            raise ValueError(f"SHAP background has {background.shape[1]} features, model input has {len(feature_names)}")
         
-        # Initialize SHAP explainer
-        explainer = shap.Explainer(model.model, background_data)
+        if len(background) > self.background_k:
+            background = shap.kmeans(background, self.background_k)
+        return shap.KernelExplainer(risk_function(model, feature_names), background)
+    
+    def explainer(self, model, feature_names=None):
+        """
+        Return the explainer of a model, building it on first use.
+        A model replaced by a new instance gets a new explainer.
+        
+        Args:
+            model: Model wrapper exposing predict_batch
+            feature_names: Column names of the preprocessed input
+        
+        Returns:
+            shap.KernelExplainer
+        """
+        name = type(model).__name__
+        key = (model, tuple(feature_names) if feature_names is not None else None)
+        entry = self._explainers.get(name)
+        if entry is not None and entry[0] is key[0] and entry[1] == key[1]:
+            return entry[2]
+        
+        with self._model_lock(name):
+            entry = self._explainers.get(name)
+            if entry is None or entry[0] is not key[0] or entry[1] != key[1]:
+                entry = (key[0], key[1], self._build(model, feature_names))
+                self._explainers[name] = entry
+        return entry[2]
+    
+    def shap_values(self, model, data, nsamples=None):
+        """
+        Compute per-patient SHAP values of the 24-month risk.
+        
+        Args:
+            model: Model wrapper exposing predict_batch
+            data: Preprocessed DataFrame or array, one row per patient
+            nsamples: Model evaluations per patient, defaults to the cache budget
         
-        # Calculate SHAP values
-        shap_values = explainer(data)
+        Returns:
+            Tuple of (SHAP values of shape (n_patients, n_features), feature names)
+        """
+        feature_names = list(data.columns) if hasattr(data, 'columns') else None
+        X = np.asarray(data, dtype=float)
+        explainer = self.explainer(model, feature_names)
         
-        # Get mean absolute SHAP values for each feature
-        mean_shap = np.abs(shap_values.values).mean(axis=0)
+        values = np.empty(X.shape)
+        with self._model_lock(type(model).__name__):
+            for start in range(0, len(X), self.batch_size):
+                batch = X[start:start + self.batch_size]
+                values[start:start + len(batch)] = np.asarray(explainer.shap_values(
+                    batch, nsamples=nsamples or self.nsamples, l1_reg=False, silent=True
+                )).reshape(len(batch), -1)
+        
+        if feature_names is None:
+            feature_names = [f"feature_{i}" for i in range(X.shape[1])]
+        return values, feature_names
+    
+    def explain(self, model, data, top_n=5, nsamples=None):
+        """
+        Explain every patient individually.
         
-        # Get feature names
-        if hasattr(data, 'columns'):
-            feature_names = data.columns
-        elif hasattr(model, 'feature_names') and model.feature_names:
-            feature_names = model.feature_names
-        else:
-            feature_names = [f"feature_{i}" for i in range(len(mean_shap))]
+        Args:
+            model: Model wrapper exposing predict_batch
+            data: Preprocessed DataFrame or array, one row per patient
+            top_n: Number of top features per patient (0 for all)
+            nsamples: Model evaluations per patient, defaults to the cache budget
         
-        # Create feature importance list
+        Returns:
+            One list per patient of {'feature', 'importance', 'shapValue'} entries,
+            sorted by absolute contribution
+        """
+        values, feature_names = self.shap_values(model, data, nsamples)
+        order = np.argsort(-np.abs(values), axis=1, kind='stable')
+        if top_n > 0:
+            order = order[:, :top_n]
+        
+        return [
+            [
+                {'feature': feature_names[j], 'importance': abs(float(row[j])), 'shapValue': float(row[j])}
+                for j in row_order
+            ]
+            for row, row_order in zip(values, order)
+        ]
+    
+    def feature_importance(self, model, data, top_n=5, nsamples=None):
+        """
+        Mean absolute SHAP value of each feature over the given patients.
+        
+        Args:
+            model: Model wrapper exposing predict_batch
+            data: Preprocessed DataFrame or array, one row per patient
+            top_n: Number of top features to return (0 for all)
+            nsamples: Model evaluations per patient, defaults to the cache budget
+        
+        Returns:
+            List of dictionaries with feature names and importance values
+        """
+        values, feature_names = self.shap_values(model, data, nsamples)
+        mean_shap = np.abs(values).mean(axis=0)
         feature_importance = [
             {'feature': name, 'importance': float(importance)}
             for name, importance in zip(feature_names, mean_shap)
         ]
-        
-        # Sort by importance (descending)
         feature_importance.sort(key=lambda x: x['importance'], reverse=True)
-        
-        # Limit to top_n features if specified
         if top_n > 0 and len(feature_importance) > top_n:
             feature_importance = feature_importance[:top_n]
-        
         return feature_importance
     
+    def clear(self):
+        """Drop all explainers, e.g. after the models or background changed"""
+        with self._lock:
+            self._explainers.clear()
+
+def generate_shap_values(data, model, top_n=5, explainers=None):
+    """
+    Generate SHAP values for feature importance.
+    
+    Args:
+        data: Input data for SHAP analysis
+        model: Trained model with feature_names attribute
+        top_n: Number of top features to return
+        explainers: Optional ExplainerCache; when given, data is explained with
+                    the model's cached explainer
+    
+    Returns:
+        List of dictionaries with feature names and importance values
+    """
+    # If no data is provided, return default feature importance
+    if data is None or explainers is None:
+        # Use model's built-in feature importance if available
+        if hasattr(model, 'get_feature_importance'):
+            feature_importance = model.get_feature_importance()
+            if feature_importance:
+                if top_n > 0 and len(feature_importance) > top_n:
+                    feature_importance = feature_importance[:top_n]
+                return feature_importance
+        
+        # Default feature importance if model doesn't have it
+        return [dict(entry) for entry in DEFAULT_FEATURE_IMPORTANCE]
+    
+    try:
+        return explainers.feature_importance(model, data, top_n=top_n)
+    
     except Exception as e:
         print(f"Error generating SHAP values: {e}")
         
         # Fallback to default feature importance
-        return [
-            {'feature': 'Tumor Stage', 'importance': 0.28},
-            {'feature': 'Age', 'importance': 0.24},
-            {'feature': 'TP53 Expression', 'importance': 0.19},
-            {'feature': 'Treatment History', 'importance': 0.16},
-            {'feature': 'Lymph Node Status', 'importance': 0.13}
-        ]
+        return generate_shap_values(None, model, top_n=top_n)
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+# Log hazard ratios of the simulated cohort
+STAGE_LOG_HR = {'I': 0.0, 'II': 0.5, 'III': 1.0, 'IV': 1.6}
+TREATMENT_LOG_HR = {'none': 0.0, 'surgery': -0.2, 'chemotherapy': -0.3, 'radiation': -0.2, 'combination': -0.4}
+AGE_LOG_HR_PER_DECADE = 0.15
+TUMOR_SIZE_LOG_HR_PER_CM = 0.1
+LYMPH_NODE_LOG_HR = 0.25  # per log(1 + positive nodes)
+GRADE_LOG_HR = 0.2
+ER_POSITIVE_LOG_HR = -0.3
+HER2_POSITIVE_LOG_HR = 0.2
+TP53_LOG_HR = 0.15
+
+def generate_cohort(n_patients, random_state=42, weibull_shape=1.2, weibull_scale=90.0, max_follow_up=120.0,
+                    loss_to_follow_up=200.0):
+    """
+    Generate a synthetic patient cohort with the API's input fields and
+    survival outcomes from a Weibull proportional hazards model.
+    Event times follow S(t | x) = exp(-(t / scale)^shape * exp(x'beta)) with
+    the log hazard ratios defined above; patients are censored at a uniform
+    administrative follow-up time or by exponential loss to follow-up.
+    Generation is vectorized, so cohorts of a million patients take seconds.
+
+    Args:
+        n_patients: Number of patients
+        random_state: Seed; the same seed and size give the same cohort
+        weibull_shape: Shape of the baseline hazard (>1 means increasing hazard)
+        weibull_scale: Scale of the baseline survival time in months
+        max_follow_up: Maximum administrative follow-up in months
+        loss_to_follow_up: Mean time to loss to follow-up in months
+
+    Returns:
+        DataFrame with 'patient_id', the API fields, 'survivalMonths' and
+        'event' (1=event, 0=censored)
+    """
+    rng = np.random.default_rng(random_state)
+    n = int(n_patients)
+
+    age = np.clip(rng.normal(60, 11, n), 25, 95).round().astype(int)
+    gender = np.where(rng.random(n) < 0.9, 'female', 'male')
+    stages = np.array(list(STAGE_LOG_HR))
+    stage_idx = rng.choice(len(stages), n, p=[0.3, 0.35, 0.25, 0.1])
+    tumor_size = np.clip(rng.lognormal(0.8 + 0.2 * stage_idx, 0.4), 0.2, 15).round(1)
+    lymph_nodes = rng.poisson(0.5 + 1.5 * stage_idx)
+    grade = np.clip(rng.integers(1, 4, n) + (rng.random(n) < 0.1 * stage_idx), 1, 3)
+    er_positive = rng.random(n) < 0.7
+    pr_positive = np.where(er_positive, rng.random(n) < 0.8, rng.random(n) < 0.1)
+    her2_positive = rng.random(n) < 0.15
+    treatments = np.array(list(TREATMENT_LOG_HR))
+    treatment_idx = rng.choice(len(treatments), n, p=[0.1, 0.3, 0.25, 0.1, 0.25])
+    tp53 = rng.normal(2.0, 0.8, n).round(2)
+
+    log_hr = (
+        AGE_LOG_HR_PER_DECADE * (age - 60) / 10
+        + np.array(list(STAGE_LOG_HR.values()))[stage_idx]
+        + TUMOR_SIZE_LOG_HR_PER_CM * tumor_size
+        + LYMPH_NODE_LOG_HR * np.log1p(lymph_nodes)
+        + GRADE_LOG_HR * (grade - 2)
+        + ER_POSITIVE_LOG_HR * er_positive
+        + HER2_POSITIVE_LOG_HR * her2_positive
+        + TP53_LOG_HR * (tp53 - 2)
+        + np.array(list(TREATMENT_LOG_HR.values()))[treatment_idx]
+    )
+
+    # Inverse transform sampling of the Weibull proportional hazards model
+    event_time = weibull_scale * (-np.log(rng.random(n)) / np.exp(log_hr)) ** (1 / weibull_shape)
+    censor_time = np.minimum(rng.uniform(12, max_follow_up, n), rng.exponential(loss_to_follow_up, n))
+
+    return pd.DataFrame({
+        'patient_id': np.char.add('SYN-', np.arange(n).astype(str)),
+        'age': age,
+        'gender': gender,
+        'tumorStage': stages[stage_idx],
+        'tumorSize': tumor_size,
+        'lymphNodes': lymph_nodes,
+        'histologicalGrade': grade,
+        'erStatus': np.where(er_positive, 'positive', 'negative'),
+        'prStatus': np.where(pr_positive, 'positive', 'negative'),
+        'her2Status': np.where(her2_positive, 'positive', 'negative'),
+        'treatmentHistory': treatments[treatment_idx],
+        'tp53Expression': tp53,
+        'brca1Expression': rng.normal(1.2, 0.5, n).round(2),
+        'methylationScore': rng.uniform(0, 1, n).round(2),
+        'mirnaProfile': rng.normal(3.0, 1.0, n).round(2),
+        'survivalMonths': np.minimum(event_time, censor_time).round(2),
+        'event': (event_time <= censor_time).astype(int)
+    })
+
+def input_fields(cohort):
+    """The API input fields of a cohort, without identifiers and outcomes"""
+    return cohort.drop(columns=['patient_id', 'survivalMonths', 'event'])